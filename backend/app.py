@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, session, send_file, Response, current_app, g
+from flask import Flask, request, jsonify, session, send_file, Response, current_app, g, has_request_context
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 import mysql.connector
@@ -8,24 +8,55 @@ from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
 import io
 import os
-import uuid
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
 import numpy as np
 import base64
 import requests
 import json
 import time
 import re
+import hmac
+import atexit
+import uuid
+import threading
+import multiprocessing
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from inference_scheduler import InferenceScheduler
+from image_decoder import decode_image
+from inference_backends import create_backend
+from inference_workers import InferenceWorkerPool, WorkerPoolClosed
+from tta import TestTimeAugmenter
+from tiling import predict_tiled
+from gradcam import GradCAM, ExplanationCache, render_overlay
+from model_registry import ModelRegistry, ARTIFACT_NAMES
+from shadow_mode import ShadowEvaluator
+from embedding_index import EmbeddingIndex
+from upload_store import UploadStore
+from db_pool import ConnectionPool, PoolTimeout
+from schema_registry import SchemaRegistry
+from migrations import apply_migrations, pending_migrations, LATEST_VERSION
+from pagination import InvalidPage, fetch_page, page_size
+from write_behind import IdAllocator, IdAllocationError, WriteBehindQueue
+from thumbnail_cache import ThumbnailCache, ThumbnailBusy, THUMBNAIL_FORMATS
+from perceptual_hash import PerceptualHashIndex, perceptual_hash
+from prediction_cache import (PredictionCache, SQLitePredictionStore, MySQLPredictionStore,
+                              hash_image_bytes, compute_model_version)
 
 # ✅ FIXED: Set TensorFlow environment variables BEFORE importing TensorFlow
+# TensorFlow itself is only imported by the model loader thread (see inference_backends)
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress all TensorFlow warnings
-tf.get_logger().setLevel('ERROR')  # Only show errors
 
 load_dotenv()  # Loads the .env file
 
+# Spawned inference worker processes re-import the main module (and with it this one)
+# while bootstrapping, before parent_process() is set; the process name is assigned
+# first, so it is the reliable marker. Startup side effects (migrations, pools, caches,
+# background threads) only run in the server process
+IS_SERVER_PROCESS = (__name__ != '__mp_main__'
+                     and multiprocessing.current_process().name == 'MainProcess')
+
 # ✅ Initialize Flask app
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
@@ -48,6 +79,51 @@ MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
+# ✅ Uploads are decoded in memory; originals are written off the request path
+# 'async' saves after responding, 'sync' saves before responding, 'off' keeps nothing.
+# Reads of an upload still being written wait up to UPLOAD_PENDING_WAIT_SECONDS, then 202
+UPLOAD_PERSIST_MODE = os.getenv("UPLOAD_PERSIST_MODE", "async").lower()
+UPLOAD_PENDING_WAIT_SECONDS = float(os.getenv("UPLOAD_PENDING_WAIT_SECONDS", "5"))
+# The stores and caches below are only built in the server process (see IS_SERVER_PROCESS);
+# workers never use them and the thumbnail cache sweeps its shared directory on startup
+upload_writer_pool = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-writer")
+                      if IS_SERVER_PROCESS else None)
+
+# ✅ Content-addressed upload store: <UPLOAD_STORE_DIR>/ab/cd/<sha256>.<ext>, so identical
+# uploads are stored once. UPLOAD_STORE_MAX_SIDE > 0 keeps a downscaled JPEG instead of
+# the original. Retention deletes files past an age and/or total size budget (0 = no limit)
+UPLOAD_STORE_DIR = os.getenv("UPLOAD_STORE_DIR", UPLOAD_FOLDER)
+UPLOAD_STORE_MAX_SIDE = int(os.getenv("UPLOAD_STORE_MAX_SIDE", "0"))
+UPLOAD_STORE_JPEG_QUALITY = int(os.getenv("UPLOAD_STORE_JPEG_QUALITY", "90"))
+UPLOAD_RETENTION_DAYS = float(os.getenv("UPLOAD_RETENTION_DAYS", "0"))
+UPLOAD_RETENTION_MAX_GB = float(os.getenv("UPLOAD_RETENTION_MAX_GB", "0"))
+UPLOAD_COMPACTION_INTERVAL_HOURS = float(os.getenv("UPLOAD_COMPACTION_INTERVAL_HOURS", "24"))
+
+upload_store = UploadStore(
+    UPLOAD_STORE_DIR,
+    max_side=UPLOAD_STORE_MAX_SIDE,
+    jpeg_quality=UPLOAD_STORE_JPEG_QUALITY
+) if IS_SERVER_PROCESS else None
+
+# ✅ Thumbnails for history views: fixed sizes, generated on first request by a small
+# bounded pool (so bursts can't starve /api/predict) and kept in an LRU disk cache
+THUMBNAIL_SIZES = {"small": 128, "medium": 320, "large": 640}
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", "cache/thumbnails")
+THUMBNAIL_CACHE_MAX_MB = int(os.getenv("THUMBNAIL_CACHE_MAX_MB", "512"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_MAX_PENDING = int(os.getenv("THUMBNAIL_MAX_PENDING", "32"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_MAX_AGE = int(os.getenv("THUMBNAIL_MAX_AGE", str(365 * 24 * 3600)))
+
+thumbnail_cache = ThumbnailCache(
+    THUMBNAIL_CACHE_DIR,
+    THUMBNAIL_SIZES,
+    max_bytes=THUMBNAIL_CACHE_MAX_MB * 1024 * 1024,
+    workers=THUMBNAIL_WORKERS,
+    max_pending=THUMBNAIL_MAX_PENDING,
+    quality=THUMBNAIL_QUALITY
+) if IS_SERVER_PROCESS else None
+
 # ✅ Database configuration
 DB_CONFIG = {
     'host': 'localhost',
@@ -56,6 +132,68 @@ DB_CONFIG = {
     'password': ''
 }
 
+# ✅ Connection pool: connections are reused instead of reconnecting on every call.
+# Within a request every get_db_connection() shares one connection (kept on flask.g
+# and returned to the pool at teardown). DB_POOL_SIZE=0 connects per call as before
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_MAX_WAIT_SECONDS = float(os.getenv("DB_POOL_MAX_WAIT_SECONDS", "5"))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "30"))  # ping if idle longer
+DB_POOL_MAX_LIFETIME_SECONDS = float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "3600"))
+
+db_pool = ConnectionPool(
+    lambda: mysql.connector.connect(**DB_CONFIG),
+    size=DB_POOL_SIZE,
+    max_wait=DB_POOL_MAX_WAIT_SECONDS,
+    health_check_after=DB_POOL_HEALTH_CHECK_SECONDS,
+    max_lifetime=DB_POOL_MAX_LIFETIME_SECONDS
+) if DB_POOL_SIZE > 0 and IS_SERVER_PROCESS else None
+
+# ✅ Schema registry: tables, columns and indexes are introspected once at startup (and
+# on POST /api/admin/schema/refresh) so chat paths don't run SHOW TABLES on every call
+REQUIRED_TABLES = ['users', 'predictions', 'chat_history', 'mango_knowledge_base']
+SCHEMA_RETRY_SECONDS = float(os.getenv("SCHEMA_RETRY_SECONDS", "30"))  # while the DB is unreachable
+# Pending migrations (migrations.py) are applied at startup; disable to run tools/migrate_db.py instead
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+# ✅ History listings page newest first with an opaque ?cursor= (keyset on created_at, id)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+
+# ✅ Write-behind persistence: prediction and chat rows are inserted by a background writer
+# in multi-row batches instead of on the request thread. Prediction ids come from blocks
+# reserved in id_sequences, so /api/predict returns the id before the row is written.
+# Rows that can't be written wait in a bounded on-disk spool until the database is back.
+# WRITE_BEHIND_ENABLED=false inserts synchronously (still with allocated ids)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_SPOOL_DIR = os.getenv("WRITE_BEHIND_SPOOL_DIR", os.path.join("cache", "write_spool"))
+WRITE_BEHIND_SPOOL_MAX_MB = float(os.getenv("WRITE_BEHIND_SPOOL_MAX_MB", "64"))
+PREDICTION_ID_BLOCK_SIZE = int(os.getenv("PREDICTION_ID_BLOCK_SIZE", "50"))
+
+prediction_ids = IdAllocator(lambda: get_db_connection(), 'predictions', block_size=PREDICTION_ID_BLOCK_SIZE)
+write_queue = WriteBehindQueue(
+    lambda: get_db_connection(),
+    {
+        'predictions': (['id', 'user_id', 'image_path', 'predicted_disease', 'confidence',
+                         'model_version', 'created_at'], 'id'),
+        'chat_history': (['client_id', 'user_id', 'message', 'response', 'created_at'], 'client_id'),
+    },
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_MS / 1000.0,
+    max_pending=WRITE_BEHIND_MAX_PENDING,
+    spool_dir=WRITE_BEHIND_SPOOL_DIR,
+    spool_max_bytes=int(WRITE_BEHIND_SPOOL_MAX_MB * 1024 * 1024),
+    background=WRITE_BEHIND_ENABLED
+)
+
+schema_registry = SchemaRegistry(
+    lambda: get_db_connection(),
+    required_tables=REQUIRED_TABLES,
+    retry_seconds=SCHEMA_RETRY_SECONDS
+)
+
 # Create uploads directory if it doesn't exist
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
@@ -64,18 +202,402 @@ if not os.path.exists(UPLOAD_FOLDER):
 IMG_SIZE = (224, 224)
 DISEASE_CLASSES = ['Alternaria', 'Anthracnose', 'Black Mould Rot', 'Healthy', 'Stem and Rot']
 
+# ✅ Image decoding: 'pil' or 'tf', with reduced-size JPEG decoding for large photos
+IMAGE_DECODE_BACKEND = os.getenv("IMAGE_DECODE_BACKEND", "pil").lower()
+IMAGE_DECODE_DRAFT = os.getenv("IMAGE_DECODE_DRAFT", "true").lower() == "true"
+
+# ✅ Inference runtime: 'keras' loads the .h5 model, 'tflite' runs a converted
+# variant from tools/convert_tflite.py (fp16/int8), 'onnx' runs the graph from
+# tools/export_onnx.py on ONNX Runtime
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras").lower()
+MODEL_PATHS = {
+    'keras': os.getenv("KERAS_MODEL_PATH", "../Model/best_model_final.h5"),
+    'tflite': os.getenv("TFLITE_MODEL_PATH", "../Model/best_model_final_fp16.tflite"),
+    'onnx': os.getenv("ONNX_MODEL_PATH", "../Model/best_model_final.onnx"),
+}
+INFERENCE_NUM_THREADS = int(os.getenv("INFERENCE_NUM_THREADS", "0")) or None
+# Keras runs through a tf.function traced once per batch bucket; batches are padded to the nearest bucket
+INFERENCE_COMPILED = os.getenv("INFERENCE_COMPILED", "true").lower() == "true"
+INFERENCE_BATCH_BUCKETS = [int(b) for b in os.getenv("INFERENCE_BATCH_BUCKETS", "1,2,4,8").split(',') if b.strip()]
+
+# ✅ Optional pool of inference worker processes fed through shared memory (0 = run in-process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_WORKER_INTRA_OP_THREADS = int(os.getenv("INFERENCE_WORKER_INTRA_OP_THREADS", "0")) or None
+INFERENCE_WORKER_INTER_OP_THREADS = int(os.getenv("INFERENCE_WORKER_INTER_OP_THREADS", "0")) or None
+INFERENCE_WORKER_CPU_AFFINITY = os.getenv("INFERENCE_WORKER_CPU_AFFINITY", "")  # '', 'auto' or '0-1;2-3'
+# A worker that dies or takes longer than this on one batch fails it and is restarted
+INFERENCE_WORKER_CALL_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_WORKER_CALL_TIMEOUT_SECONDS", "60"))
+
+# ✅ Model loads in a background thread so the API answers /api/health immediately;
+# prediction routes return 503 + Retry-After until it is ready
+MODEL_BACKGROUND_LOAD = os.getenv("MODEL_BACKGROUND_LOAD", "true").lower() == "true"
+MODEL_RETRY_AFTER_SECONDS = int(os.getenv("MODEL_RETRY_AFTER_SECONDS", "5"))
+
+# ✅ Versioned model registry: <MODEL_REGISTRY_DIR>/<version>/model.h5 (or .tflite/.onnx).
+# The ACTIVE (else newest) version is served; without a registry MODEL_PATHS is used
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "../Model/registry")
+MODEL_RETIRE_TIMEOUT_SECONDS = float(os.getenv("MODEL_RETIRE_TIMEOUT_SECONDS", "30"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # admin endpoints are disabled when unset
+model_registry = ModelRegistry(MODEL_REGISTRY_DIR, INFERENCE_BACKEND) if IS_SERVER_PROCESS else None
+
 # Load your trained model (replace with your model path)
 model = None
-try:
-    model_path = '../Model/best_model_final.h5'
-    if os.path.exists(model_path):
-        model = tf.keras.models.load_model(model_path)
-        print("✓ Model loaded successfully.")
+model_version = model_registry.active_version() if model_registry else None
+model_fingerprint = None  # content hash of the served artifact; keys the prediction caches
+model_path = (model_registry.artifact_path(model_version) if model_version
+              else MODEL_PATHS.get(INFERENCE_BACKEND, MODEL_PATHS['keras']))
+model_state = {
+    "status": "loading",
+    "error": None,
+    "started_at": time.time(),
+    "ready_at": None,
+    "load_seconds": None
+}
+
+# ✅ Similar-case search: the penultimate-layer embedding comes out of the same forward
+# pass as the prediction and is indexed per model version under EMBEDDING_INDEX_DIR
+EMBEDDINGS_ENABLED = os.getenv("EMBEDDINGS_ENABLED", "true").lower() == "true"
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "cache/embeddings")
+EMBEDDING_NPROBE = int(os.getenv("EMBEDDING_NPROBE", "8"))
+EMBEDDING_TRAIN_THRESHOLD = int(os.getenv("EMBEDDING_TRAIN_THRESHOLD", "10000"))  # exact search below this
+SIMILAR_MAX_K = int(os.getenv("SIMILAR_MAX_K", "50"))
+embedding_index = None
+
+def open_embedding_index(version, dim):
+    if not EMBEDDINGS_ENABLED or not dim or not version:
+        return None
+    try:
+        return EmbeddingIndex(os.path.join(EMBEDDING_INDEX_DIR, version), dim,
+                              nprobe=EMBEDDING_NPROBE, train_threshold=EMBEDDING_TRAIN_THRESHOLD)
+    except Exception as e:
+        print(f"✗ Embedding index unavailable, similar-case search disabled: {e}")
+        return None
+
+# Swaps replace `model` in one assignment; batches already running keep the backend they started with
+model_swap_lock = threading.Lock()
+swap_state = {
+    "status": "idle",
+    "version": None,
+    "error": None,
+    "started_at": None,
+    "finished_at": None
+}
+
+def build_model_backend(path):
+    """Load and warm up the configured runtime (in-process or worker pool) for a model file"""
+    # Always include the scheduler's max batch so full batches are never split
+    buckets = sorted(set(INFERENCE_BATCH_BUCKETS + [INFERENCE_MAX_BATCH_SIZE]))
+    if INFERENCE_WORKERS > 0:
+        return InferenceWorkerPool(
+            INFERENCE_BACKEND, path,
+            num_workers=INFERENCE_WORKERS,
+            max_rows=max(buckets),
+            input_size=IMG_SIZE,
+            num_classes=len(DISEASE_CLASSES),
+            batch_buckets=buckets,
+            compiled=INFERENCE_COMPILED,
+            intra_op_threads=INFERENCE_WORKER_INTRA_OP_THREADS,
+            inter_op_threads=INFERENCE_WORKER_INTER_OP_THREADS,
+            cpu_affinity=INFERENCE_WORKER_CPU_AFFINITY,
+            embeddings=EMBEDDINGS_ENABLED,
+            call_timeout=INFERENCE_WORKER_CALL_TIMEOUT_SECONDS
+        ).load()
+    return create_backend(INFERENCE_BACKEND, path, input_size=IMG_SIZE,
+                          batch_buckets=buckets, num_threads=INFERENCE_NUM_THREADS,
+                          compiled=INFERENCE_COMPILED, embeddings=EMBEDDINGS_ENABLED).warmup()
+
+def install_model(backend, path, version=None):
+    """Make a loaded backend the serving model and return the one it replaces"""
+    global model, model_path, model_version, model_fingerprint, embedding_index
+    try:
+        fingerprint = compute_model_version(path)
+    except Exception as e:
+        fingerprint = None
+        print(f"✗ Could not fingerprint model, prediction cache disabled: {e}")
+    
+    version = version or fingerprint
+    if EMBEDDINGS_ENABLED and backend.embedding_dim is None:
+        print(f"Warning: {INFERENCE_BACKEND} model does not expose embeddings, similar-case search disabled")
+    index = open_embedding_index(version, backend.embedding_dim)
+    
+    with model_swap_lock:
+        previous, previous_index = model, embedding_index
+        prediction_cache.set_model_version(fingerprint)
+        near_duplicate_index.set_model_version(fingerprint)
+        model, model_path, model_version, embedding_index = backend, path, version, index
+        model_fingerprint = fingerprint
+    if previous_index is not None and previous_index is not index:
+        previous_index.close()
+    return previous
+
+def load_model():
+    try:
+        install_model(build_model_backend(model_path), model_path, model_version)
+        model_state["ready_at"] = time.time()
+        model_state["load_seconds"] = model_state["ready_at"] - model_state["started_at"]
+        model_state["status"] = "ready"
+        print(f"✓ Model loaded successfully ({INFERENCE_BACKEND}, version {model_version}) in {model_state['load_seconds']:.1f}s.")
+    except FileNotFoundError as e:
+        model_state.update(status="failed", error=str(e))
+        print(f"Warning: {e}")
+    except Exception as e:
+        model_state.update(status="failed", error=str(e))
+        print(f"✗ Error loading model: {e}")
+
+def start_model_loading():
+    if MODEL_BACKGROUND_LOAD:
+        threading.Thread(target=load_model, name="model-loader", daemon=True).start()
     else:
-        print(f"Warning: Model file not found at {model_path}")
-except Exception as e:
-    print(f"✗ Error loading model: {e}")
-    model = None
+        load_model()
+    if SHADOW_MODEL_VERSION:
+        start_shadow_loading(SHADOW_MODEL_VERSION)
+
+def swap_model(version):
+    """Background job: load and warm a registry version, then swap it in without dropping requests"""
+    try:
+        path = model_registry.artifact_path(version)
+        previous = install_model(build_model_backend(path), path, version)
+        model_registry.set_active(version)
+        
+        if model_state["status"] != "ready":
+            model_state.update(status="ready", error=None, ready_at=time.time())
+        swap_state.update(status="ready", finished_at=time.time())
+        print(f"✓ Now serving model version {version} ({swap_state['finished_at'] - swap_state['started_at']:.1f}s to load)")
+        
+        if previous is not None:
+            previous.close(drain_timeout=MODEL_RETIRE_TIMEOUT_SECONDS)
+    except Exception as e:
+        swap_state.update(status="failed", error=str(e), finished_at=time.time())
+        print(f"✗ Error swapping to model version {version}: {e}")
+
+def start_model_swap(version):
+    """Start loading a registry version in the background; False if another load is running"""
+    with model_swap_lock:
+        if swap_state["status"] == "loading" or model_state["status"] == "loading":
+            return False
+        swap_state.update(status="loading", version=version, error=None,
+                          started_at=time.time(), finished_at=None)
+    threading.Thread(target=swap_model, args=(version,), name="model-swap", daemon=True).start()
+    return True
+
+# ✅ Shadow mode: a sample of live predictions is re-scored by a candidate registry
+# version on a background thread; the bounded queue drops samples rather than wait
+SHADOW_MODEL_VERSION = os.getenv("SHADOW_MODEL_VERSION")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "64"))
+SHADOW_NUM_THREADS = int(os.getenv("SHADOW_NUM_THREADS", "1"))  # keeps the candidate off most cores
+
+shadow_evaluator = ShadowEvaluator(DISEASE_CLASSES, sample_rate=SHADOW_SAMPLE_RATE, max_queue_size=SHADOW_QUEUE_SIZE)
+shadow_state = {"status": "off", "version": None, "error": None}
+
+def load_shadow_model(version):
+    """Background job: load a candidate registry version in-process and start shadowing it"""
+    try:
+        path = model_registry.artifact_path(version)
+        backend = create_backend(INFERENCE_BACKEND, path, input_size=IMG_SIZE, batch_buckets=[1],
+                                 num_threads=SHADOW_NUM_THREADS, compiled=INFERENCE_COMPILED).warmup()
+        previous = shadow_evaluator.set_candidate(backend, version)
+        shadow_state.update(status="running", error=None)
+        print(f"✓ Shadowing candidate model version {version} on {SHADOW_SAMPLE_RATE:.0%} of predictions")
+        if previous is not None:
+            previous.close()
+    except Exception as e:
+        shadow_state.update(status="failed", error=str(e))
+        print(f"✗ Error loading shadow model {version}: {e}")
+
+def start_shadow_loading(version):
+    if shadow_state["status"] == "loading":
+        return False
+    shadow_state.update(status="loading", version=version, error=None)
+    threading.Thread(target=load_shadow_model, args=(version,), name="shadow-loader", daemon=True).start()
+    return True
+
+def stop_shadow():
+    previous = shadow_evaluator.set_candidate(None)
+    shadow_state.update(status="off", version=None, error=None)
+    if previous is not None:
+        previous.close()
+
+def model_unavailable_response():
+    """503 with Retry-After while the model is still loading, 500 if loading failed"""
+    if model_state["status"] == "loading":
+        response = jsonify({"error": "Model is still loading, please retry shortly", "model": "loading"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(MODEL_RETRY_AFTER_SECONDS)
+        return response
+    return jsonify({"error": "Model not loaded"}), 500
+
+# ✅ Micro-batching inference scheduler: concurrent requests share one forward pass
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "256"))
+
+def serving_model():
+    """(backend, version, fingerprint) of the serving model, read together so a swap can't mix them"""
+    with model_swap_lock:
+        return model, model_version, model_fingerprint
+
+def run_model_batch(batch):
+    """
+    Run one forward pass of the loaded model over a batch of preprocessed images
+
+    Returns (outputs, (version, fingerprint)) of the model that actually ran it,
+    so results are recorded and cached under that model even if a swap lands
+    while the request waits in the scheduler.
+    """
+    backend, version, fingerprint = serving_model()
+    try:
+        outputs = backend.predict_batch(batch)
+    except WorkerPoolClosed:
+        if serving_model()[0] is backend:
+            raise
+        # Pool retired by a swap before this batch got a worker
+        backend, version, fingerprint = serving_model()
+        outputs = backend.predict_batch(batch)
+    return outputs, (version, fingerprint)
+
+def split_outputs(outputs):
+    """Model rows are the class probabilities, followed by the embedding when the backend provides one"""
+    outputs = np.asarray(outputs)
+    num_classes = len(DISEASE_CLASSES)
+    embeddings = outputs[:, num_classes:] if outputs.shape[1] > num_classes else None
+    return outputs[:, :num_classes], embeddings
+
+inference_scheduler = InferenceScheduler(
+    run_model_batch,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    max_queue_size=INFERENCE_QUEUE_SIZE,
+    concurrency=max(1, INFERENCE_WORKERS)
+)
+
+def predict_probabilities(batch):
+    """Scheduler prediction for callers that only need class probabilities"""
+    outputs, _ = inference_scheduler.predict(batch)
+    return split_outputs(outputs)[0]
+
+# ✅ Grad-CAM explanations run in-process on the Keras model as a low-priority scheduler
+# task: explanation batches only start when no predictions are waiting. Other backends
+# need the .h5 they were converted from: model.h5 beside the registry artifact, else
+# GRADCAM_MODEL_PATH, which only describes the model served at startup (explanations
+# are off after a swap to a version without its own model.h5). Overlays are cached per
+# prediction id and fingerprint of that .h5 under EXPLANATION_CACHE_DIR
+EXPLANATIONS_ENABLED = os.getenv("EXPLANATIONS_ENABLED", "true").lower() == "true"
+GRADCAM_MODEL_PATH = os.getenv("GRADCAM_MODEL_PATH")
+GRADCAM_LAYER = os.getenv("GRADCAM_LAYER")  # default: the last 4D feature map
+EXPLANATION_CACHE_DIR = os.getenv("EXPLANATION_CACHE_DIR", "cache/explanations")
+EXPLANATION_TIMEOUT_SECONDS = float(os.getenv("EXPLANATION_TIMEOUT_SECONDS", "30"))
+EXPLANATION_MAX_SIDE = int(os.getenv("EXPLANATION_MAX_SIDE", "512"))
+
+explanation_cache = ExplanationCache(EXPLANATION_CACHE_DIR) if IS_SERVER_PROCESS else None
+explainer_lock = threading.Lock()
+explainer_state = {"explainer": None, "path": None, "fingerprint": None, "error": None}
+startup_model_path = model_path
+
+def explainer_model_path():
+    """The .h5 whose weights match the serving model, or None when there isn't one"""
+    if not EXPLANATIONS_ENABLED:
+        return None
+    if INFERENCE_BACKEND == 'keras':
+        return model_path
+    source = os.path.join(os.path.dirname(model_path), ARTIFACT_NAMES['keras'])
+    if os.path.isfile(source):
+        return source
+    return GRADCAM_MODEL_PATH if model_path == startup_model_path else None
+
+explainer_fingerprints = {}  # path -> ((mtime_ns, size), fingerprint), so cache hits don't re-hash the .h5
+
+def explainer_fingerprint(path):
+    """Fingerprint of the .h5 at path without loading it; keys the explanation cache"""
+    if path == model_path and model_fingerprint:
+        return model_fingerprint
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    known = explainer_fingerprints.get(path)
+    if known is None or known[0] != stamp:
+        known = (stamp, compute_model_version(path))
+        explainer_fingerprints[path] = known
+    return known[1]
+
+def get_explainer():
+    """(Grad-CAM model, fingerprint of its .h5) for the serving model, reloaded when that file changes"""
+    path = explainer_model_path()
+    if path is None:
+        raise RuntimeError(f"No Keras model matches the served {INFERENCE_BACKEND} model")
+    fingerprint = explainer_fingerprint(path)
+    with explainer_lock:
+        stale = explainer_state["fingerprint"] != fingerprint
+        if explainer_state["explainer"] is None or explainer_state["path"] != path or stale:
+            explainer_state.update(explainer=None, path=path, fingerprint=None, error=None)
+            try:
+                explainer_state["explainer"] = GradCAM(path, GRADCAM_LAYER)
+                explainer_state["fingerprint"] = fingerprint
+            except Exception as e:
+                explainer_state["error"] = str(e)
+                raise
+        return explainer_state["explainer"], explainer_state["fingerprint"]
+
+def run_explanation_batch(batch):
+    # Tagged with the explainer that ran, so overlays are cached under the .h5 actually used
+    explainer, fingerprint = get_explainer()
+    return explainer.explain_batch(batch), (explainer, fingerprint)
+
+inference_scheduler.add_task('gradcam', run_explanation_batch)
+
+# ✅ Test-time augmentation: low-confidence predictions are re-scored over
+# flips/rotations/crops in one extra batch and the probabilities averaged
+TTA_ENABLED = os.getenv("TTA_ENABLED", "false").lower() == "true"
+TTA_CONFIDENCE_THRESHOLD = float(os.getenv("TTA_CONFIDENCE_THRESHOLD", "0.6"))
+TTA_AUGMENTATIONS = [a.strip() for a in os.getenv("TTA_AUGMENTATIONS", "hflip,vflip,rot90,rot270,crop").split(',') if a.strip()]
+
+test_time_augmenter = TestTimeAugmenter(
+    predict_probabilities,
+    confidence_threshold=TTA_CONFIDENCE_THRESHOLD,
+    augmentations=TTA_AUGMENTATIONS
+)
+
+# ✅ Prediction cache: repeated uploads of the same image skip the forward pass
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "2048"))
+PREDICTION_CACHE_BACKEND = os.getenv("PREDICTION_CACHE_BACKEND", "none").lower()  # none, sqlite or mysql
+PREDICTION_CACHE_SQLITE_PATH = os.getenv("PREDICTION_CACHE_SQLITE_PATH", "cache/predictions.sqlite3")
+
+def create_prediction_cache():
+    store = None
+    try:
+        if PREDICTION_CACHE_BACKEND == 'sqlite':
+            store = SQLitePredictionStore(PREDICTION_CACHE_SQLITE_PATH)
+        elif PREDICTION_CACHE_BACKEND == 'mysql':
+            store = MySQLPredictionStore(get_db_connection)
+    except Exception as e:
+        print(f"✗ Persistent prediction cache unavailable, using memory only: {e}")
+        store = None
+    
+    return PredictionCache(max_entries=PREDICTION_CACHE_SIZE, store=store)
+
+# ✅ Near-duplicate reuse: re-encoded or slightly cropped copies of a recent upload
+# (e.g. recompressed by a messaging app) miss the byte-hash cache, so a perceptual
+# hash within NEAR_DUPLICATE_MAX_DISTANCE bits (of 64) reuses that prediction
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "6"))
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "20000"))
+
+near_duplicate_index = PerceptualHashIndex(
+    max_distance=NEAR_DUPLICATE_MAX_DISTANCE,
+    max_entries=NEAR_DUPLICATE_MAX_ENTRIES
+)
+
+# ✅ Batch prediction configuration
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "64"))
+BATCH_DECODE_WORKERS = int(os.getenv("BATCH_DECODE_WORKERS", "4"))
+BATCH_PREDICT_CHUNK_SIZE = int(os.getenv("BATCH_PREDICT_CHUNK_SIZE", "32"))
+batch_decode_pool = ThreadPoolExecutor(max_workers=BATCH_DECODE_WORKERS, thread_name_prefix="batch-decode")
+
+# ✅ Tiled prediction for high-resolution crate/branch photos: overlapping
+# IMG_SIZE tiles are scored TILE_BATCH_SIZE at a time, so memory stays bounded
+TILE_STRIDE = int(os.getenv("TILE_STRIDE", "168"))  # 25% overlap between 224px tiles
+TILE_BATCH_SIZE = int(os.getenv("TILE_BATCH_SIZE", "16"))
+TILE_MAX_SIDE = int(os.getenv("TILE_MAX_SIDE", "4096"))  # larger photos are downscaled while decoding
+TILE_MAX_CONTENT_LENGTH = int(os.getenv("TILE_MAX_CONTENT_LENGTH", str(64 * 1024 * 1024)))  # 50+ MP JPEGs exceed 16MB
 
 # ✅ Updated Chatbot Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -122,34 +644,133 @@ def generate_placeholder_image(width, height, text="Placeholder"):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_db_connection():
+def persist_upload(data, extension, image_hash=None):
+    """Store an upload according to UPLOAD_PERSIST_MODE; returns its upload store path or None"""
+    if UPLOAD_PERSIST_MODE == 'off':
+        return None
+    
+    # The path depends only on the content, so it is known before the write happens
+    filepath = upload_store.path_for(image_hash or hash_image_bytes(data), extension)
+    if UPLOAD_PERSIST_MODE == 'sync':
+        upload_store.write(filepath, data)
+    else:
+        upload_store.write_async(upload_writer_pool, filepath, data)
+    return filepath
+
+def stored_upload_response(image_path):
+    """None once image_path is on disk, else the response to return (202 while its write is pending)"""
+    try:
+        if upload_store.wait(image_path, timeout=UPLOAD_PENDING_WAIT_SECONDS):
+            return None
+    except TimeoutError:
+        return jsonify({"error": "Image is still being stored, please retry"}), 202, {'Retry-After': '1'}
+    return jsonify({"error": "Image is no longer stored"}), 404
+
+def clear_compacted_image_paths(paths, before):
+    """Clear image_path on predictions made before `before` whose upload compaction deleted"""
+    connection = get_db_connection()
+    if not connection:
+        print(f"✗ Could not clear image paths of {len(paths)} compacted uploads: database connection failed")
+        return
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        cursor = connection.cursor()
+        cleared = 0
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            # Rows created since compaction started may point at a fresh copy of the same content
+            cursor.execute(f"UPDATE predictions SET image_path = NULL "
+                           f"WHERE image_path IN ({', '.join(['%s'] * len(chunk))}) AND created_at < %s",
+                           (*chunk, before))
+            cleared += cursor.rowcount
+        connection.commit()
+        print(f"✓ Cleared image_path on {cleared} predictions of compacted uploads")
     except Error as e:
+        print(f"✗ Could not clear image paths of compacted uploads: {e}")
+    finally:
+        connection.close()
+
+def compact_uploads():
+    """Apply the upload retention budget once"""
+    started_at = datetime.now()
+    result = upload_store.compact(
+        max_age_days=UPLOAD_RETENTION_DAYS,
+        max_bytes=int(UPLOAD_RETENTION_MAX_GB * 1024 ** 3),
+        on_removed=lambda paths: clear_compacted_image_paths(paths, started_at)
+    )
+    print(f"✓ Upload compaction removed {result['files_removed']} files "
+          f"({result['bytes_removed'] / 1024 ** 2:.1f}MB), {result['files_remaining']} remain")
+    return result
+
+def start_upload_compaction():
+    """Run upload compaction every UPLOAD_COMPACTION_INTERVAL_HOURS when a retention budget is set"""
+    if not (UPLOAD_RETENTION_DAYS or UPLOAD_RETENTION_MAX_GB) or UPLOAD_COMPACTION_INTERVAL_HOURS <= 0:
+        return
+    
+    def run():
+        while True:
+            try:
+                compact_uploads()
+            except Exception as e:
+                print(f"✗ Error compacting uploads: {e}")
+            time.sleep(UPLOAD_COMPACTION_INTERVAL_HOURS * 3600)
+    
+    threading.Thread(target=run, name="upload-compaction", daemon=True).start()
+
+def get_db_connection():
+    """Pooled connection; close() returns it. Calls within one request share a connection"""
+    try:
+        if db_pool is None:
+            return mysql.connector.connect(**DB_CONFIG)
+        if has_request_context():
+            if 'db_connection' not in g:
+                g.db_connection = db_pool.acquire(request_scoped=True)
+            return g.db_connection
+        return db_pool.acquire()
+    except (Error, PoolTimeout) as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
+@app.teardown_appcontext
+def release_db_connection(exception):
+    connection = g.pop('db_connection', None)
+    if connection is not None:
+        connection.release()
+
+def run_schema_migrations():
+    """Bring the database schema up to date before introspecting it"""
+    connection = get_db_connection()
+    if not connection:
+        return
+    try:
+        for version, description, changes in apply_migrations(connection):
+            print(f"✓ Applied migration {version}: {description} ({', '.join(changes) or 'already in place'})")
+    except (Error, RuntimeError) as e:
+        print(f"✗ Schema migration failed: {e}")
+    finally:
+        connection.close()
+
+prediction_cache = None
+if IS_SERVER_PROCESS:
+    if DB_MIGRATE_ON_STARTUP:
+        run_schema_migrations()
+    prediction_cache = create_prediction_cache()
+    schema_registry.refresh()
+    write_queue.start()
+    atexit.register(write_queue.close)
+    inference_scheduler.start()
+    start_model_loading()
+    start_upload_compaction()
+
 def preprocess_image(image_file):
     """Preprocess image for model prediction"""
     try:
         if hasattr(image_file, 'read'):
-            image = Image.open(image_file)
+            image_bytes = image_file.read()
         else:
-            image = load_img(image_file, target_size=IMG_SIZE)
-            img_array = img_to_array(image)
-            img_array = np.expand_dims(img_array, axis=0)
-            img_array = img_array / 255.0
-            return img_array
-        
-        image = image.convert('RGB')
-        image = image.resize(IMG_SIZE)
+            with open(image_file, 'rb') as f:
+                image_bytes = f.read()
         
-        img_array = img_to_array(image)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = img_array / 255.0
-        
-        return img_array
+        return decode_image(image_bytes, IMG_SIZE, backend=IMAGE_DECODE_BACKEND, draft=IMAGE_DECODE_DRAFT)
     except Exception as e:
         print(f"Error preprocessing image: {e}")
         return None
@@ -160,31 +781,81 @@ def predict_disease(image_file):
         return {"error": "Model not loaded"}
     
     try:
-        processed_image = preprocess_image(image_file)
+        _, version, fingerprint = serving_model()
+        if hasattr(image_file, 'read'):
+            image_bytes = image_file.read()
+        else:
+            with open(image_file, 'rb') as f:
+                image_bytes = f.read()
+        
+        image_hash = hash_image_bytes(image_bytes)
+        cached = prediction_cache.get(image_hash, fingerprint)
+        if cached is not None:
+            # Same bytes, same model: reuse the embedding stored for the earlier prediction
+            index = embedding_index
+            embedding = index.find_by_hash(image_hash) if index is not None else None
+            return dict(format_prediction(cached), model_version=version,
+                        image_hash=image_hash, embedding=embedding)
+        
+        processed_image = preprocess_image(io.BytesIO(image_bytes))
         if processed_image is None:
             return {"error": "Failed to process image"}
         
-        predictions = model.predict(processed_image, verbose=0)
+        phash = perceptual_hash(processed_image) if NEAR_DUPLICATE_ENABLED else None
+        if phash is not None:
+            match = near_duplicate_index.lookup(phash)
+            if match is not None:
+                probabilities, original_hash, distance = match
+                prediction_cache.put(image_hash, probabilities, fingerprint)
+                index = embedding_index
+                embedding = index.find_by_hash(original_hash) if index is not None and original_hash else None
+                return dict(format_prediction(probabilities), model_version=version, image_hash=image_hash,
+                            embedding=embedding, near_duplicate_distance=distance)
         
-        predicted_class_idx = np.argmax(predictions[0])
-        predicted_class = DISEASE_CLASSES[predicted_class_idx]
-        confidence = float(predictions[0][predicted_class_idx])
-        
-        results = {
-            "predicted_class": predicted_class,
-            "disease": predicted_class,
-            "confidence": confidence,
-            "all_probabilities": {
-                DISEASE_CLASSES[i]: float(predictions[0][i]) 
-                for i in range(len(DISEASE_CLASSES))
-            }
-        }
+        start = time.perf_counter()
+        # The version and fingerprint of the model that ran this batch, not the one serving when the request came in
+        outputs, (version, fingerprint) = inference_scheduler.predict(processed_image)
+        predictions, embeddings = split_outputs(outputs)
+        primary_ms = (time.perf_counter() - start) * 1000.0
+        probabilities = predictions[0]
+        # Compared before TTA so both models see exactly the same single input
+        shadow_evaluator.maybe_submit(processed_image, probabilities, primary_ms, image_hash)
+        if TTA_ENABLED:
+            probabilities, _ = test_time_augmenter.refine(processed_image, probabilities)
+        prediction_cache.put(image_hash, probabilities, fingerprint)
+        near_duplicate_index.add(phash, probabilities, image_hash, fingerprint)
         
-        return results
+        return dict(format_prediction(probabilities), model_version=version, image_hash=image_hash,
+                    embedding=embeddings[0] if embeddings is not None else None)
     except Exception as e:
         print(f"Error in prediction: {e}")
         return {"error": f"Prediction failed: {str(e)}"}
 
+def index_embedding(prediction_id, embedding, image_hash=None):
+    """Add a saved prediction's embedding to the similar-case index"""
+    index = embedding_index
+    if index is None or embedding is None or prediction_id is None:
+        return
+    try:
+        index.add(prediction_id, embedding, image_hash)
+    except Exception as e:
+        print(f"Error indexing embedding: {e}")
+
+def format_prediction(probabilities):
+    """Turn one row of model output into the prediction result dictionary"""
+    predicted_class_idx = int(np.argmax(probabilities))
+    predicted_class = DISEASE_CLASSES[predicted_class_idx]
+    
+    return {
+        "predicted_class": predicted_class,
+        "disease": predicted_class,
+        "confidence": float(probabilities[predicted_class_idx]),
+        "all_probabilities": {
+            DISEASE_CLASSES[i]: float(probabilities[i]) 
+            for i in range(len(DISEASE_CLASSES))
+        }
+    }
+
 def get_treatment_recommendations(disease):
     """Get treatment recommendations based on disease"""
     recommendations = {
@@ -385,51 +1056,59 @@ def get_chatbot_response(user_message, conversation_history=[]):
         return get_mango_response_from_db(user_message)
 
 def save_chat_message(user_id, message, response):
-    """Save chat message and response to database"""
-    connection = None
+    """Queue a chat message and response for the write-behind writer"""
     try:
-        connection = get_db_connection()
-        if connection:
-            cursor = connection.cursor()
-            cursor.execute("SHOW TABLES LIKE 'chat_history'")
-            if not cursor.fetchone():
-                return False
-            
-            cursor.execute(
-                """INSERT INTO chat_history (user_id, message, response, created_at) 
-                   VALUES (%s, %s, %s, %s)""",
-                (user_id, message, response, datetime.now())
-            )
-            connection.commit()
-            return True
-        return False
+        # Before the registry has loaded (database down at startup) the row is
+        # queued anyway and spooled until the database is back
+        if schema_registry.loaded and not schema_registry.has_table('chat_history'):
+            return False
+        
+        # Generated here rather than by the database, so a replayed batch is a no-op
+        return write_queue.put('chat_history', {
+            "client_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "message": message,
+            "response": response,
+            "created_at": datetime.now()
+        })
             
     except Exception as e:
         print(f"Error saving chat message: {e}")
-        if connection:
-            connection.rollback()
         return False
-    finally:
-        if connection:
-            try:
-                connection.close()
-            except:
-                pass
+
+def save_prediction(user_id, image_path, predicted_class, confidence, version):
+    """
+    Queue a predictions row and return its id (raises IdAllocationError without a database)
+
+    None when the row was dropped (write queue and spool full), so no client is
+    handed an id that will never exist.
+    """
+    prediction_id = prediction_ids.allocate()[0]
+    queued = write_queue.put('predictions', {
+        "id": prediction_id,
+        "user_id": user_id,
+        "image_path": image_path,
+        "predicted_disease": predicted_class,
+        "confidence": confidence,
+        "model_version": version,
+        "created_at": datetime.now()
+    })
+    return prediction_id if queued else None
 
 def get_user_conversation_history(user_id, limit=6):
     """Get recent conversation history for context"""
     try:
+        write_queue.wait_for('chat_history', user_id=user_id)
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor()
-            cursor.execute("SHOW TABLES LIKE 'chat_history'")
-            if not cursor.fetchone():
+            if not schema_registry.has_table('chat_history'):
                 return []
             
+            cursor = connection.cursor()
             cursor.execute(
                 """SELECT message, response FROM chat_history 
                    WHERE user_id = %s 
-                   ORDER BY created_at DESC 
+                   ORDER BY created_at DESC, id DESC 
                    LIMIT %s""",
                 (user_id, limit)
             )
@@ -574,6 +1253,9 @@ def predict():
         if 'user_id' not in session:
             return jsonify({"error": "Authentication required"}), 401
         
+        if model is None:
+            return model_unavailable_response()
+        
         if 'image' not in request.files:
             return jsonify({"error": "No image file provided"}), 400
         
@@ -582,73 +1264,554 @@ def predict():
             return jsonify({"error": "No file selected"}), 400
         
         if file and allowed_file(file.filename):
-            filename = str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            prediction_result = predict_disease(filepath)
+            image_bytes = file.read()
+            prediction_result = predict_disease(io.BytesIO(image_bytes))
             
             if "error" in prediction_result:
                 return jsonify(prediction_result), 500
             
-            connection = get_db_connection()
-            if connection:
-                cursor = connection.cursor()
-                cursor.execute(
-                    """INSERT INTO predictions (user_id, image_path, predicted_disease, 
-                       confidence, created_at) VALUES (%s, %s, %s, %s, %s)""",
-                    (session['user_id'], filepath, prediction_result['predicted_class'], 
-                     prediction_result['confidence'], datetime.now())
-                )
-                connection.commit()
-                prediction_id = cursor.lastrowid
-                connection.close()
-                
-                return jsonify({
-                    "id": prediction_id,
-                    "predicted_class": prediction_result['predicted_class'],
-                    "disease": prediction_result['predicted_class'],
-                    "confidence": prediction_result['confidence'],
-                    "all_probabilities": prediction_result['all_probabilities'],
-                    "recommendations": get_treatment_recommendations(prediction_result['predicted_class'])
-                }), 200
-            else:
+            filepath = persist_upload(image_bytes, file.filename.rsplit('.', 1)[1].lower(),
+                                      prediction_result['image_hash'])
+            
+            try:
+                prediction_id = save_prediction(session['user_id'], filepath, prediction_result['predicted_class'],
+                                                prediction_result['confidence'], prediction_result['model_version'])
+            except IdAllocationError as e:
+                print(f"✗ Could not allocate a prediction id: {e}")
                 return jsonify({"error": "Database connection failed"}), 500
+            index_embedding(prediction_id, prediction_result['embedding'], prediction_result['image_hash'])
+            
+            return jsonify({
+                "id": prediction_id,
+                "model_version": prediction_result['model_version'],
+                "predicted_class": prediction_result['predicted_class'],
+                "disease": prediction_result['predicted_class'],
+                "confidence": prediction_result['confidence'],
+                "all_probabilities": prediction_result['all_probabilities'],
+                "recommendations": get_treatment_recommendations(prediction_result['predicted_class'])
+            }), 200
+        else:
+            return jsonify({"error": "Invalid file type"}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def read_zip_images(file, limit):
+    """Extract up to `limit` allowed images from an uploaded zip archive as (filename, bytes) pairs"""
+    images = []
+    with zipfile.ZipFile(io.BytesIO(file.read())) as archive:
+        for info in archive.infolist():
+            if len(images) >= limit:
+                break
+            name = os.path.basename(info.filename)
+            if info.is_dir() or info.filename.startswith('__MACOSX/') or not allowed_file(name):
+                continue
+            if info.file_size > MAX_CONTENT_LENGTH:
+                images.append((name, None))
+                continue
+            images.append((name, archive.read(info)))
+    return images
+
+def collect_batch_uploads():
+    """Gather (filename, bytes) pairs from every `image` part and any zip archives in the request"""
+    uploads = []
+    for file in request.files.getlist('image') + request.files.getlist('archive'):
+        if not file or file.filename == '':
+            continue
+        # Read one past the limit so oversized batches can be rejected
+        remaining = BATCH_MAX_IMAGES + 1 - len(uploads)
+        if remaining <= 0:
+            break
+        if file.filename.lower().endswith('.zip'):
+            uploads.extend(read_zip_images(file, remaining))
         else:
+            uploads.append((file.filename, file.read()))
+    return uploads
+
+def decode_batch_upload(filename, data):
+    """Validate, preprocess and store one image from a batch; returns (tensor, filepath, error)"""
+    if not allowed_file(filename):
+        return None, None, "Invalid file type"
+    if not data:
+        return None, None, "Empty or oversized file"
+    
+    processed_image = preprocess_image(io.BytesIO(data))
+    if processed_image is None:
+        return None, None, "Failed to process image"
+    
+    filepath = persist_upload(data, filename.rsplit('.', 1)[1].lower())
+    
+    return processed_image, filepath, None
+
+def save_batch_predictions(user_id, rows):
+    """Queue batch results with ids from one allocation; returns the prediction ids in row order (None if dropped)"""
+    try:
+        ids = prediction_ids.allocate(len(rows))
+    except IdAllocationError as e:
+        print(f"✗ Could not allocate prediction ids: {e}")
+        return [None] * len(rows)
+    
+    columns = ('user_id', 'image_path', 'predicted_disease', 'confidence', 'model_version', 'created_at')
+    return [prediction_id if write_queue.put('predictions', dict(zip(columns, row), id=prediction_id)) else None
+            for prediction_id, row in zip(ids, rows)]
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many images in one request, streaming one JSON line per image as results complete"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        
+        if model is None:
+            return model_unavailable_response()
+        
+        try:
+            uploads = collect_batch_uploads()
+        except zipfile.BadZipFile:
+            return jsonify({"error": "Invalid zip archive"}), 400
+        
+        if not uploads:
+            return jsonify({"error": "No image files provided"}), 400
+        
+        if len(uploads) > BATCH_MAX_IMAGES:
+            return jsonify({"error": f"Too many images. Maximum is {BATCH_MAX_IMAGES} per batch"}), 400
+        
+        current_user_id = session['user_id']
+        
+        def generate_results():
+            rows = []
+            row_indexes = []
+            row_embeddings = []
+            pending = []
+            chunk = []
+            
+            def submit_chunk(entries):
+                batch = np.concatenate([entry[3] for entry in entries], axis=0)
+                try:
+                    return entries, inference_scheduler.submit(batch)
+                except Exception as e:
+                    return entries, e
+            
+            def finish_chunk(entries, future):
+                lines = []
+                try:
+                    if isinstance(future, Exception):
+                        raise future
+                    outputs, (version, _) = future.result()
+                    predictions, embeddings = split_outputs(outputs)
+                except Exception as e:
+                    for index, name, _, _ in entries:
+                        lines.append({"index": index, "filename": name, "error": f"Prediction failed: {str(e)}"})
+                    return lines
+                
+                for i, ((index, name, filepath, _), probabilities) in enumerate(zip(entries, predictions)):
+                    result = format_prediction(probabilities)
+                    rows.append((current_user_id, filepath, result['predicted_class'],
+                                 result['confidence'], version, datetime.now()))
+                    row_indexes.append(index)
+                    row_embeddings.append(embeddings[i] if embeddings is not None else None)
+                    result.update({
+                        "index": index,
+                        "filename": name,
+                        "recommendations": get_treatment_recommendations(result['predicted_class'])
+                    })
+                    lines.append(result)
+                return lines
+            
+            decode_jobs = {
+                batch_decode_pool.submit(decode_batch_upload, name, data): (index, name)
+                for index, (name, data) in enumerate(uploads)
+            }
+            
+            # Decoded images are scored in chunks as soon as a chunk fills up
+            for job in as_completed(decode_jobs):
+                index, name = decode_jobs[job]
+                try:
+                    processed_image, filepath, error = job.result()
+                except Exception as e:
+                    processed_image, filepath, error = None, None, str(e)
+                
+                if error:
+                    yield json.dumps({"index": index, "filename": name, "error": error}) + '\n'
+                    continue
+                
+                chunk.append((index, name, filepath, processed_image))
+                if len(chunk) >= BATCH_PREDICT_CHUNK_SIZE:
+                    pending.append(submit_chunk(chunk))
+                    chunk = []
+                
+                while pending and not isinstance(pending[0][1], Exception) and pending[0][1].done():
+                    for line in finish_chunk(*pending.pop(0)):
+                        yield json.dumps(line) + '\n'
+            
+            if chunk:
+                pending.append(submit_chunk(chunk))
+            
+            for entries, future in pending:
+                for line in finish_chunk(entries, future):
+                    yield json.dumps(line) + '\n'
+            
+            ids = [None] * len(rows)
+            if rows:
+                try:
+                    ids = save_batch_predictions(current_user_id, rows)
+                    for prediction_id, embedding in zip(ids, row_embeddings):
+                        index_embedding(prediction_id, embedding)
+                except Exception as e:
+                    print(f"Error saving batch predictions: {e}")
+            
+            yield json.dumps({
+                "done": True,
+                "total": len(uploads),
+                "succeeded": len(rows),
+                "failed": len(uploads) - len(rows),
+                "saved": sum(1 for prediction_id in ids if prediction_id is not None),
+                "ids": {str(index): prediction_id for index, prediction_id in zip(row_indexes, ids)}
+            }) + '\n'
+        
+        return Response(
+            generate_results(),
+            content_type='application/x-ndjson; charset=utf-8',
+            headers={
+                'Cache-Control': 'no-cache',
+                'Access-Control-Allow-Origin': 'http://localhost:5173',
+                'Access-Control-Allow-Credentials': 'true'
+            }
+        )
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/predict/tiled', methods=['POST'])
+def predict_tiled_image():
+    """Score a large photo tile by tile and return a per-tile disease map plus an aggregate verdict"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        
+        if model is None:
+            return model_unavailable_response()
+        
+        # Must be raised before request.files is parsed
+        request.max_content_length = TILE_MAX_CONTENT_LENGTH
+        if 'image' not in request.files:
+            return jsonify({"error": "No image file provided"}), 400
+        
+        file = request.files['image']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        
+        if not allowed_file(file.filename):
             return jsonify({"error": "Invalid file type"}), 400
+        
+        image_bytes = file.read()
+        versions = set()
+        
+        def predict_tiles(batch):
+            # Record the version that scored each batch, as tagged by the scheduler
+            outputs, (tile_version, _) = inference_scheduler.predict(batch)
+            versions.add(tile_version)
+            return split_outputs(outputs)[0]
+        
+        start = time.perf_counter()
+        for _ in range(2):
+            versions.clear()
+            try:
+                result = predict_tiled(
+                    image_bytes,
+                    predict_tiles,
+                    DISEASE_CLASSES,
+                    tile_size=IMG_SIZE[0],
+                    stride=TILE_STRIDE,
+                    batch_size=TILE_BATCH_SIZE,
+                    max_side=TILE_MAX_SIDE
+                )
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                # DecompressionBombError: more than twice Image.MAX_IMAGE_PIXELS, refused before decoding
+                return jsonify({"error": f"Could not decode image: {e}"}), 400
+            if len(versions) == 1:
+                break
+            # A model swap landed between tile batches: score the whole image again
+        else:
+            return (jsonify({"error": "The model changed while scoring, please retry"}), 503,
+                    {'Retry-After': str(MODEL_RETRY_AFTER_SECONDS)})
+        version = versions.pop()
+        result["processing_ms"] = (time.perf_counter() - start) * 1000.0
+        result["model_version"] = version
+        
+        verdict = result["aggregate"]
+        filepath = persist_upload(image_bytes, file.filename.rsplit('.', 1)[1].lower())
+        
+        try:
+            result["id"] = save_prediction(session['user_id'], filepath, verdict['predicted_class'],
+                                           verdict['confidence'], version)
+        except IdAllocationError as e:
+            print(f"✗ Could not allocate a prediction id: {e}")
+            return jsonify({"error": "Database connection failed"}), 500
+        
+        result["recommendations"] = get_treatment_recommendations(verdict['predicted_class'])
+        return jsonify(result), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/predict/<int:prediction_id>/similar', methods=['GET'])
+def similar_predictions(prediction_id):
+    """Past predictions whose images look most like this one (nearest embeddings)"""
+    connection = None
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        
+        index = embedding_index
+        if index is None:
+            return jsonify({"error": "Similar-case search is not available for the serving model"}), 503
+        
+        k = max(1, min(request.args.get('k', 10, type=int), SIMILAR_MAX_K))
+        
+        write_queue.wait_for('predictions', row_id=prediction_id)
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({"error": "Database connection failed"}), 500
+        cursor = connection.cursor()
+        cursor.execute("SELECT id FROM predictions WHERE id = %s AND user_id = %s",
+                       (prediction_id, session['user_id']))
+        if not cursor.fetchone():
+            return jsonify({"error": "Prediction not found"}), 404
+        
+        embedding = index.get(prediction_id)
+        if embedding is None:
+            return jsonify({"error": f"No embedding stored for this prediction under model version {model_version}"}), 404
+        
+        start = time.perf_counter()
+        neighbours = index.search(embedding, k=k, exclude_id=prediction_id)
+        search_ms = (time.perf_counter() - start) * 1000.0
+        
+        details = {}
+        if neighbours:
+            placeholders = ', '.join(['%s'] * len(neighbours))
+            cursor.execute(
+                f"""SELECT id, predicted_disease, confidence, created_at, model_version
+                    FROM predictions WHERE id IN ({placeholders})""",
+                [neighbour_id for neighbour_id, _ in neighbours]
+            )
+            details = {row[0]: row for row in cursor.fetchall()}
+        
+        similar = []
+        for neighbour_id, score in neighbours:
+            row = details.get(neighbour_id)
+            if row is None:
+                continue  # deleted since it was indexed
+            similar.append({
+                "id": neighbour_id,
+                "similarity": score,
+                "disease": row[1],
+                "confidence": row[2],
+                "date": row[3].strftime('%Y-%m-%d %H:%M:%S'),
+                "model_version": row[4]
+            })
+        
+        return jsonify({
+            "id": prediction_id,
+            "model_version": model_version,
+            "search_ms": search_ms,
+            "similar": similar
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
+@app.route('/api/predict/<int:prediction_id>/thumbnail', methods=['GET'])
+def prediction_thumbnail(prediction_id):
+    """Downscaled WebP/JPEG of a prediction's upload (?size=small|medium|large&format=webp|jpeg)"""
+    connection = None
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        
+        size = request.args.get('size', 'small')
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({"error": f"Unknown size, expected one of {list(THUMBNAIL_SIZES)}"}), 400
+        
+        fmt = request.args.get('format')
+        if not fmt:
+            fmt = 'webp' if 'webp' in thumbnail_cache.formats and request.accept_mimetypes['image/webp'] else 'jpeg'
+        if fmt not in thumbnail_cache.formats:
+            return jsonify({"error": f"Unsupported format, expected one of {thumbnail_cache.formats}"}), 400
+        
+        write_queue.wait_for('predictions', row_id=prediction_id)
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({"error": "Database connection failed"}), 500
+        cursor = connection.cursor()
+        cursor.execute("SELECT image_path FROM predictions WHERE id = %s AND user_id = %s",
+                       (prediction_id, session['user_id']))
+        row = cursor.fetchone()
+        connection.close()
+        connection = None
+        if not row:
+            return jsonify({"error": "Prediction not found"}), 404
+        
+        image_path = row[0]
+        if not image_path:
+            return jsonify({"error": "No image stored for this prediction"}), 404
+        
+        # Upload store names are content hashes, so a thumbnail never changes under its ETag
+        key = os.path.splitext(os.path.basename(image_path))[0]
+        etag = f"{key}-{size}-{fmt}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            missing = stored_upload_response(image_path)
+            if missing:
+                return missing
+            try:
+                path = thumbnail_cache.get(image_path, key, size, fmt)
+            except ThumbnailBusy as e:
+                return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+            response = send_file(path, mimetype=THUMBNAIL_FORMATS[fmt][1], conditional=False, etag=False)
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'private, max-age={THUMBNAIL_MAX_AGE}, immutable'
+        response.headers['Vary'] = 'Accept, Cookie'
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
+@app.route('/api/predict/<int:prediction_id>/explanation', methods=['GET'])
+def prediction_explanation(prediction_id):
+    """Grad-CAM heatmap over a prediction's image (?format=json for the class and raw heatmap)"""
+    connection = None
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        
+        if model is None:
+            return model_unavailable_response()
+        
+        explainer_path = explainer_model_path()
+        if not explainer_path:
+            return jsonify({"error": f"Explanations need the Keras model the {INFERENCE_BACKEND} model was converted "
+                                     f"from: model.h5 beside it in the registry, or GRADCAM_MODEL_PATH"}), 503
+        
+        write_queue.wait_for('predictions', row_id=prediction_id)
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({"error": "Database connection failed"}), 500
+        cursor = connection.cursor()
+        cursor.execute("SELECT image_path, predicted_disease FROM predictions WHERE id = %s AND user_id = %s",
+                       (prediction_id, session['user_id']))
+        row = cursor.fetchone()
+        connection.close()
+        connection = None
+        if not row:
+            return jsonify({"error": "Prediction not found"}), 404
+        image_path, predicted_disease = row
+        
+        # The Grad-CAM model itself is only loaded on a miss, inside the scheduler task
+        version = model_version
+        fingerprint = explainer_fingerprint(explainer_path)
+        cached = explanation_cache.get(prediction_id, fingerprint)
+        if cached is not None:
+            overlay_path, metadata = cached
+        else:
+            if not image_path:
+                return jsonify({"error": "No image stored for this prediction"}), 404
+            missing = stored_upload_response(image_path)
+            if missing:
+                return missing
+            
+            processed_image = preprocess_image(image_path)
+            if processed_image is None:
+                return jsonify({"error": "Failed to process image"}), 500
+            
+            start = time.perf_counter()
+            try:
+                outputs, (explainer, fingerprint) = inference_scheduler.submit(
+                    processed_image, task='gradcam').result(timeout=EXPLANATION_TIMEOUT_SECONDS)
+                output = outputs[0]
+            except (RuntimeError, TimeoutError) as e:
+                # Queue full, or predictions kept the scheduler busy past the timeout
+                message = str(e) or "Explanation timed out while predictions were prioritised"
+                return jsonify({"error": message}), 503, {'Retry-After': str(MODEL_RETRY_AFTER_SECONDS)}
+            
+            num_classes = len(DISEASE_CLASSES)
+            heatmap = output[num_classes:].reshape(explainer.cam_shape)
+            explained = format_prediction(output[:num_classes])
+            metadata = {
+                "prediction_id": prediction_id,
+                "predicted_disease": predicted_disease,
+                "explained_class": explained['predicted_class'],
+                "confidence": explained['confidence'],
+                "all_probabilities": explained['all_probabilities'],
+                "model_version": version,
+                "explainer_fingerprint": fingerprint,
+                "layer": explainer.layer_name,
+                "heatmap": np.round(heatmap, 3).tolist(),
+                "compute_ms": (time.perf_counter() - start) * 1000.0
+            }
+            overlay = render_overlay(image_path, heatmap, max_side=EXPLANATION_MAX_SIDE)
+            overlay_path = explanation_cache.put(prediction_id, fingerprint, overlay, metadata)
+        
+        if request.args.get('format') == 'json':
+            return jsonify(metadata), 200
+        
+        response = send_file(overlay_path, mimetype='image/jpeg', conditional=False, etag=False)
+        response.set_etag(f"{prediction_id}-{fingerprint}")
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Explained-Class'] = metadata['explained_class']
+        response.headers['X-Model-Version'] = str(metadata.get('model_version'))
+        return response.make_conditional(request)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
+    connection = None
     try:
         if 'user_id' not in session:
             return jsonify({"error": "Authentication required"}), 401
         
+        limit = page_size(request.args.get('limit'), HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        write_queue.wait_for('predictions', user_id=session['user_id'])
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor()
-            cursor.execute(
-                """SELECT id, predicted_disease, confidence, created_at 
-                   FROM predictions WHERE user_id = %s ORDER BY created_at DESC LIMIT 20""",
-                (session['user_id'],)
+            predictions, next_cursor = fetch_page(
+                cursor, 'predictions',
+                """SELECT id, created_at, predicted_disease, confidence, model_version, image_path 
+                   FROM predictions WHERE user_id = %s""",
+                (session['user_id'],), token=request.args.get('cursor'), limit=limit
             )
-            predictions = cursor.fetchall()
             
             history = []
             for pred in predictions:
                 history.append({
                     "id": pred[0],
-                    "disease": pred[1],
-                    "confidence": pred[2],
-                    "date": pred[3].strftime('%Y-%m-%d %H:%M:%S')
+                    "disease": pred[2],
+                    "confidence": pred[3],
+                    "date": pred[1].strftime('%Y-%m-%d %H:%M:%S'),
+                    "model_version": pred[4],
+                    "thumbnail_url": f"/api/predict/{pred[0]}/thumbnail" if pred[5] else None
                 })
             
-            return jsonify({"history": history}), 200
+            return jsonify({"history": history, "next_cursor": next_cursor}), 200
         else:
             return jsonify({"error": "Database connection failed"}), 500
     
+    except InvalidPage as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -738,19 +1901,7 @@ def chat_stream():
                             if data_part == '[DONE]':
                                 if full_response and messages:
                                     user_message = messages[-1]['content']
-                                    try:
-                                        connection = get_db_connection()
-                                        if connection:
-                                            cursor = connection.cursor()
-                                            cursor.execute(
-                                                """INSERT INTO chat_history (user_id, message, response, created_at) 
-                                                   VALUES (%s, %s, %s, %s)""",
-                                                (current_user_id, user_message, full_response, datetime.now())
-                                            )
-                                            connection.commit()
-                                            connection.close()
-                                    except Exception as save_error:
-                                        print(f"Save error: {save_error}")
+                                    save_chat_message(current_user_id, user_message, full_response)
                                         
                                 yield 'data: [DONE]\n\n'
                                 break
@@ -798,35 +1949,38 @@ def get_chat_history():
         if 'user_id' not in session:
             return jsonify({"error": "Authentication required"}), 401
         
+        limit = page_size(request.args.get('limit'), HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        write_queue.wait_for('chat_history', user_id=session['user_id'])
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor()
-            cursor.execute("SHOW TABLES LIKE 'chat_history'")
-            if not cursor.fetchone():
+            if not schema_registry.has_table('chat_history'):
                 return jsonify({"error": "Chat history table not found"}), 500
             
-            cursor.execute(
-                """SELECT message, response, created_at 
+            cursor = connection.cursor()
+            rows, next_cursor = fetch_page(
+                cursor, 'chat_history',
+                """SELECT id, created_at, message, response 
                    FROM chat_history 
-                   WHERE user_id = %s 
-                   ORDER BY created_at DESC 
-                   LIMIT 20""",
-                (session['user_id'],)
+                   WHERE user_id = %s""",
+                (session['user_id'],), token=request.args.get('cursor'), limit=limit
             )
             
             history = []
-            for row in cursor.fetchall():
+            for row in rows:
                 history.append({
-                    "message": row[0],
-                    "response": row[1],
-                    "timestamp": row[2].isoformat() if row[2] else None
+                    "id": row[0],
+                    "message": row[2],
+                    "response": row[3],
+                    "timestamp": row[1].isoformat() if row[1] else None
                 })
             
             connection.close()
-            return jsonify({"history": history}), 200
+            return jsonify({"history": history, "next_cursor": next_cursor}), 200
         else:
             return jsonify({"error": "Database connection failed"}), 500
             
+    except InvalidPage as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching chat history: {e}")
         return jsonify({"error": "Failed to fetch chat history"}), 500
@@ -885,6 +2039,9 @@ def get_disease_info():
 def predict_test():
     """Test prediction without authentication (for development)"""
     try:
+        if model is None:
+            return model_unavailable_response()
+        
         if 'image' not in request.files:
             return jsonify({"error": "No image file provided"}), 400
         
@@ -893,16 +2050,7 @@ def predict_test():
             return jsonify({"error": "No file selected"}), 400
         
         if file and allowed_file(file.filename):
-            filename = str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            prediction_result = predict_disease(filepath)
-            
-            try:
-                os.remove(filepath)
-            except:
-                pass
+            prediction_result = predict_disease(io.BytesIO(file.read()))
             
             if "error" in prediction_result:
                 return jsonify(prediction_result), 500
@@ -920,6 +2068,189 @@ def predict_test():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/model/info', methods=['GET'])
+def get_model_info():
+    """Get information about the loaded model"""
+    try:
+        if model is None:
+            return jsonify({
+                "model_loaded": False,
+                "model_state": model_state["status"],
+                "error": model_state["error"] or "Model not loaded"
+            }), 503 if model_state["status"] == "loading" else 500
+        
+        info = model.metadata()
+        info.update({
+            "model_loaded": True,
+            "model_version": model_version,
+            "model_state": model_state["status"],
+            "load_seconds": model_state["load_seconds"],
+            "classes": DISEASE_CLASSES,
+            "num_classes": len(DISEASE_CLASSES),
+            "image_size": IMG_SIZE,
+            "batch_buckets": model.get_bucket_metrics()
+        })
+        return jsonify(info), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def admin_authorized():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route('/api/admin/models', methods=['GET'])
+def list_model_versions():
+    """Versions available in the model registry and the state of the last swap"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    return jsonify({
+        "registry": MODEL_REGISTRY_DIR,
+        "serving": model_version,
+        "active": model_registry.active_version(),
+        "versions": model_registry.describe(serving_version=model_version),
+        "swap": swap_state
+    }), 200
+
+@app.route('/api/admin/models/<version>/activate', methods=['POST'])
+def activate_model_version(version):
+    """Load a registry version in the background, warm it up and swap it in"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    try:
+        model_registry.artifact_path(version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    
+    if not start_model_swap(version):
+        return jsonify({"error": "A model is already loading, try again later", "swap": swap_state}), 409
+    
+    return jsonify({"message": f"Loading model version {version}", "swap": swap_state}), 202
+
+@app.route('/api/admin/shadow/<version>', methods=['POST'])
+def start_shadow_model(version):
+    """Shadow a registry version on a sample of live predictions"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    try:
+        model_registry.artifact_path(version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    
+    if not start_shadow_loading(version):
+        return jsonify({"error": "A shadow model is already loading, try again later", "shadow": shadow_state}), 409
+    
+    return jsonify({"message": f"Loading shadow model version {version}", "shadow": shadow_state}), 202
+
+@app.route('/api/admin/shadow', methods=['DELETE'])
+def stop_shadow_model():
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    stop_shadow()
+    return jsonify({"message": "Shadow mode stopped", "shadow": shadow_state}), 200
+
+@app.route('/api/admin/uploads', methods=['GET'])
+def upload_store_metrics():
+    """Upload store deduplication counters and the last compaction result"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    metrics = upload_store.get_metrics()
+    metrics["retention"] = {
+        "max_age_days": UPLOAD_RETENTION_DAYS,
+        "max_gb": UPLOAD_RETENTION_MAX_GB,
+        "interval_hours": UPLOAD_COMPACTION_INTERVAL_HOURS
+    }
+    return jsonify(metrics), 200
+
+@app.route('/api/admin/uploads/compact', methods=['POST'])
+def compact_upload_store():
+    """Apply the upload retention budget now"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    try:
+        return jsonify(compact_uploads()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/shadow/metrics', methods=['GET'])
+def shadow_metrics():
+    """Agreement, confusion and latency of the shadowed candidate against the serving model"""
+    metrics = shadow_evaluator.get_metrics()
+    metrics.update(status=shadow_state["status"], error=shadow_state["error"], serving_version=model_version)
+    return jsonify(metrics), 200
+
+@app.route('/api/inference/metrics', methods=['GET'])
+def inference_metrics():
+    """Queue depth and batch size statistics for tuning the inference scheduler"""
+    metrics = inference_scheduler.get_metrics()
+    metrics["backend"] = model.get_metrics() if model is not None else None
+    metrics["tta"] = dict(test_time_augmenter.get_metrics(), enabled=TTA_ENABLED)
+    index = embedding_index
+    metrics["embeddings"] = index.get_metrics() if index is not None else None
+    metrics["explanations"] = dict(explanation_cache.get_metrics(), enabled=bool(explainer_model_path()),
+                                   path=explainer_state["path"], fingerprint=explainer_state["fingerprint"],
+                                   error=explainer_state["error"])
+    return jsonify(metrics), 200
+
+@app.route('/api/cache/metrics', methods=['GET'])
+def cache_metrics():
+    """Hit, miss and eviction counters for the prediction and thumbnail caches, plus near-duplicate reuse"""
+    metrics = prediction_cache.get_metrics()
+    metrics["near_duplicates"] = dict(near_duplicate_index.get_metrics(), enabled=NEAR_DUPLICATE_ENABLED)
+    metrics["thumbnails"] = thumbnail_cache.get_metrics()
+    return jsonify(metrics), 200
+
+@app.route('/api/admin/schema', methods=['GET'])
+def describe_schema():
+    """Cached tables, columns and indexes as of the last introspection"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    migrations = None
+    connection = get_db_connection()
+    if connection:
+        try:
+            pending = [m.version for m in pending_migrations(connection)]
+            migrations = {"latest": LATEST_VERSION, "pending": pending}
+        except Error as e:
+            migrations = {"latest": LATEST_VERSION, "error": str(e)}
+        finally:
+            connection.close()
+    
+    return jsonify({
+        "state": schema_registry.get_state(),
+        "migrations": migrations,
+        "tables": schema_registry.describe()
+    }), 200
+
+@app.route('/api/admin/schema/refresh', methods=['POST'])
+def refresh_schema():
+    """Re-introspect the database, e.g. after running a migration"""
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required"}), 403
+    
+    if not schema_registry.refresh():
+        return jsonify({"error": "Schema introspection failed", "state": schema_registry.get_state()}), 503
+    return jsonify(schema_registry.get_state()), 200
+
+@app.route('/api/db/metrics', methods=['GET'])
+def db_metrics():
+    """Connection pool utilization, checkout waits and health check failures, plus the write-behind queue"""
+    write_behind = dict(write_queue.get_metrics(), ids=prediction_ids.get_metrics())
+    if db_pool is None:
+        return jsonify({"pooling": False, "write_behind": write_behind}), 200
+    return jsonify(dict(db_pool.get_metrics(), pooling=True, write_behind=write_behind)), 200
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """API health check endpoint"""
@@ -936,6 +2267,10 @@ def health_check():
             "timestamp": datetime.now().isoformat(),
             "database": db_status,
             "model": model_status,
+            "model_state": model_state["status"],
+            "model_load_seconds": model_state["load_seconds"],
+            "model_version": model_version,
+            "schema": schema_registry.get_state(),
             "supported_diseases": DISEASE_CLASSES
         }), 200
         
@@ -975,7 +2310,7 @@ log.setLevel(logging.ERROR)
 
 if __name__ == '__main__':
     print("🥭 Starting Enhanced Mango Disease Management API...")
-    print(f"✓ Model Status: {'Loaded' if model else 'Not Loaded'}")
+    print(f"✓ Model Status: {model_state['status'].capitalize()} ({INFERENCE_BACKEND})")
     print(f"✓ Supported Diseases: {', '.join(DISEASE_CLASSES)}")
     print(f"✓ Chat API: OpenRouter {'Available' if OPENROUTER_API_KEY else 'Not Configured'}")
     print(f"✓ Max Response Tokens: {MAX_RESPONSE_TOKENS}")
@@ -0,0 +1,148 @@
+"""
+Compare decode + resize time and peak memory of the image decode backends.
+
+Usage (from backend/):
+    python benchmarks/decode_benchmark.py
+    python benchmarks/decode_benchmark.py --sizes 4000x3000 8000x6000 --repeat 20
+
+Each backend runs in its own subprocess so peak RSS is measured in isolation.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from image_decoder import decode_image  # noqa: E402
+
+IMG_SIZE = (224, 224)
+
+# (name, backend, draft)
+CONFIGS = [
+    ('pil-full', 'pil', False),
+    ('pil-draft', 'pil', True),
+    ('tf-full', 'tf', False),
+    ('tf-draft', 'tf', True),
+]
+
+
+def make_sample_jpeg(width, height, quality=90, seed=0):
+    """Photo-like JPEG: smooth gradients plus noise so it doesn't compress to nothing"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.empty((height, width, 3), dtype=np.float32)
+    pixels[..., 0] = x
+    pixels[..., 1] = y
+    pixels[..., 2] = (x + y) / 2
+    pixels += rng.normal(0, 20, size=(height, width, 1))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def peak_rss_mb():
+    # VmHWM belongs to this process image; ru_maxrss would inherit the parent's peak across fork/exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_worker(backend, draft, sample_path, repeat):
+    with open(sample_path, 'rb') as f:
+        data = f.read()
+    if backend == 'tf':
+        import tensorflow  # noqa: F401  keep the import cost out of the measurement
+
+    baseline = peak_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode_image(data, IMG_SIZE, backend=backend, draft=draft)
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        "jpeg_bytes": len(data),
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "peak_rss_increase_mb": peak_rss_mb() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1600x1200', '4000x3000'],
+                        help='Sample image sizes as WIDTHxHEIGHT')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--backends', nargs='+', default=[name for name, _, _ in CONFIGS])
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if args.worker:
+        backend, draft, sample_path = args.worker.split(':', 2)
+        print(json.dumps(run_worker(backend, draft == '1', sample_path, args.repeat)))
+        return
+
+    # Samples are generated up front so building them doesn't count towards a worker's peak RSS
+    sample_dir = tempfile.mkdtemp(prefix='decode-bench-')
+    samples = {}
+    for size in args.sizes:
+        width, height = map(int, size.split('x'))
+        samples[size] = os.path.join(sample_dir, f"{size}.jpg")
+        with open(samples[size], 'wb') as f:
+            f.write(make_sample_jpeg(width, height))
+
+    results = []
+    for size in args.sizes:
+        for name, backend, draft in CONFIGS:
+            if name not in args.backends:
+                continue
+            proc = subprocess.run(
+                [sys.executable, __file__, '--repeat', str(args.repeat),
+                 '--worker', f"{backend}:{int(draft)}:{samples[size]}"],
+                capture_output=True, text=True,
+                env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3')
+            )
+            if proc.returncode != 0:
+                print(f"✗ {name} @ {size} failed: {proc.stderr.strip().splitlines()[-1:]}", file=sys.stderr)
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            result.update({"backend": name, "size": size})
+            results.append(result)
+
+    for path in samples.values():
+        os.remove(path)
+    os.rmdir(sample_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'size':>11}  {'backend':<10} {'median ms':>10} {'min ms':>8} {'peak +RSS MB':>13}")
+    for r in results:
+        print(f"{r['size']:>11}  {r['backend']:<10} {r['median_ms']:>10.2f} {r['min_ms']:>8.2f} "
+              f"{r['peak_rss_increase_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+End-to-end inference benchmark against a synthetic stand-in model.
+
+Usage (from backend/):
+    python benchmarks/inference_benchmark.py
+    python benchmarks/inference_benchmark.py --output results.json
+    python benchmarks/inference_benchmark.py --concurrency 1 8 32 --batch-sizes 1 8 32 --requests 200
+    INFERENCE_BACKEND=onnx ONNX_MODEL_PATH=... python benchmarks/inference_benchmark.py --model ...
+
+By default a small Keras model with the production input shape and one
+output per DISEASE_CLASSES entry is built in a temp dir, so the suite runs
+without the LFS-tracked weights. Absolute numbers therefore only compare
+releases against each other, not against production latency.
+
+Three stages are measured, each with p50/p95/p99 latency and images/sec:
+  preprocessing  app.preprocess_image on synthetic JPEGs of each --sizes
+  inference      model.predict_batch at each --batch-sizes
+  endpoint       POST /api/predict/test (or --endpoint /api/predict, which
+                 needs MySQL) at each --concurrency level, through the
+                 micro-batching scheduler
+The prediction cache and near-duplicate reuse are disabled so every request
+runs the model. Other app settings (INFERENCE_*, IMAGE_DECODE_*, TTA_*) come
+from the environment.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from decode_benchmark import make_sample_jpeg  # noqa: E402
+
+IMG_SIZE = (224, 224)
+# Same order as app.py
+DISEASE_CLASSES = ['Alternaria', 'Anthracnose', 'Black Mould Rot', 'Healthy', 'Stem and Rot']
+
+
+def build_stand_in_model(path):
+    """Small conv net with the production input/output shapes, randomly initialised"""
+    # Same TensorFlow settings app.py applies before its own import
+    os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    import keras
+
+    inputs = keras.Input(shape=IMG_SIZE[::-1] + (3,))
+    x = keras.layers.Conv2D(16, 3, strides=2, activation='relu')(inputs)
+    x = keras.layers.Conv2D(32, 3, strides=2, activation='relu')(x)
+    x = keras.layers.Conv2D(64, 3, strides=2, activation='relu')(x)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    x = keras.layers.Dense(64, activation='relu')(x)
+    outputs = keras.layers.Dense(len(DISEASE_CLASSES), activation='softmax')(x)
+    keras.Model(inputs, outputs).save(path)
+    return path
+
+
+def summarize(latencies_ms, images, elapsed_s):
+    latencies = np.asarray(latencies_ms)
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "images_per_sec": images / elapsed_s if elapsed_s else None,
+    }
+
+
+def bench_preprocessing(app_module, samples, repeat):
+    results = []
+    for size, data in samples.items():
+        app_module.preprocess_image(io.BytesIO(data))  # warm up
+        timings = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            app_module.preprocess_image(io.BytesIO(data))
+            timings.append((time.perf_counter() - t) * 1000.0)
+        result = summarize(timings, repeat, time.perf_counter() - start)
+        result.update({"size": size, "jpeg_bytes": len(data)})
+        results.append(result)
+    return results
+
+
+def bench_inference(model, batch_sizes, repeat):
+    results = []
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        batch = rng.random((batch_size,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+        model.predict_batch(batch)  # warm up
+        timings = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            model.predict_batch(batch)
+            timings.append((time.perf_counter() - t) * 1000.0)
+        result = summarize(timings, repeat * batch_size, time.perf_counter() - start)
+        result["batch_size"] = batch_size
+        results.append(result)
+    return results
+
+
+def bench_endpoint(app_module, endpoint, samples, concurrency_levels, total_requests, user_id):
+    payloads = list(samples.values())
+    results = []
+    for concurrency in concurrency_levels:
+        app_module.inference_scheduler.reset_metrics()
+        local = threading.local()
+
+        def send(i):
+            if not hasattr(local, 'client'):
+                local.client = app_module.app.test_client()
+                if user_id is not None:
+                    with local.client.session_transaction() as sess:
+                        sess['user_id'] = user_id
+            data = payloads[i % len(payloads)]
+            t = time.perf_counter()
+            response = local.client.post(endpoint, data={'image': (io.BytesIO(data), f'bench-{i}.jpg')})
+            return (time.perf_counter() - t) * 1000.0, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(send, range(total_requests)))
+        elapsed = time.perf_counter() - start
+
+        ok = [ms for ms, status in outcomes if status == 200]
+        scheduler = app_module.inference_scheduler.get_metrics()
+        result = summarize(ok or [0.0], len(ok), elapsed)
+        result.update({
+            "concurrency": concurrency,
+            "requests": total_requests,
+            "errors": total_requests - len(ok),
+            "avg_batch_rows": scheduler["avg_batch_rows"],
+            "avg_queue_wait_ms": scheduler["avg_queue_wait_ms"],
+        })
+        results.append(result)
+    return results
+
+
+def print_table(title, key, rows):
+    print(f"\n{title}")
+    print(f"{key:>14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'images/s':>10}")
+    for r in rows:
+        print(f"{str(r[key]):>14} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['images_per_sec']:>10.1f}" + (f"  ({r['errors']} errors)" if r.get('errors') else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help='Model file to serve instead of the generated stand-in')
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1920x1080', '4000x3000'],
+                        help='Synthetic JPEG sizes as WIDTHxHEIGHT')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8, 16])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--repeat', type=int, default=30, help='Iterations per preprocessing/inference case')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per concurrency level')
+    parser.add_argument('--endpoint', default='/api/predict/test', choices=['/api/predict/test', '/api/predict'])
+    parser.add_argument('--user-id', type=int, default=1, help='Session user for /api/predict')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    backend_name = os.environ.setdefault('INFERENCE_BACKEND', 'keras')
+    if backend_name != 'keras' and not args.model:
+        parser.error(f"--model is required with INFERENCE_BACKEND={backend_name}; the stand-in is a Keras model")
+
+    workdir = tempfile.mkdtemp(prefix='inference-bench-')
+    model_path = args.model or build_stand_in_model(os.path.join(workdir, 'stand_in_model.h5'))
+
+    # app reads its configuration at import time
+    os.environ[f"{backend_name.upper()}_MODEL_PATH"] = model_path
+    os.environ['MODEL_BACKGROUND_LOAD'] = 'false'
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    os.environ['PREDICTION_CACHE_BACKEND'] = 'none'
+    os.environ['NEAR_DUPLICATE_ENABLED'] = 'false'
+    os.environ.setdefault('UPLOAD_PERSIST_MODE', 'off')
+    import app as app_module
+
+    if app_module.model is None:
+        print(f"✗ Model failed to load: {app_module.model_state['error']}", file=sys.stderr)
+        sys.exit(1)
+
+    samples = {}
+    for size in args.sizes:
+        width, height = map(int, size.split('x'))
+        samples[size] = make_sample_jpeg(width, height)
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "inference_backend": backend_name,
+            "inference_workers": app_module.INFERENCE_WORKERS,
+            "decode_backend": app_module.IMAGE_DECODE_BACKEND,
+            "model": "stand-in" if not args.model else model_path,
+            "endpoint": args.endpoint,
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "preprocessing": bench_preprocessing(app_module, samples, args.repeat),
+        "inference": bench_inference(app_module.model, args.batch_sizes, args.repeat),
+        "endpoint": bench_endpoint(app_module, args.endpoint, samples, args.concurrency, args.requests,
+                                   args.user_id if args.endpoint == '/api/predict' else None),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if not args.model:
+        os.remove(model_path)
+    os.rmdir(workdir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    env = results["environment"]
+    print(f"{env['cpu_count']} CPUs, {env['inference_backend']} backend, {env['model']} model")
+    print_table("Preprocessing (decode + resize)", "size", results["preprocessing"])
+    print_table("Inference (predict_batch)", "batch_size", results["inference"])
+    print_table(f"Endpoint ({args.endpoint})", "concurrency", results["endpoint"])
+
+
+if __name__ == '__main__':
+    main()
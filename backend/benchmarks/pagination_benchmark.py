@@ -0,0 +1,181 @@
+"""
+Compare page latency of OFFSET paging and keyset paging at increasing depth.
+
+Usage (from backend/):
+    python benchmarks/pagination_benchmark.py
+    python benchmarks/pagination_benchmark.py --rows 200000 --depths 0 100 1000 5000
+    python benchmarks/pagination_benchmark.py --backend mysql
+
+Fills a scratch table shaped like predictions, indexed on (user_id,
+created_at) as migration 3 does. One heavy user owns --rows rows and other
+users own a further --noise-rows. Every page is then read both ways. The
+sqlite backend needs no server. The mysql backend uses DB_CONFIG and drops
+its scratch table afterwards. Keyset pages come from
+pagination.keyset_query, the same SQL the history endpoints run.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pagination import keyset_query  # noqa: E402
+
+# Same as app.py
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'manglo_db',
+    'user': 'root',
+    'password': ''
+}
+TABLE = 'pagination_benchmark'
+USER_ID = 1
+BASE_QUERY = f"SELECT id, created_at, predicted_disease, confidence FROM {TABLE} WHERE user_id = %s"
+
+
+class Database:
+    """Thin wrapper so both backends take %s placeholders"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        if backend == 'mysql':
+            import mysql.connector
+            self.connection = mysql.connector.connect(**DB_CONFIG)
+        else:
+            self.connection = sqlite3.connect(':memory:')
+        self.cursor = self.connection.cursor()
+
+    def execute(self, sql, params=()):
+        if self.backend == 'sqlite':
+            sql = sql.replace('%s', '?')
+            params = [p.isoformat(' ') if isinstance(p, datetime) else p for p in params]
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall() if self.cursor.description else []
+
+    def executemany(self, sql, rows):
+        if self.backend == 'sqlite':
+            sql = sql.replace('%s', '?')
+            rows = [[p.isoformat(' ') if isinstance(p, datetime) else p for p in row] for row in rows]
+        self.cursor.executemany(sql, rows)
+        self.connection.commit()
+
+
+def fill(db, rows, noise_rows, batch=5000):
+    auto_increment = 'INTEGER PRIMARY KEY' if db.backend == 'sqlite' else 'INT AUTO_INCREMENT PRIMARY KEY'
+    db.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    db.execute(f"""CREATE TABLE {TABLE} (
+                       id {auto_increment},
+                       user_id INT NOT NULL,
+                       predicted_disease VARCHAR(64) NOT NULL,
+                       confidence FLOAT NOT NULL,
+                       created_at DATETIME NOT NULL)""")
+    db.execute(f"CREATE INDEX idx_{TABLE}_user_created ON {TABLE} (user_id, created_at)")
+
+    # Interleaved users and whole-second timestamps, so many rows tie on created_at like real uploads
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    owners = [USER_ID] * rows + [rng.randint(2, 500) for _ in range(noise_rows)]
+    rng.shuffle(owners)
+    pending = []
+    for i, user_id in enumerate(owners):
+        pending.append((user_id, 'Healthy', rng.random(), start + timedelta(seconds=i // 3)))
+        if len(pending) >= batch:
+            db.executemany(f"INSERT INTO {TABLE} (user_id, predicted_disease, confidence, created_at) "
+                           f"VALUES (%s, %s, %s, %s)", pending)
+            pending = []
+    if pending:
+        db.executemany(f"INSERT INTO {TABLE} (user_id, predicted_disease, confidence, created_at) "
+                       f"VALUES (%s, %s, %s, %s)", pending)
+    if db.backend == 'sqlite':
+        db.execute("ANALYZE")
+
+
+def as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def time_query(db, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = db.execute(sql, params)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--rows', type=int, default=100000, help="Rows owned by the paged user")
+    parser.add_argument('--noise-rows', type=int, default=100000, help="Rows owned by other users")
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--depths', type=int, nargs='+', default=[0, 10, 100, 1000, 4000],
+                        help="Page numbers to measure (0 = first page)")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    db = Database(args.backend)
+    start = time.perf_counter()
+    fill(db, args.rows, args.noise_rows)
+    fill_seconds = time.perf_counter() - start
+
+    # Cursor positions: the last row before each measured page, in the endpoints' order
+    ordered = db.execute(f"SELECT id, created_at FROM {TABLE} WHERE user_id = %s "
+                         f"ORDER BY created_at DESC, id DESC", (USER_ID,))
+
+    results = []
+    try:
+        for depth in args.depths:
+            offset = depth * args.page_size
+            if offset >= len(ordered):
+                continue
+            offset_sql = BASE_QUERY + " ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s"
+            offset_ms, offset_rows = time_query(db, offset_sql, (USER_ID, args.page_size, offset), args.repeat)
+
+            after = None
+            if offset:
+                row_id, created_at = ordered[offset - 1]
+                after = (as_datetime(created_at), row_id)
+            keyset_sql, page_params = keyset_query(BASE_QUERY, after, args.page_size)
+            keyset_ms, keyset_rows = time_query(db, keyset_sql, (USER_ID, *page_params), args.repeat)
+
+            results.append({
+                "page": depth,
+                "offset": offset,
+                "offset_ms": offset_ms,
+                "keyset_ms": keyset_ms,
+                "same_rows": [r[0] for r in offset_rows] == [r[0] for r in keyset_rows[:args.page_size]],
+            })
+    finally:
+        if args.backend == 'mysql':
+            db.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        db.connection.close()
+
+    summary = {
+        "backend": args.backend,
+        "rows": args.rows,
+        "noise_rows": args.noise_rows,
+        "page_size": args.page_size,
+        "fill_seconds": fill_seconds,
+        "pages": results,
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{args.backend}: {args.rows} rows for the paged user, {args.noise_rows} for others, "
+          f"{args.page_size} per page")
+    print(f"{'page':>6} {'offset':>8} {'OFFSET ms':>10} {'keyset ms':>10}  same rows")
+    for r in results:
+        print(f"{r['page']:>6} {r['offset']:>8} {r['offset_ms']:>10.3f} {r['keyset_ms']:>10.3f}  "
+              f"{'✓' if r['same_rows'] else '✗'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Measure API startup: time to first /api/health byte and time until the model is ready.
+
+Usage (from backend/):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 5 --json
+    MODEL_BACKGROUND_LOAD=false python benchmarks/startup_benchmark.py   # old blocking behaviour
+
+Each run starts a fresh server process, so results include interpreter start-up
+and imports. Environment variables (INFERENCE_BACKEND, ...) are passed through.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def poll_health(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def measure_startup(timeout):
+    port = free_port()
+    bootstrap = f"import app; app.app.run(host='127.0.0.1', port={port}, use_reloader=False, threaded=True)"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', bootstrap], cwd=BACKEND_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"time_to_first_byte_s": None, "time_to_ready_s": None, "model_state": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            health = poll_health(port)
+            elapsed = time.perf_counter() - start
+            if health is not None:
+                if result["time_to_first_byte_s"] is None:
+                    result["time_to_first_byte_s"] = elapsed
+                # Older servers without model_state are ready as soon as they answer
+                state = health.get("model_state", "ready")
+                if state != "loading":
+                    result["time_to_ready_s"] = elapsed
+                    result["model_state"] = state
+                    break
+            if proc.poll() is not None:
+                result["model_state"] = f"exited ({proc.returncode})"
+                break
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    runs = [measure_startup(args.timeout) for _ in range(args.runs)]
+
+    def median_of(key):
+        values = [r[key] for r in runs if r[key] is not None]
+        return statistics.median(values) if values else None
+
+    summary = {
+        "runs": runs,
+        "median_time_to_first_byte_s": median_of("time_to_first_byte_s"),
+        "median_time_to_ready_s": median_of("time_to_ready_s"),
+        "background_load": os.getenv("MODEL_BACKGROUND_LOAD", "true"),
+        "inference_backend": os.getenv("INFERENCE_BACKEND", "keras"),
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    for i, r in enumerate(runs, 1):
+        ttfb = f"{r['time_to_first_byte_s']:.2f}s" if r['time_to_first_byte_s'] is not None else 'timeout'
+        ready = f"{r['time_to_ready_s']:.2f}s" if r['time_to_ready_s'] is not None else 'timeout'
+        print(f"run {i}: first byte {ttfb}, ready {ready} (model {r['model_state']})")
+    if summary["median_time_to_first_byte_s"] is not None:
+        print(f"median first byte: {summary['median_time_to_first_byte_s']:.2f}s")
+    if summary["median_time_to_ready_s"] is not None:
+        print(f"median ready:      {summary['median_time_to_ready_s']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
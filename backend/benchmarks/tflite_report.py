@@ -0,0 +1,129 @@
+"""
+Accuracy vs latency report for the Keras model and its TFLite variants.
+
+Usage (from backend/):
+    python benchmarks/tflite_report.py --variants ../Model/best_model_final_fp16.tflite \\
+        ../Model/best_model_final_int8.tflite --eval-dir ../dataset/test
+
+--eval-dir should contain one sub-directory per class named as in DISEASE_CLASSES.
+Images in other folders are still used for agreement with the Keras model.
+Without --eval-dir, --synthetic N random inputs are used (agreement only).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from image_decoder import decode_image  # noqa: E402
+from tflite_model import TFLiteModel  # noqa: E402
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+
+IMG_SIZE = (224, 224)
+# Same order as app.py
+DISEASE_CLASSES = ['Alternaria', 'Anthracnose', 'Black Mould Rot', 'Healthy', 'Stem and Rot']
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+
+
+def load_eval_set(eval_dir, max_images):
+    images, labels = [], []
+    for root, _, files in os.walk(eval_dir):
+        folder = os.path.basename(root)
+        label = DISEASE_CLASSES.index(folder) if folder in DISEASE_CLASSES else None
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            with open(os.path.join(root, name), 'rb') as f:
+                images.append(decode_image(f.read(), IMG_SIZE)[0])
+            labels.append(label)
+            if len(images) >= max_images:
+                return np.stack(images), labels
+    return np.stack(images), labels
+
+
+def predict_all(model, images, batch_size):
+    outputs = [model.predict(images[i:i + batch_size], verbose=0) for i in range(0, len(images), batch_size)]
+    return np.concatenate(outputs, axis=0)
+
+
+def measure_latency(model, sample, runs):
+    model.predict(sample, verbose=0)  # warmup / tensor allocation
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict(sample, verbose=0)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def evaluate(name, path, model, images, labels, reference, args):
+    outputs = predict_all(model, images, args.batch_size)
+    predicted = outputs.argmax(axis=1)
+
+    labelled = [(p, l) for p, l in zip(predicted, labels) if l is not None]
+    result = {
+        "model": name,
+        "path": path,
+        "size_mb": os.path.getsize(path) / 1024 / 1024,
+        "accuracy": sum(int(p == l) for p, l in labelled) / len(labelled) if labelled else None,
+        "agreement_with_keras": float(np.mean(predicted == reference.argmax(axis=1))),
+        "mean_abs_prob_diff": float(np.mean(np.abs(outputs - reference))),
+    }
+    result.update(measure_latency(model, images[:1], args.latency_runs))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keras', default='../Model/best_model_final.h5')
+    parser.add_argument('--variants', nargs='+', required=True, help='.tflite files to compare')
+    parser.add_argument('--eval-dir')
+    parser.add_argument('--synthetic', type=int, default=32)
+    parser.add_argument('--max-images', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--latency-runs', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=None, help='TFLite interpreter threads')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    if args.eval_dir:
+        images, labels = load_eval_set(args.eval_dir, args.max_images)
+    else:
+        rng = np.random.default_rng(0)
+        images = rng.random((args.synthetic,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+        labels = [None] * args.synthetic
+
+    keras_model = tf.keras.models.load_model(args.keras)
+    reference = predict_all(keras_model, images, args.batch_size)
+
+    results = [evaluate('keras', args.keras, keras_model, images, labels, reference, args)]
+    for path in args.variants:
+        model = TFLiteModel(path, num_threads=args.threads)
+        name = f"tflite:{os.path.basename(path)}"
+        results.append(evaluate(name, path, model, images, labels, reference, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Evaluated on {len(images)} images ({sum(l is not None for l in labels)} labelled)")
+    print(f"{'model':<45} {'MB':>7} {'accuracy':>9} {'agree':>7} {'|Δp|':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        accuracy = f"{r['accuracy']:.4f}" if r['accuracy'] is not None else 'n/a'
+        print(f"{r['model']:<45} {r['size_mb']:>7.2f} {accuracy:>9} {r['agreement_with_keras']:>7.3f} "
+              f"{r['mean_abs_prob_diff']:>8.5f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Throughput of in-process inference vs the multi-process worker pool.
+
+Usage (from backend/):
+    python benchmarks/worker_pool_benchmark.py
+    python benchmarks/worker_pool_benchmark.py --workers 1 2 4 --batch-size 8 --duration 10 --pin
+
+Client threads keep every worker busy with (batch-size, 224, 224, 3) batches
+for --duration seconds; images/sec is reported per configuration. Each worker
+gets cpu_count / workers intra-op threads unless --intra-op-threads is given.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inference_backends import create_backend  # noqa: E402
+from inference_workers import InferenceWorkerPool  # noqa: E402
+
+IMG_SIZE = (224, 224)
+NUM_CLASSES = 5
+
+
+def run_load(predict, clients, batch_size, duration):
+    batch = np.random.default_rng(0).random((batch_size,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+    counts = [0] * clients
+    latencies = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            predict(batch)
+            latencies[i].append((time.perf_counter() - start) * 1000.0)
+            counts[i] += batch_size
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = sorted(l for per_client in latencies for l in per_client)
+    return {
+        "images_per_sec": sum(counts) / elapsed,
+        "p50_batch_ms": all_latencies[len(all_latencies) // 2] if all_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='../Model/best_model_final.h5')
+    parser.add_argument('--backend', default='keras', choices=['keras', 'tflite', 'onnx'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--intra-op-threads', type=int)
+    parser.add_argument('--inter-op-threads', type=int, default=1)
+    parser.add_argument('--pin', action='store_true', help='Pin each worker to its own cores')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    buckets = [args.batch_size]
+    results = []
+
+    backend = create_backend(args.backend, args.model, batch_buckets=buckets, compiled=True).warmup()
+    result = run_load(backend.predict_batch, 1, args.batch_size, args.duration)
+    result.update({"config": "in-process", "workers": 0})
+    results.append(result)
+    del backend
+
+    for workers in args.workers:
+        intra = args.intra_op_threads or max(1, cpu_count // workers)
+        pool = InferenceWorkerPool(
+            args.backend, args.model, num_workers=workers, max_rows=args.batch_size,
+            input_size=IMG_SIZE, num_classes=NUM_CLASSES, batch_buckets=buckets,
+            intra_op_threads=intra, inter_op_threads=args.inter_op_threads,
+            cpu_affinity='auto' if args.pin else ''
+        ).load()
+        try:
+            result = run_load(pool.predict_batch, workers, args.batch_size, args.duration)
+        finally:
+            pool.close()
+        result.update({"config": f"pool x{workers} ({intra} threads each)", "workers": workers})
+        results.append(result)
+
+    baseline = results[0]["images_per_sec"]
+    for r in results:
+        r["speedup"] = r["images_per_sec"] / baseline if baseline else None
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{cpu_count} CPUs, batch size {args.batch_size}, {args.duration:.0f}s per config")
+    print(f"{'config':<32} {'images/s':>10} {'p50 batch ms':>13} {'speedup':>8}")
+    for r in results:
+        print(f"{r['config']:<32} {r['images_per_sec']:>10.1f} {r['p50_batch_ms']:>13.2f} {r['speedup']:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's max wait"""
+
+
+class PooledConnection:
+    """
+    A checked-out connection; close() hands it back to the pool instead of disconnecting
+
+    Everything else is forwarded to the driver connection. A request-scoped
+    connection ignores close() so several helpers in one request can share
+    it; the request teardown calls release().
+    """
+
+    def __init__(self, pool, connection, request_scoped=False):
+        self._pool = pool
+        self._connection = connection
+        self.request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        connection = self.__dict__.get('_connection')
+        if connection is None:
+            raise AttributeError(f"'{name}' used after the connection went back to the pool")
+        return getattr(connection, name)
+
+    def close(self):
+        if not self.request_scoped:
+            self.release()
+
+    def release(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool._release(connection)
+
+    def __del__(self):
+        # Dropped without close() (e.g. an exception skipped it): let the pool reclaim the slot.
+        # SimpleQueue.put is safe to call from __del__, unlike taking the pool lock
+        connection = self.__dict__.get('_connection')
+        if connection is not None:
+            self._pool._leaked.put(connection)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections
+
+    acquire() reuses the most recently returned idle connection, opens a new
+    one while fewer than `size` exist, and otherwise waits up to max_wait
+    seconds before raising PoolTimeout. Connections idle for longer than
+    health_check_after are pinged before being handed out, and connections
+    older than max_lifetime are replaced. Returned connections are rolled
+    back so no transaction or read snapshot leaks into the next checkout.
+    """
+
+    def __init__(self, connect, size=10, max_wait=5.0, health_check_after=30.0, max_lifetime=3600.0):
+        """
+        Args:
+            connect: Callable opening a new driver connection
+            size: Most connections open at once
+            max_wait: Seconds acquire() waits for a free connection
+            health_check_after: Ping connections that sat idle longer than this (seconds)
+            max_lifetime: Reconnect connections older than this (seconds)
+        """
+        self._connect = connect
+        self.size = max(1, int(size))
+        self.max_wait = max(0.0, float(max_wait))
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+
+        self._idle = deque()  # (connection, created_at, returned_at), most recent last
+        self._created_at = {}
+        self._open = 0
+        self._waiting = 0
+        self._leaked = queue.SimpleQueue()
+        self._available = threading.Condition()
+        self._metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "leaked": 0,
+            "peak_in_use": 0,
+        }
+
+    def acquire(self, request_scoped=False):
+        start = time.perf_counter()
+        deadline = start + self.max_wait
+        with self._available:
+            self._reclaim_leaked()
+            waited = False
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection free after {self.max_wait:.1f}s ({self.size} in use)")
+                waited = True
+                self._waiting += 1
+                self._available.wait(min(remaining, 0.25))
+                self._waiting -= 1
+                self._reclaim_leaked()
+
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._open += 1  # reserve the slot before connecting outside the lock
+            in_use = self._open - len(self._idle)
+            self._metrics["peak_in_use"] = max(self._metrics["peak_in_use"], in_use)
+
+        try:
+            connection = self._checkout(entry)
+        except Exception:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+
+        wait_ms = (time.perf_counter() - start) * 1000.0
+        with self._available:
+            m = self._metrics
+            m["checkouts"] += 1
+            m["waits"] += waited
+            m["total_wait_ms"] += wait_ms
+            m["max_wait_ms"] = max(m["max_wait_ms"], wait_ms)
+        return PooledConnection(self, connection, request_scoped)
+
+    def _checkout(self, entry):
+        """Validate an idle connection, replacing it with a fresh one if it is stale or dead"""
+        if entry is not None:
+            connection, created_at, returned_at = entry
+            now = time.time()
+            if now - created_at > self.max_lifetime:
+                self._discard(connection)
+            elif now - returned_at > self.health_check_after and not self._healthy(connection):
+                with self._available:
+                    self._metrics["health_check_failures"] += 1
+                self._discard(connection)
+            else:
+                return connection
+
+        connection = self._connect()
+        with self._available:
+            self._created_at[id(connection)] = time.time()
+            self._metrics["created"] += 1
+        return connection
+
+    @staticmethod
+    def _healthy(connection):
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        with self._available:
+            self._created_at.pop(id(connection), None)
+            self._metrics["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _release(self, connection):
+        try:
+            # Ends any open transaction, so the next user doesn't read a stale snapshot
+            connection.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        if not healthy:
+            self._discard(connection)
+        with self._available:
+            if healthy:
+                created_at = self._created_at.get(id(connection), time.time())
+                self._idle.append((connection, created_at, time.time()))
+            else:
+                self._open -= 1
+            self._available.notify()
+
+    def _reclaim_leaked(self):
+        """Close connections whose wrapper was garbage collected without release (lock held)"""
+        while True:
+            try:
+                connection = self._leaked.get_nowait()
+            except queue.Empty:
+                return
+            self._open -= 1
+            self._metrics["leaked"] += 1
+            self._created_at.pop(id(connection), None)
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Disconnect idle connections (checked-out ones close when released)"""
+        with self._available:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def get_metrics(self):
+        with self._available:
+            self._reclaim_leaked()
+            metrics = dict(self._metrics)
+            idle = len(self._idle)
+            in_use = self._open - idle
+            waiting = self._waiting
+
+        checkouts = metrics["checkouts"]
+        metrics.update({
+            "size": self.size,
+            "open": in_use + idle,
+            "in_use": in_use,
+            "idle": idle,
+            "waiting": waiting,
+            "utilization": in_use / self.size,
+            "max_wait_seconds": self.max_wait,
+            "avg_wait_ms": metrics["total_wait_ms"] / checkouts if checkouts else 0.0,
+        })
+        return metrics
@@ -0,0 +1,275 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def hash_key(image_hash):
+    """First 64 bits of a hex sha256, as stored per row"""
+    return np.uint64(int(image_hash[:16], 16))
+
+
+class EmbeddingIndex:
+    """
+    Prediction embeddings stored as float16 in memory-mapped arrays, with an IVF nearest neighbour index
+
+    Files in the index directory, grown by doubling:
+        vectors.f16    (capacity, dim) L2-normalised embeddings
+        ids.i64        prediction id of each row (0 = unused)
+        hashes.u64     image hash key of each row (0 = unknown)
+        lists.i32      IVF list of each row (-1 until the index is trained)
+        centroids.npy  IVF centroids
+        meta.json      embedding dimension
+
+    Searches are exact until train_threshold rows exist. After that a
+    spherical k-means partitions the rows into lists and a query scans only
+    the rows of its nprobe closest lists. Scores are cosine similarities.
+    """
+
+    def __init__(self, directory, dim, nprobe=8, train_threshold=10000, initial_capacity=4096):
+        self.directory = directory
+        self.dim = int(dim)
+        self.nprobe = max(1, int(nprobe))
+        self.train_threshold = max(1, int(train_threshold))
+        os.makedirs(directory, exist_ok=True)
+
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored_dim = json.load(f)["dim"]
+            if stored_dim != self.dim:
+                raise ValueError(f"Embedding index in {directory} has dim {stored_dim}, model produces {self.dim}")
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump({"dim": self.dim}, f)
+
+        self._lock = threading.Lock()
+        self._capacity = max(initial_capacity, self._existing_rows())
+        self._open_arrays()
+
+        used = np.flatnonzero(self._ids)
+        self._count = int(used[-1]) + 1 if len(used) else 0
+
+        self._centroids = None
+        self._order = None
+        self._offsets = None
+        self._pending = {}
+        self._pending_rows = 0
+        self._trained_rows = 0
+        self._training = False
+        centroids_path = os.path.join(directory, 'centroids.npy')
+        if os.path.exists(centroids_path):
+            self._centroids = np.load(centroids_path)
+            unassigned = np.flatnonzero(self._lists[:self._count] < 0)
+            if len(unassigned):
+                self._lists[unassigned] = self._nearest_lists(self._vectors[unassigned], self._centroids)
+            self._rebuild_lists()
+            self._trained_rows = self._count
+
+        self._metrics = {"adds": 0, "searches": 0, "total_search_ms": 0.0, "max_search_ms": 0.0,
+                         "trainings": 0, "last_training_s": None}
+        atexit.register(self.close)
+
+    def _existing_rows(self):
+        path = os.path.join(self.directory, 'ids.i64')
+        return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+    def _open_array(self, name, dtype, shape, fill=None):
+        path = os.path.join(self.directory, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        existed = os.path.getsize(path) if os.path.exists(path) else 0
+        if existed < size:
+            with open(path, 'ab') as f:
+                f.truncate(size)
+        array = np.memmap(path, dtype=dtype, mode='r+', shape=shape)
+        if fill is not None and existed < size:
+            array.reshape(-1)[existed // np.dtype(dtype).itemsize:] = fill
+        return array
+
+    def _open_arrays(self):
+        self._vectors = self._open_array('vectors.f16', np.float16, (self._capacity, self.dim))
+        self._ids = self._open_array('ids.i64', np.int64, (self._capacity,))
+        self._hashes = self._open_array('hashes.u64', np.uint64, (self._capacity,))
+        self._lists = self._open_array('lists.i32', np.int32, (self._capacity,), fill=-1)
+
+    @staticmethod
+    def _nearest_lists(vectors, centroids, chunk=65536):
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            block = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+            lists[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+        return lists
+
+    def _rebuild_lists(self):
+        """Group rows by IVF list (CSR layout) and fold in rows added since the last rebuild"""
+        lists = np.asarray(self._lists[:self._count])
+        self._order = np.argsort(lists, kind='stable').astype(np.int64)
+        counts = np.bincount(lists[lists >= 0], minlength=len(self._centroids))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._pending = {}
+        self._pending_rows = 0
+
+    def add(self, prediction_id, embedding, image_hash=None):
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected a {self.dim}-dim embedding, got {vector.shape[0]}")
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        with self._lock:
+            if self._count == self._capacity:
+                self._capacity *= 2
+                self._flush()
+                self._open_arrays()
+            row = self._count
+            self._vectors[row] = vector
+            self._hashes[row] = hash_key(image_hash) if image_hash else 0
+            if self._centroids is not None:
+                list_id = int(np.argmax(self._centroids @ vector))
+                self._lists[row] = list_id
+                self._pending.setdefault(list_id, []).append(row)
+                self._pending_rows += 1
+            # Written last: a row only counts once its id is set
+            self._ids[row] = prediction_id
+            self._count += 1
+            self._metrics["adds"] += 1
+
+            if self._pending_rows >= max(1000, self._count // 20):
+                self._rebuild_lists()
+            retrain = not self._training and self._count >= self.train_threshold and (
+                self._centroids is None or self._count >= 2 * self._trained_rows)
+            if retrain:
+                self._training = True
+
+        if retrain:
+            threading.Thread(target=self._train, name="embedding-index-train", daemon=True).start()
+
+    def _train(self, iterations=10, seed=0):
+        """Fit spherical k-means centroids on a sample and assign every row to its list"""
+        start = time.perf_counter()
+        try:
+            # Snapshot like search(): add() may swap in a larger memmap meanwhile,
+            # and the old mapping still covers the first count rows
+            with self._lock:
+                count = self._count
+                vectors = self._vectors
+            nlist = int(np.clip(2 * np.sqrt(count), 16, 4096))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(count, min(count, nlist * 40), replace=False))
+            sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                order = np.argsort(assignment, kind='stable')
+                members, starts = np.unique(assignment[order], return_index=True)
+                sums = np.add.reduceat(sample[order], starts, axis=0)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                centroids[members] = sums / np.maximum(norms, 1e-12)
+
+            # Rows added while this runs are reassigned under the lock below
+            lists = self._nearest_lists(vectors[:count], centroids)
+
+            with self._lock:
+                self._centroids = centroids
+                self._lists[:count] = lists
+                if self._count > count:
+                    self._lists[count:self._count] = self._nearest_lists(self._vectors[count:self._count], centroids)
+                self._rebuild_lists()
+                self._trained_rows = self._count
+
+            tmp_path = os.path.join(self.directory, 'centroids.tmp.npy')
+            np.save(tmp_path, centroids)
+            os.replace(tmp_path, os.path.join(self.directory, 'centroids.npy'))
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._metrics["trainings"] += 1
+                self._metrics["last_training_s"] = elapsed
+            print(f"✓ Embedding index trained: {count} rows in {nlist} lists ({elapsed:.1f}s)")
+        except Exception as e:
+            print(f"✗ Error training embedding index: {e}")
+        finally:
+            self._training = False
+
+    def _row_for(self, prediction_id):
+        rows = np.flatnonzero(self._ids[:self._count] == prediction_id)
+        return int(rows[-1]) if len(rows) else None
+
+    def get(self, prediction_id):
+        """Stored (normalised) embedding of a prediction, or None"""
+        row = self._row_for(prediction_id)
+        return None if row is None else np.asarray(self._vectors[row], dtype=np.float32)
+
+    def find_by_hash(self, image_hash):
+        """Embedding of the most recent prediction made on the same image bytes, or None"""
+        rows = np.flatnonzero(self._hashes[:self._count] == hash_key(image_hash))
+        return None if not len(rows) else np.asarray(self._vectors[rows[-1]], dtype=np.float32)
+
+    def search(self, embedding, k=10, exclude_id=None):
+        """[(prediction_id, cosine similarity)] of the k closest stored embeddings"""
+        start = time.perf_counter()
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        query = query / max(np.linalg.norm(query), 1e-12)
+
+        with self._lock:
+            count = self._count
+            vectors, ids = self._vectors, self._ids
+            centroids, order, offsets = self._centroids, self._order, self._offsets
+            pending = {list_id: list(rows) for list_id, rows in self._pending.items()}
+
+        if centroids is None:
+            rows = np.arange(count)
+        else:
+            probe = np.argpartition(-(centroids @ query), min(self.nprobe, len(centroids)) - 1)[:self.nprobe]
+            parts = [order[offsets[l]:offsets[l + 1]] for l in probe]
+            parts += [np.asarray(pending[l], dtype=np.int64) for l in probe if l in pending]
+            rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            rows = rows[rows < count]
+
+        results = []
+        if len(rows):
+            candidate_ids = np.asarray(ids[rows])
+            scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+            if exclude_id is not None:
+                scores[candidate_ids == exclude_id] = -np.inf
+            top = min(k, len(rows))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            results = [(int(candidate_ids[i]), float(scores[i])) for i in best if np.isfinite(scores[i])]
+
+        elapsed = (time.perf_counter() - start) * 1000.0
+        with self._lock:
+            self._metrics["searches"] += 1
+            self._metrics["total_search_ms"] += elapsed
+            self._metrics["max_search_ms"] = max(self._metrics["max_search_ms"], elapsed)
+        return results
+
+    def _flush(self):
+        for array in (self._vectors, self._ids, self._hashes, self._lists):
+            array.flush()
+
+    def close(self):
+        # Indexes are replaced on every model swap; don't keep retired ones alive until exit
+        atexit.unregister(self.close)
+        with self._lock:
+            self._flush()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics.update({
+                "directory": self.directory,
+                "rows": self._count,
+                "capacity": self._capacity,
+                "dim": self.dim,
+                "trained": self._centroids is not None,
+                "lists": len(self._centroids) if self._centroids is not None else 0,
+                "nprobe": self.nprobe,
+                "pending_rows": self._pending_rows,
+            })
+        metrics["avg_search_ms"] = metrics["total_search_ms"] / metrics["searches"] if metrics["searches"] else None
+        return metrics
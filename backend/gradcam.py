@@ -0,0 +1,140 @@
+import io
+import json
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+class GradCAM:
+    """
+    Grad-CAM heatmaps for a Keras classifier
+
+    Gradients of the top class score with respect to the last convolutional
+    feature map are averaged into per-channel weights; the weighted, ReLU'd
+    feature map shows which regions drove the prediction. Rows of a batch
+    are independent, so one tape over the whole batch serves every request
+    in it.
+    """
+
+    def __init__(self, model_path, layer_name=None):
+        import tensorflow as tf
+        self._tf = tf
+        model = tf.keras.models.load_model(model_path)
+        layer = model.get_layer(layer_name) if layer_name else self._last_conv_layer(model)
+        self.layer_name = layer.name
+        self._grad_model = tf.keras.Model(model.inputs, [layer.output, model.outputs[0]])
+        self.num_classes = int(model.outputs[0].shape[-1])
+        self.cam_shape = tuple(int(d) for d in layer.output.shape[1:3])
+
+    def _last_conv_layer(self, model):
+        tf = self._tf
+        for layer in reversed(model.layers):
+            if isinstance(layer, tf.keras.layers.InputLayer):
+                continue
+            try:
+                rank = len(layer.output.shape)
+            except (AttributeError, ValueError):
+                continue
+            if rank == 4:
+                return layer
+        raise ValueError("Model has no 4D feature map to explain")
+
+    def explain_batch(self, batch):
+        """
+        (N, num_classes + h * w) rows: the class probabilities, followed by the
+        flattened heatmap for the top class, scaled to [0, 1]
+        """
+        tf = self._tf
+        inputs = tf.constant(batch, dtype=tf.float32)
+        with tf.GradientTape() as tape:
+            features, probabilities = self._grad_model(inputs, training=False)
+            top = tf.argmax(probabilities, axis=1)
+            scores = tf.gather(probabilities, top, axis=1, batch_dims=1)
+        gradients = tape.gradient(scores, features)
+
+        weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(weights * features, axis=-1)).numpy()
+        peaks = cams.reshape(len(cams), -1).max(axis=1)
+        cams /= np.maximum(peaks, 1e-12)[:, None, None]
+        return np.concatenate([probabilities.numpy(), cams.reshape(len(cams), -1)], axis=1)
+
+
+def _colormap(values):
+    """Blue -> cyan -> yellow -> red ramp for values in [0, 1] (no matplotlib dependency)"""
+    stops = np.array([[0, 0, 128], [0, 96, 255], [0, 224, 255], [255, 255, 0], [255, 96, 0], [200, 0, 0]],
+                     dtype=np.float32)
+    position = np.clip(values, 0.0, 1.0) * (len(stops) - 1)
+    low = np.floor(position).astype(np.int32)
+    high = np.minimum(low + 1, len(stops) - 1)
+    fraction = (position - low)[..., None]
+    return (stops[low] * (1 - fraction) + stops[high] * fraction).astype(np.uint8)
+
+
+def render_overlay(image_path, heatmap, alpha=0.45, max_side=512, quality=85):
+    """JPEG bytes of the source image with the heatmap blended over it"""
+    image = Image.open(image_path)
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_side, max_side))
+    image = image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+
+    cam = Image.fromarray(np.asarray(heatmap, dtype=np.float32), mode='F').resize(image.size, Image.BICUBIC)
+    colored = Image.fromarray(_colormap(np.asarray(cam)))
+    overlay = Image.blend(image, colored, alpha)
+
+    buffer = io.BytesIO()
+    overlay.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class ExplanationCache:
+    """
+    Rendered explanations on disk, one overlay + metadata pair per prediction and model version:
+        <directory>/<model version>/<prediction id>.jpg
+        <directory>/<model version>/<prediction id>.json
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "stored": 0}
+
+    def _paths(self, prediction_id, model_version):
+        base = os.path.join(self.directory, str(model_version), str(int(prediction_id)))
+        return base + '.jpg', base + '.json'
+
+    def get(self, prediction_id, model_version):
+        """(overlay path, metadata) or None"""
+        image_path, meta_path = self._paths(prediction_id, model_version)
+        try:
+            with open(meta_path) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = None
+        hit = metadata is not None and os.path.exists(image_path)
+        with self._lock:
+            self._metrics["hits" if hit else "misses"] += 1
+        return (image_path, metadata) if hit else None
+
+    def put(self, prediction_id, model_version, overlay, metadata):
+        image_path, meta_path = self._paths(prediction_id, model_version)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        # Image first, metadata last: get() only trusts pairs whose metadata exists
+        for path, payload, mode in ((image_path, overlay, 'wb'), (meta_path, json.dumps(metadata), 'w')):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode) as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._metrics["stored"] += 1
+        return image_path
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else 0.0
+        metrics["directory"] = self.directory
+        return metrics
@@ -0,0 +1,68 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+DECODE_BACKENDS = ('pil', 'tf')
+
+
+def _pil_decode(data, target_size, draft=True):
+    image = Image.open(io.BytesIO(data))
+
+    # Let libjpeg downscale in the DCT domain (1/2, 1/4 or 1/8) to the
+    # smallest size that is still at least the target, instead of decoding
+    # every pixel of a 12MP photo just to throw most of them away
+    if draft and image.format == 'JPEG':
+        image.draft('RGB', target_size)
+
+    image = image.convert('RGB')
+    image = image.resize(target_size, Image.NEAREST)
+    return np.asarray(image, dtype=np.float32)
+
+
+def _jpeg_scale_ratio(width, height, target_size):
+    """Largest libjpeg scale denominator that keeps the decode at least as big as the target"""
+    ratio = 1
+    for candidate in (2, 4, 8):
+        if width // candidate >= target_size[0] and height // candidate >= target_size[1]:
+            ratio = candidate
+    return ratio
+
+
+def _tf_decode(data, target_size, draft=True):
+    import tensorflow as tf
+
+    if data[:3] == b'\xff\xd8\xff':
+        ratio = 1
+        if draft:
+            height, width, _ = tf.io.extract_jpeg_shape(data).numpy()
+            ratio = _jpeg_scale_ratio(width, height, target_size)
+        image = tf.io.decode_jpeg(data, channels=3, ratio=ratio)
+    else:
+        image = tf.io.decode_image(data, channels=3, expand_animations=False)
+
+    # tf.image.resize takes (height, width); PIL sizes are (width, height)
+    image = tf.image.resize(image, (target_size[1], target_size[0]), method='nearest')
+    return image.numpy().astype(np.float32)
+
+
+def decode_image(data, target_size=(224, 224), backend='pil', draft=True):
+    """
+    Decode raw image bytes into a normalized (1, H, W, 3) float32 model input
+
+    Args:
+        data: Encoded image bytes (JPEG, PNG or GIF)
+        target_size: (width, height) expected by the model
+        backend: 'pil' or 'tf' (tf.io.decode_jpeg)
+        draft: Use reduced-size JPEG decoding when the source is larger than the target
+    """
+    if backend == 'tf':
+        img_array = _tf_decode(data, target_size, draft)
+    elif backend == 'pil':
+        img_array = _pil_decode(data, target_size, draft)
+    else:
+        raise ValueError(f"Unknown decode backend '{backend}', expected one of {DECODE_BACKENDS}")
+
+    img_array = np.expand_dims(img_array, axis=0)
+    img_array /= 255.0
+    return img_array
@@ -0,0 +1,289 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class InferenceBackend:
+    """
+    Common interface for the runtimes that can serve the disease model
+
+    Subclasses implement _load() and _predict(); this class adds warmup and
+    per-backend timing so runtimes can be compared on the same traffic.
+
+    With the embeddings=True option, backends that can expose the model's
+    penultimate features return (N, num_classes + embedding_dim) rows: the
+    class probabilities followed by the embedding, from the same forward pass.
+    embedding_dim stays None when the runtime can't provide them.
+    """
+    name = None
+
+    def __init__(self, model_path, input_size=(224, 224), batch_buckets=None, **options):
+        self.model_path = model_path
+        self.input_size = input_size
+        self.options = options
+        self.model = None
+        self.embedding_dim = None
+        # Batches are padded up to one of these sizes so the runtime only ever sees fixed shapes
+        self.batch_buckets = sorted(set(int(b) for b in batch_buckets)) if batch_buckets else None
+        self._bucket_metrics = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "load_ms": None,
+            "warmup_ms": None,
+            "calls": 0,
+            "rows": 0,
+            "errors": 0,
+            "total_ms": 0.0,
+            "last_ms": None,
+        }
+
+    def load(self):
+        start = time.perf_counter()
+        self._load()
+        self._metrics["load_ms"] = (time.perf_counter() - start) * 1000.0
+        return self
+
+    def warmup(self, batch_sizes=None):
+        """Run dummy batches so the first real request doesn't pay allocation/tracing costs"""
+        start = time.perf_counter()
+        for batch_size in batch_sizes or self.batch_buckets or (1,):
+            bucket_start = time.perf_counter()
+            self._predict(np.zeros((batch_size, self.input_size[1], self.input_size[0], 3), dtype=np.float32))
+            bucket = self._bucket_stats(batch_size)
+            bucket["warmup_ms"] = (time.perf_counter() - bucket_start) * 1000.0
+        self._metrics["warmup_ms"] = (time.perf_counter() - start) * 1000.0
+        return self
+
+    def close(self, drain_timeout=0):
+        """In-process runtimes are freed once the last in-flight batch drops its reference"""
+        return None
+
+    def _bucket_stats(self, batch_size):
+        return self._bucket_metrics.setdefault(batch_size, {"warmup_ms": None, "calls": 0, "total_ms": 0.0})
+
+    def _bucket_for(self, rows):
+        for bucket in self.batch_buckets:
+            if bucket >= rows:
+                return bucket
+        return self.batch_buckets[-1]
+
+    def _predict_bucketed(self, batch):
+        """Pad to the nearest bucket (splitting batches larger than the biggest one) and trim the padding off"""
+        largest = self.batch_buckets[-1]
+        outputs = []
+        for offset in range(0, len(batch), largest):
+            chunk = batch[offset:offset + largest]
+            bucket = self._bucket_for(len(chunk))
+            if len(chunk) < bucket:
+                padding = np.zeros((bucket - len(chunk),) + chunk.shape[1:], dtype=chunk.dtype)
+                chunk_input = np.concatenate([chunk, padding], axis=0)
+            else:
+                chunk_input = chunk
+
+            start = time.perf_counter()
+            outputs.append(np.asarray(self._predict(chunk_input))[:len(chunk)])
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with self._lock:
+                stats = self._bucket_stats(bucket)
+                stats["calls"] += 1
+                stats["total_ms"] += elapsed
+        return np.concatenate(outputs, axis=0) if len(outputs) > 1 else outputs[0]
+
+    def predict_batch(self, batch):
+        """Run one forward pass over a (N, H, W, 3) float32 batch and return (N, num_classes [+ embedding_dim])"""
+        start = time.perf_counter()
+        try:
+            if self.batch_buckets:
+                outputs = self._predict_bucketed(np.asarray(batch, dtype=np.float32))
+            else:
+                outputs = np.asarray(self._predict(batch))
+        except Exception:
+            with self._lock:
+                self._metrics["errors"] += 1
+            raise
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        with self._lock:
+            self._metrics["calls"] += 1
+            self._metrics["rows"] += len(batch)
+            self._metrics["total_ms"] += elapsed
+            self._metrics["last_ms"] = elapsed
+        return outputs
+
+    def metadata(self):
+        return {
+            "backend": self.name,
+            "model_path": self.model_path,
+            "batch_buckets": self.batch_buckets,
+            "input_shape": str(self.input_shape),
+            "output_shape": str(self.output_shape),
+            "embedding_dim": self.embedding_dim,
+        }
+
+    def get_bucket_metrics(self):
+        """Per batch-size bucket warmup time and steady-state latency"""
+        with self._lock:
+            buckets = {size: dict(stats) for size, stats in sorted(self._bucket_metrics.items())}
+        return {
+            str(size): {
+                "warmup_ms": stats["warmup_ms"],
+                "calls": stats["calls"],
+                "avg_latency_ms": stats["total_ms"] / stats["calls"] if stats["calls"] else None,
+            }
+            for size, stats in buckets.items()
+        }
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["backend"] = self.name
+        metrics["avg_ms_per_call"] = metrics["total_ms"] / metrics["calls"] if metrics["calls"] else 0.0
+        metrics["avg_ms_per_row"] = metrics["total_ms"] / metrics["rows"] if metrics["rows"] else 0.0
+        return metrics
+
+    @property
+    def input_shape(self):
+        return self.model.input_shape
+
+    @property
+    def output_shape(self):
+        return self.model.output_shape
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _predict(self, batch):
+        raise NotImplementedError
+
+
+class KerasBackend(InferenceBackend):
+    """
+    Keras model, optionally served through a tf.function traced once per batch bucket
+
+    With compiled=True each bucket size gets its own concrete function with a
+    fixed input signature, skipping model.predict()'s per-call data adapter.
+    """
+    name = 'keras'
+
+    def _load(self):
+        import tensorflow as tf
+        tf.get_logger().setLevel('ERROR')  # Only show errors
+        self._tf = tf
+        self.model = tf.keras.models.load_model(self.model_path)
+        if self.options.get('embeddings'):
+            self.model = self._with_embeddings(self.model)
+        self.compiled = bool(self.options.get('compiled'))
+        self._concrete_functions = {}
+        if self.compiled:
+            self._serving_function = tf.function(lambda images: self.model(images, training=False))
+
+    def _with_embeddings(self, model):
+        """Single-output model emitting [probabilities | features feeding the classifier layer]"""
+        tf = self._tf
+        layer_name = self.options.get('embedding_layer')
+        features = model.get_layer(layer_name).output if layer_name else model.layers[-1].input
+        if len(features.shape) > 2:
+            features = tf.keras.layers.GlobalAveragePooling2D()(features)
+        self.embedding_dim = int(features.shape[-1])
+        fused = tf.keras.layers.Concatenate(axis=-1)([model.outputs[0], features])
+        return tf.keras.Model(model.inputs, fused)
+
+    def _concrete_function(self, batch_size):
+        function = self._concrete_functions.get(batch_size)
+        if function is None:
+            spec = self._tf.TensorSpec((batch_size,) + tuple(self.model.input_shape[1:]), self._tf.float32)
+            function = self._serving_function.get_concrete_function(spec)
+            self._concrete_functions[batch_size] = function
+        return function
+
+    def _predict(self, batch):
+        if not self.compiled:
+            return self.model.predict(batch, verbose=0)
+        function = self._concrete_function(len(batch))
+        return function(self._tf.constant(batch, dtype=self._tf.float32)).numpy()
+
+    def metadata(self):
+        info = super().metadata()
+        info["compiled"] = self.compiled
+        info["traced_batch_sizes"] = sorted(self._concrete_functions)
+        return info
+
+
+class TFLiteBackend(InferenceBackend):
+    name = 'tflite'
+
+    def _load(self):
+        from tflite_model import TFLiteModel
+        self.model = TFLiteModel(self.model_path, num_threads=self.options.get('num_threads'))
+
+    def _predict(self, batch):
+        return self.model.predict(batch)
+
+    def metadata(self):
+        info = super().metadata()
+        info["input_dtype"] = self.model.input_dtype
+        return info
+
+
+class ONNXBackend(InferenceBackend):
+    name = 'onnx'
+
+    def _load(self):
+        import onnxruntime as ort
+
+        session_options = ort.SessionOptions()
+        if self.options.get('num_threads'):
+            session_options.intra_op_num_threads = self.options['num_threads']
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.model = ort.InferenceSession(
+            self.model_path,
+            sess_options=session_options,
+            providers=self.options.get('providers') or ['CPUExecutionProvider']
+        )
+        self._input = self.model.get_inputs()[0]
+        self._output = self.model.get_outputs()[0]
+        # Graphs exported with tools/export_onnx.py --embeddings carry the features as a second output
+        outputs = self.model.get_outputs()
+        self._features = outputs[1] if self.options.get('embeddings') and len(outputs) > 1 else None
+        if self._features is not None:
+            self.embedding_dim = self._features.shape[-1]
+
+    def _predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if self._features is None:
+            return self.model.run([self._output.name], {self._input.name: batch})[0]
+        probabilities, features = self.model.run([self._output.name, self._features.name], {self._input.name: batch})
+        return np.concatenate([probabilities, features.reshape(len(batch), -1)], axis=1)
+
+    @property
+    def input_shape(self):
+        return tuple(d if isinstance(d, int) else None for d in self._input.shape)
+
+    @property
+    def output_shape(self):
+        width = self._output.shape[-1] + self.embedding_dim if self.embedding_dim else self._output.shape[-1]
+        return (None, width if isinstance(width, int) else None)
+
+    def metadata(self):
+        info = super().metadata()
+        info["providers"] = self.model.get_providers()
+        return info
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    ONNXBackend.name: ONNXBackend,
+}
+
+
+def create_backend(name, model_path, input_size=(224, 224), batch_buckets=None, **options):
+    """Instantiate and load the backend registered under `name`"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+    return BACKENDS[name](model_path, input_size=input_size, batch_buckets=batch_buckets, **options).load()
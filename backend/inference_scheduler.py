@@ -0,0 +1,258 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceScheduler:
+    """
+    Micro-batching scheduler that groups concurrent requests into one forward pass
+
+    Besides predictions, other batched model work (e.g. explanations) can be
+    registered as low-priority tasks with add_task(). A task batch only
+    starts when no predictions are waiting, and is batched with requests of
+    the same task only, taking whatever is already queued without waiting.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5.0, max_queue_size=256, concurrency=1):
+        """
+        Args:
+            predict_fn: Callable taking a (N, H, W, C) array and returning (N, num_classes), or a
+                (rows, tag) tuple; every request of the batch then gets (its rows, tag), e.g. so
+                callers know which model version produced them
+            max_batch_size: Maximum number of rows per forward pass
+            max_wait_ms: How long the first queued request waits for others to join its batch
+            max_queue_size: Pending requests allowed before submit() rejects new work
+            concurrency: Batches allowed in flight at once (e.g. one per worker process)
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue_size = max_queue_size
+        # Task name -> pending (batch, future, enqueued_at); None is plain prediction
+        self._queues = {None: deque()}
+        self._task_fns = {None: predict_fn}
+        self._pending = 0
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self._metrics = {
+            "requests": 0,
+            "served": 0,
+            "rows": 0,
+            "batches": 0,
+            "rejected": 0,
+            "errors": 0,
+            "max_queue_depth": 0,
+            "max_batch_rows": 0,
+            "total_wait_ms": 0.0,
+            "total_inference_ms": 0.0,
+            "batch_size_histogram": {},
+            "tasks": {name: {"requests": 0, "batches": 0, "rows": 0, "errors": 0}
+                      for name in self._task_fns if name is not None},
+        }
+
+    def add_task(self, name, fn):
+        """Register low-priority batched work: fn maps a (N, ...) array to N output rows"""
+        with self._ready:
+            self._queues[name] = deque()
+            self._task_fns[name] = fn
+        with self._lock:
+            self._metrics["tasks"][name] = {"requests": 0, "batches": 0, "rows": 0, "errors": 0}
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return self
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"inference-scheduler-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        with self._ready:
+            self._ready.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, batch, task=None):
+        """Queue a (N, H, W, C) array and return a Future resolving to its N prediction (or task) rows"""
+        batch = np.asarray(batch)
+        if batch.ndim < 2 or batch.shape[0] == 0:
+            raise ValueError(f"Expected a non-empty batch, got shape {batch.shape}")
+        if task not in self._task_fns:
+            raise ValueError(f"Unknown scheduler task '{task}'")
+
+        future = Future()
+        with self._ready:
+            full = self._pending >= self.max_queue_size
+            if not full:
+                self._queues[task].append((batch, future, time.perf_counter()))
+                self._pending += 1
+                depth = self._pending
+                self._ready.notify()
+
+        with self._lock:
+            if full:
+                self._metrics["rejected"] += 1
+            elif task is None:
+                self._metrics["requests"] += 1
+            else:
+                self._metrics["tasks"][task]["requests"] += 1
+            if not full and depth > self._metrics["max_queue_depth"]:
+                self._metrics["max_queue_depth"] = depth
+        if full:
+            raise RuntimeError("Inference queue is full, try again later")
+        return future
+
+    def predict(self, batch, timeout=None):
+        """Blocking helper: submit a batch and wait for its prediction rows"""
+        return self.submit(batch).result(timeout=timeout)
+
+    def _take(self, task):
+        self._pending -= 1
+        return self._queues[task].popleft()
+
+    def _collect(self):
+        """
+        Block for the first request, then gather more until the batch is full or the deadline passes
+
+        Predictions always go first; a low-priority task only runs when none are queued.
+        """
+        with self._ready:
+            if not self._pending:
+                self._ready.wait(timeout=0.1)
+            task = next((name for name, pending in self._queues.items() if pending), False)
+            if task is False:
+                return None, []
+
+            items = [self._take(task)]
+            rows = items[0][0].shape[0]
+            queue = self._queues[task]
+            if task is not None:
+                while queue and rows < self.max_batch_size:
+                    items.append(self._take(task))
+                    rows += items[-1][0].shape[0]
+                return task, items
+
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_size:
+                if not queue:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(timeout=remaining)
+                    continue
+                items.append(self._take(task))
+                rows += items[-1][0].shape[0]
+            return task, items
+
+    def _run(self):
+        while not self._stop.is_set():
+            task, items = self._collect()
+            if items:
+                self._execute(items, task)
+
+        # Fail anything still queued so callers don't hang on shutdown
+        with self._ready:
+            for queue in self._queues.values():
+                while queue:
+                    _, future, _ = queue.popleft()
+                    future.set_exception(RuntimeError("Inference scheduler stopped"))
+            self._pending = 0
+
+    def _execute(self, items, task=None):
+        started = time.perf_counter()
+        wait_ms = sum((started - enqueued) * 1000.0 for _, _, enqueued in items)
+
+        try:
+            if len(items) == 1:
+                batch = items[0][0]
+            else:
+                batch = np.concatenate([item[0] for item in items], axis=0)
+            fn = self.predict_fn if task is None else self._task_fns[task]
+            outputs = fn(batch)
+            tagged = isinstance(outputs, tuple)
+            if tagged:
+                outputs, tag = outputs
+            outputs = np.asarray(outputs)
+        except Exception as e:
+            with self._lock:
+                self._metrics["errors"] += 1
+                if task is not None:
+                    self._metrics["tasks"][task]["errors"] += 1
+            for _, future, _ in items:
+                future.set_exception(e)
+            return
+
+        inference_ms = (time.perf_counter() - started) * 1000.0
+
+        # Route each request's rows back to its caller
+        offset = 0
+        for rows, future, _ in items:
+            n = rows.shape[0]
+            future.set_result((outputs[offset:offset + n], tag) if tagged else outputs[offset:offset + n])
+            offset += n
+
+        with self._lock:
+            m = self._metrics
+            if task is not None:
+                # Task batches are reported separately so prediction batching stats stay comparable
+                stats = m["tasks"][task]
+                stats["batches"] += 1
+                stats["rows"] += batch.shape[0]
+                return
+            m["batches"] += 1
+            m["served"] += len(items)
+            m["rows"] += batch.shape[0]
+            m["total_wait_ms"] += wait_ms
+            m["total_inference_ms"] += inference_ms
+            m["max_batch_rows"] = max(m["max_batch_rows"], batch.shape[0])
+            hist = m["batch_size_histogram"]
+            hist[batch.shape[0]] = hist.get(batch.shape[0], 0) + 1
+
+    def get_metrics(self):
+        """Snapshot of queue depth and batching statistics"""
+        with self._lock:
+            m = dict(self._metrics)
+            m["batch_size_histogram"] = {str(k): v for k, v in sorted(m["batch_size_histogram"].items())}
+            m["tasks"] = {name: dict(stats) for name, stats in m["tasks"].items()}
+            depth = self._pending
+
+        batches = m["batches"]
+        served = m["served"]
+        return {
+            "running": any(thread.is_alive() for thread in self._threads),
+            "concurrency": self.concurrency,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": depth,
+            "max_queue_depth": m["max_queue_depth"],
+            "requests": m["requests"],
+            "rejected": m["rejected"],
+            "errors": m["errors"],
+            "batches": batches,
+            "rows": m["rows"],
+            "avg_batch_rows": m["rows"] / batches if batches else 0.0,
+            "max_batch_rows": m["max_batch_rows"],
+            "avg_queue_wait_ms": m["total_wait_ms"] / served if served else 0.0,
+            "avg_inference_ms": m["total_inference_ms"] / batches if batches else 0.0,
+            "batch_size_histogram": m["batch_size_histogram"],
+            "tasks": m["tasks"],
+        }
+
+    def reset_metrics(self):
+        with self._lock:
+            self._reset_metrics()
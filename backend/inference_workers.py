@@ -0,0 +1,435 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class WorkerPoolClosed(RuntimeError):
+    """predict_batch() was called on a pool that has been closed (e.g. retired by a model swap)"""
+
+
+class _WorkerLost(RuntimeError):
+    """A worker process died or stopped answering; it is replaced, not reused"""
+
+
+def parse_cpu_affinity(spec, num_workers):
+    """
+    Turn INFERENCE_WORKER_CPU_AFFINITY into one CPU set per worker
+
+    '' disables pinning, 'auto' splits the available cores evenly between
+    workers, and an explicit spec such as '0-1;2-3' lists each worker's cores.
+    """
+    if not spec or not hasattr(os, 'sched_getaffinity'):
+        return [None] * num_workers
+
+    if spec == 'auto':
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cpus) // num_workers)
+        return [set(cpus[(i * per_worker) % len(cpus):][:per_worker]) for i in range(num_workers)]
+
+    sets = []
+    for group in spec.split(';'):
+        cpus = set()
+        for part in group.split(','):
+            part = part.strip()
+            if '-' in part:
+                low, high = part.split('-')
+                cpus.update(range(int(low), int(high) + 1))
+            elif part:
+                cpus.add(int(part))
+        sets.append(cpus or None)
+    return [sets[i % len(sets)] for i in range(num_workers)]
+
+
+def _configure_worker(backend_name, intra_op_threads, inter_op_threads, cpus):
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    if intra_op_threads:
+        os.environ['OMP_NUM_THREADS'] = str(intra_op_threads)
+    if backend_name == 'keras':
+        import tensorflow as tf
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def _worker_main(conn, input_name, max_rows, input_shape, num_classes, config):
+    """
+    Entry point of a worker process: load the model, then serve batches placed in shared memory
+
+    The output row width (classes plus any embedding) is only known once the
+    model is loaded, so it is reported with "ready" and the parent replies
+    with the name of an output block sized for it.
+    """
+    from inference_backends import create_backend
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    inputs = np.ndarray((max_rows,) + tuple(input_shape), dtype=np.float32, buffer=input_shm.buf)
+
+    try:
+        _configure_worker(config['backend'], config['intra_op_threads'],
+                          config['inter_op_threads'], config['cpus'])
+        backend = create_backend(
+            config['backend'], config['model_path'],
+            input_size=(input_shape[1], input_shape[0]),
+            batch_buckets=config['batch_buckets'],
+            num_threads=config['intra_op_threads'],
+            compiled=config['compiled'],
+            embeddings=config['embeddings']
+        ).warmup()
+        conn.send(("ready", (os.getpid(), backend.embedding_dim)))
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+
+    output_name = conn.recv()
+    if output_name is None:
+        # Pool shut down while starting (e.g. another worker failed to load)
+        del inputs
+        input_shm.close()
+        return
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    outputs = np.ndarray((max_rows, num_classes + (backend.embedding_dim or 0)),
+                         dtype=np.float32, buffer=output_shm.buf)
+
+    try:
+        while True:
+            rows = conn.recv()
+            if rows is None:
+                break
+            try:
+                outputs[:rows] = backend.predict_batch(inputs[:rows])
+                conn.send(("ok", rows))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del inputs, outputs
+        input_shm.close()
+        output_shm.close()
+
+
+class _Worker:
+    def __init__(self, index, process, conn, input_shm, inputs, cpus):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.input_shm = input_shm
+        self.output_shm = None
+        self.inputs = inputs
+        self.outputs = None
+        self.cpus = cpus
+        self.calls = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.lost = False
+
+
+class InferenceWorkerPool:
+    """
+    Pool of model-holding processes fed through per-worker shared memory slots
+
+    A batch is copied once into a free worker's input slot and only its row
+    count goes over the pipe, so tensors are never pickled. predict_batch()
+    is thread safe; run as many callers as there are workers to keep them busy.
+    Exposes the same interface as an InferenceBackend so it can replace one.
+
+    A worker that dies or doesn't answer within call_timeout fails its batch
+    and is replaced by a freshly started process in the background.
+    """
+    name = 'worker_pool'
+
+    def __init__(self, backend_name, model_path, num_workers=2, max_rows=8,
+                 input_size=(224, 224), num_classes=5, batch_buckets=None, compiled=True,
+                 intra_op_threads=None, inter_op_threads=None, cpu_affinity='', start_timeout=300.0,
+                 embeddings=False, call_timeout=60.0, acquire_timeout=30.0):
+        self.backend_name = backend_name
+        self.model_path = model_path
+        self.num_workers = max(1, int(num_workers))
+        self.max_rows = max(1, int(max_rows))
+        self.input_shape = (input_size[1], input_size[0], 3)
+        self.num_classes = num_classes
+        self.batch_buckets = batch_buckets
+        self.compiled = compiled
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.cpu_sets = parse_cpu_affinity(cpu_affinity, self.num_workers)
+        self.start_timeout = start_timeout
+        self.call_timeout = call_timeout
+        self.acquire_timeout = acquire_timeout
+        self.embeddings = embeddings
+        self.embedding_dim = None
+        self._workers = []
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._context = multiprocessing.get_context('spawn')
+        self._metrics = {"load_ms": None, "calls": 0, "rows": 0, "errors": 0, "total_ms": 0.0,
+                         "workers_lost": 0, "respawns": 0, "respawn_failures": 0}
+
+    @property
+    def output_shape(self):
+        return (None, self.num_classes + (self.embedding_dim or 0))
+
+    def _start_worker(self, index, cpus):
+        input_bytes = self.max_rows * int(np.prod(self.input_shape)) * 4
+        input_shm = shared_memory.SharedMemory(create=True, size=input_bytes)
+        parent_conn, child_conn = self._context.Pipe()
+        config = {
+            "backend": self.backend_name,
+            "model_path": self.model_path,
+            "batch_buckets": self.batch_buckets,
+            "compiled": self.compiled,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "cpus": cpus,
+            "embeddings": self.embeddings,
+        }
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, input_shm.name, self.max_rows,
+                  self.input_shape, self.num_classes, config),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return _Worker(
+            index, process, parent_conn, input_shm,
+            np.ndarray((self.max_rows,) + self.input_shape, dtype=np.float32, buffer=input_shm.buf),
+            cpus
+        )
+
+    def _await_ready(self, worker):
+        """Wait for a started worker's model, then hand it its output slot"""
+        if not worker.conn.poll(self.start_timeout):
+            raise RuntimeError(f"Inference worker {worker.index} did not start in {self.start_timeout}s")
+        status, detail = worker.conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"Inference worker {worker.index} failed to load model: {detail}")
+        _, self.embedding_dim = detail
+        width = self.num_classes + (self.embedding_dim or 0)
+        worker.output_shm = shared_memory.SharedMemory(create=True, size=self.max_rows * width * 4)
+        worker.outputs = np.ndarray((self.max_rows, width), dtype=np.float32, buffer=worker.output_shm.buf)
+        worker.conn.send(worker.output_shm.name)
+
+    def load(self):
+        """Start every worker and wait until each has loaded and warmed up its model"""
+        start = time.perf_counter()
+        try:
+            for index, cpus in enumerate(self.cpu_sets):
+                self._workers.append(self._start_worker(index, cpus))
+            for worker in self._workers:
+                self._await_ready(worker)
+                self._free.put(worker)
+        except Exception:
+            self.close()
+            raise
+
+        atexit.register(self.close)
+        self._metrics["load_ms"] = (time.perf_counter() - start) * 1000.0
+        return self
+
+    def warmup(self, batch_sizes=None):
+        # Workers warm themselves up before reporting ready
+        return self
+
+    def _receive(self, worker):
+        """Reply to the last request, polling so a dead or hung worker doesn't block forever"""
+        deadline = time.monotonic() + self.call_timeout
+        while not worker.conn.poll(min(0.5, max(0.0, deadline - time.monotonic()))):
+            if not worker.process.is_alive():
+                raise _WorkerLost(f"Inference worker {worker.index} exited (code {worker.process.exitcode})")
+            if time.monotonic() >= deadline:
+                raise _WorkerLost(f"Inference worker {worker.index} did not answer in {self.call_timeout}s")
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError) as e:
+            raise _WorkerLost(f"Inference worker {worker.index} connection lost: {e}")
+
+    def _run_on_worker(self, worker, chunk):
+        rows = len(chunk)
+        worker.inputs[:rows] = chunk
+        try:
+            worker.conn.send(rows)
+        except OSError as e:
+            raise _WorkerLost(f"Inference worker {worker.index} connection lost: {e}")
+        status, detail = self._receive(worker)
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {worker.index} failed: {detail}")
+        return worker.outputs[:rows].copy()
+
+    def _acquire(self):
+        """Take a free worker, giving up when the pool closes or none frees up in acquire_timeout"""
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            if self._closed:
+                raise WorkerPoolClosed("Inference worker pool is closed")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"No inference worker became free in {self.acquire_timeout}s")
+            try:
+                worker = self._free.get(timeout=min(0.5, remaining))
+            except queue.Empty:
+                continue
+            if self._closed:
+                self._free.put(worker)  # leave it for close() to drain
+                raise WorkerPoolClosed("Inference worker pool is closed")
+            return worker
+
+    def predict_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        worker = self._acquire()
+        start = time.perf_counter()
+        try:
+            outputs = [self._run_on_worker(worker, batch[offset:offset + self.max_rows])
+                       for offset in range(0, len(batch), self.max_rows)]
+        except _WorkerLost as e:
+            with self._lock:
+                self._metrics["errors"] += 1
+                self._metrics["workers_lost"] += 1
+            print(f"✗ {e}; starting a replacement")
+            self._replace(worker)
+            raise RuntimeError(str(e))
+        except Exception:
+            with self._lock:
+                self._metrics["errors"] += 1
+            self._free.put(worker)
+            raise
+        self._free.put(worker)
+
+        elapsed = (time.perf_counter() - start) * 1000.0
+        with self._lock:
+            worker.calls += 1
+            worker.rows += len(batch)
+            worker.total_ms += elapsed
+            self._metrics["calls"] += 1
+            self._metrics["rows"] += len(batch)
+            self._metrics["total_ms"] += elapsed
+        return np.concatenate(outputs, axis=0) if len(outputs) > 1 else outputs[0]
+
+    def _replace(self, worker):
+        """Stop a lost worker and start a new one in its slot without blocking the caller"""
+        worker.lost = True
+
+        def respawn():
+            self._stop_worker(worker, kill=True)
+            if self._closed:
+                return
+            try:
+                replacement = self._start_worker(worker.index, worker.cpus)
+            except Exception as e:
+                with self._lock:
+                    self._metrics["respawn_failures"] += 1
+                print(f"✗ Could not restart inference worker {worker.index}: {e}")
+                return
+            with self._lock:
+                retired = self._closed or worker not in self._workers
+                if not retired:
+                    self._workers[self._workers.index(worker)] = replacement
+            if retired:
+                self._stop_worker(replacement)
+                return
+            try:
+                self._await_ready(replacement)
+            except Exception as e:
+                with self._lock:
+                    self._metrics["respawn_failures"] += 1
+                print(f"✗ Could not restart inference worker {worker.index}: {e}")
+                self._stop_worker(replacement)
+                return
+            with self._lock:
+                self._metrics["respawns"] += 1
+            self._free.put(replacement)
+            print(f"✓ Inference worker {worker.index} restarted (pid {replacement.process.pid})")
+
+        threading.Thread(target=respawn, name=f"inference-worker-{worker.index}-respawn", daemon=True).start()
+
+    def _stop_worker(self, worker, kill=False):
+        """Ask a worker to exit (or SIGKILL one that is hung), then free its shared memory"""
+        try:
+            if kill and worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.conn.send(None)
+                worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(timeout=5)
+        except Exception:
+            pass
+        worker.inputs = worker.outputs = None
+        for shm in (worker.input_shm, worker.output_shm):
+            if shm is None:
+                continue
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        worker.input_shm = worker.output_shm = None
+
+    def close(self, drain_timeout=0):
+        """
+        Stop the workers; with drain_timeout, first wait up to that long for in-flight batches
+
+        Callers waiting for a worker, and any later predict_batch(), get WorkerPoolClosed.
+        """
+        self._closed = True
+        deadline = time.monotonic() + drain_timeout
+        while drain_timeout:
+            with self._lock:
+                live = sum(1 for w in self._workers if not w.lost)
+            if self._free.qsize() >= live or time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            self._stop_worker(worker)
+
+    def metadata(self):
+        return {
+            "backend": f"{self.backend_name} x{self.num_workers} processes",
+            "model_path": self.model_path,
+            "input_shape": str((None,) + self.input_shape),
+            "output_shape": str(self.output_shape),
+            "workers": [
+                {"pid": w.process.pid, "cpus": sorted(w.cpus) if w.cpus else None, "alive": w.process.is_alive()}
+                for w in self._workers
+            ],
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "embedding_dim": self.embedding_dim,
+        }
+
+    def get_bucket_metrics(self):
+        # Buckets live inside the worker processes; report per-worker load instead
+        with self._lock:
+            return {
+                f"worker-{w.index}": {
+                    "calls": w.calls,
+                    "rows": w.rows,
+                    "avg_latency_ms": w.total_ms / w.calls if w.calls else None,
+                }
+                for w in self._workers
+            }
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["backend"] = self.name
+        metrics["workers"] = self.num_workers
+        metrics["closed"] = self._closed
+        metrics["idle_workers"] = self._free.qsize()
+        metrics["avg_ms_per_call"] = metrics["total_ms"] / metrics["calls"] if metrics["calls"] else 0.0
+        metrics["avg_ms_per_row"] = metrics["total_ms"] / metrics["rows"] if metrics["rows"] else 0.0
+        return metrics
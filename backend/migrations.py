@@ -0,0 +1,337 @@
+"""
+Versioned schema for the application database.
+
+MIGRATIONS is the ordered history of the schema; apply_migrations() runs
+the ones not yet recorded in schema_migrations. Every step checks
+information_schema before changing anything, so databases created by hand
+before this module existed are adopted without errors: existing tables,
+columns and equivalent indexes are left alone and only what is missing is
+added. Add new migrations at the end; never edit one that has shipped.
+
+HOT_QUERIES are the request-path queries the indexes exist for;
+check_query_plans() EXPLAINs each one and flags any that stopped using an
+index (tools/check_query_plans.py).
+"""
+import time
+from collections import namedtuple
+from datetime import datetime
+
+Migration = namedtuple('Migration', 'version description steps')
+HotQuery = namedtuple('HotQuery', 'name table sql params')
+
+MIGRATION_LOCK = 'manglo_schema_migrations'
+TABLE_OPTIONS = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+
+def _fetch_value(cursor, query, params):
+    cursor.execute(query, params)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _table_exists(cursor, table):
+    return bool(_fetch_value(
+        cursor,
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    ))
+
+
+def _column_exists(cursor, table, column):
+    return bool(_fetch_value(
+        cursor,
+        """SELECT COUNT(*) FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+        (table, column)
+    ))
+
+
+def _index_covers(cursor, table, columns, index_type, unique=False):
+    """
+    Whether some index of index_type already starts with `columns`, whatever its name
+
+    A unique index only counts when it is exactly on `columns`.
+    """
+    cursor.execute(
+        """SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_TYPE = %s
+           ORDER BY INDEX_NAME, SEQ_IN_INDEX""",
+        (table, index_type)
+    )
+    indexes = {}
+    for index, column, non_unique in cursor.fetchall():
+        if unique and int(non_unique):
+            continue
+        indexes.setdefault(index, []).append(column.decode() if isinstance(column, (bytes, bytearray)) else column)
+    if unique:
+        return any(existing == list(columns) for existing in indexes.values())
+    return any(existing[:len(columns)] == list(columns) for existing in indexes.values())
+
+
+def create_table(table, ddl):
+    """Step running ddl unless the table exists"""
+    def step(cursor):
+        if _table_exists(cursor, table):
+            return False
+        cursor.execute(ddl)
+        return True
+    step.description = f"create table {table}"
+    return step
+
+
+def add_column(table, column, definition):
+    """Step adding a column unless it exists"""
+    def step(cursor):
+        if _column_exists(cursor, table, column):
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    step.description = f"add column {table}.{column}"
+    return step
+
+
+def make_nullable(table, column, definition):
+    """Step redefining a NOT NULL column as `definition` NULL"""
+    def step(cursor):
+        nullable = _fetch_value(
+            cursor,
+            """SELECT IS_NULLABLE FROM information_schema.COLUMNS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+            (table, column)
+        )
+        if nullable in (None, 'YES', b'YES'):
+            return False
+        cursor.execute(f"ALTER TABLE {table} MODIFY COLUMN {column} {definition} NULL")
+        return True
+    step.description = f"make {table}.{column} nullable"
+    return step
+
+
+def add_index(table, name, columns, kind=''):
+    """Step adding an index unless one of the same kind already covers the columns"""
+    index_type = 'FULLTEXT' if kind == 'FULLTEXT' else 'BTREE'
+    prefix = f"{kind} " if kind else ""
+
+    def step(cursor):
+        if _index_covers(cursor, table, columns, index_type, unique=kind == 'UNIQUE'):
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD {prefix}INDEX {name} ({', '.join(columns)})")
+        return True
+    step.description = f"add {prefix.lower()}index {table}.{name}"
+    return step
+
+
+def run_sql(description, sql):
+    """Step running a statement that is idempotent by itself"""
+    def step(cursor):
+        cursor.execute(sql)
+        return cursor.rowcount > 0
+    step.description = description
+    return step
+
+
+MIGRATIONS = [
+    Migration(1, "Initial tables", [
+        create_table('users', f"""CREATE TABLE users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL,
+            UNIQUE KEY uq_users_email (email)
+        ) {TABLE_OPTIONS}"""),
+        create_table('predictions', f"""CREATE TABLE predictions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            image_path VARCHAR(512) NOT NULL,
+            predicted_disease VARCHAR(64) NOT NULL,
+            confidence FLOAT NOT NULL,
+            created_at DATETIME NOT NULL,
+            CONSTRAINT fk_predictions_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ) {TABLE_OPTIONS}"""),
+        create_table('chat_history', f"""CREATE TABLE chat_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            message TEXT NOT NULL,
+            response MEDIUMTEXT NOT NULL,
+            created_at DATETIME NOT NULL,
+            CONSTRAINT fk_chat_history_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ) {TABLE_OPTIONS}"""),
+        create_table('mango_knowledge_base', f"""CREATE TABLE mango_knowledge_base (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            topic VARCHAR(255) NOT NULL,
+            content TEXT NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            subcategory VARCHAR(100) NULL,
+            keywords TEXT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) {TABLE_OPTIONS}"""),
+    ]),
+    Migration(2, "Model version of each prediction", [
+        add_column('predictions', 'model_version', "VARCHAR(64) NULL"),
+    ]),
+    Migration(3, "Indexes for history, chat context, login and knowledge search", [
+        add_index('predictions', 'idx_predictions_user_created', ['user_id', 'created_at']),
+        add_index('chat_history', 'idx_chat_history_user_created', ['user_id', 'created_at']),
+        add_index('users', 'idx_users_email', ['email']),
+        add_index('mango_knowledge_base', 'ft_knowledge_search', ['topic', 'content', 'keywords'], kind='FULLTEXT'),
+        add_index('mango_knowledge_base', 'idx_knowledge_category', ['category', 'subcategory']),
+    ]),
+    Migration(4, "Id sequences, so prediction ids are allocated before the row is written", [
+        create_table('id_sequences', f"""CREATE TABLE id_sequences (
+            name VARCHAR(64) PRIMARY KEY,
+            next_id BIGINT NOT NULL
+        ) {TABLE_OPTIONS}"""),
+        run_sql("seed id_sequences.predictions",
+                """INSERT INTO id_sequences (name, next_id)
+                   SELECT 'predictions', COALESCE(MAX(id), 0) + 1 FROM predictions
+                   ON DUPLICATE KEY UPDATE next_id = next_id"""),
+    ]),
+    Migration(5, "Predictions without a stored upload (UPLOAD_PERSIST_MODE=off)", [
+        make_nullable('predictions', 'image_path', "VARCHAR(512)"),
+    ]),
+    Migration(6, "Client ids on chat rows, so a replayed write-behind batch can't duplicate them", [
+        add_column('chat_history', 'client_id', "CHAR(32) NULL"),
+        add_index('chat_history', 'uq_chat_history_client_id', ['client_id'], kind='UNIQUE'),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _ensure_version_table(cursor):
+    cursor.execute(
+        f"""CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL,
+                duration_ms INT NOT NULL
+            ) {TABLE_OPTIONS}"""
+    )
+
+
+def applied_versions(connection):
+    cursor = connection.cursor()
+    if not _table_exists(cursor, 'schema_migrations'):
+        return set()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {version for (version,) in cursor.fetchall()}
+
+
+def pending_migrations(connection):
+    done = applied_versions(connection)
+    return [migration for migration in MIGRATIONS if migration.version not in done]
+
+
+def apply_migrations(connection, dry_run=False, lock_timeout=30):
+    """
+    Apply pending migrations in order; returns [(version, description, [changes])]
+
+    A named lock keeps concurrently starting workers from racing through the
+    same DDL. MySQL commits DDL implicitly, so each migration is recorded as
+    soon as its steps finish; a failed step leaves it pending and the next
+    run resumes from the first step that still has work to do. With
+    dry_run, reports pending migrations without running them.
+    """
+    if dry_run:
+        return [(m.version, m.description, [step.description for step in m.steps])
+                for m in pending_migrations(connection)]
+
+    cursor = connection.cursor()
+    if not _fetch_value(cursor, "SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, lock_timeout)):
+        raise RuntimeError(f"Another process held the schema migration lock for {lock_timeout}s")
+    try:
+        _ensure_version_table(cursor)
+        applied = []
+        for migration in pending_migrations(connection):  # re-read under the lock
+            start = time.perf_counter()
+            changes = [step.description for step in migration.steps if step(cursor)]
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at, duration_ms) "
+                "VALUES (%s, %s, NOW(), %s)",
+                (migration.version, migration.description, int((time.perf_counter() - start) * 1000))
+            )
+            connection.commit()
+            applied.append((migration.version, migration.description, changes))
+        return applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+
+
+# Same shapes as the request-path queries in app.py. History pages (pagination.keyset_query)
+# order by (created_at, id): InnoDB appends the primary key to secondary indexes, so
+# (user_id, created_at) serves that order and the cursor range without a filesort
+PAGE_AFTER = datetime(2024, 1, 1)
+
+HOT_QUERIES = [
+    HotQuery('prediction_history', 'predictions',
+             """SELECT id, created_at, predicted_disease, confidence, model_version, image_path
+                FROM predictions WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT %s""",
+             (1, 21)),
+    HotQuery('prediction_history_page', 'predictions',
+             """SELECT id, created_at, predicted_disease, confidence, model_version, image_path
+                FROM predictions WHERE user_id = %s
+                AND created_at <= %s AND (created_at < %s OR id < %s)
+                ORDER BY created_at DESC, id DESC LIMIT %s""",
+             (1, PAGE_AFTER, PAGE_AFTER, 1000, 21)),
+    HotQuery('chat_history', 'chat_history',
+             """SELECT id, created_at, message, response FROM chat_history
+                WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT %s""",
+             (1, 21)),
+    HotQuery('chat_history_page', 'chat_history',
+             """SELECT id, created_at, message, response FROM chat_history
+                WHERE user_id = %s
+                AND created_at <= %s AND (created_at < %s OR id < %s)
+                ORDER BY created_at DESC, id DESC LIMIT %s""",
+             (1, PAGE_AFTER, PAGE_AFTER, 1000, 21)),
+    HotQuery('conversation_context', 'chat_history',
+             """SELECT message, response FROM chat_history
+                WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT %s""",
+             (1, 6)),
+    HotQuery('login', 'users',
+             "SELECT id, email, password FROM users WHERE email = %s",
+             ('grower@example.com',)),
+    HotQuery('knowledge_search', 'mango_knowledge_base',
+             """SELECT topic, content, category, subcategory, keywords FROM mango_knowledge_base
+                WHERE MATCH(topic, content, keywords) AGAINST(%s IN NATURAL LANGUAGE MODE)
+                ORDER BY MATCH(topic, content, keywords) AGAINST(%s IN NATURAL LANGUAGE MODE) DESC
+                LIMIT %s""",
+             ('anthracnose treatment', 'anthracnose treatment', 5)),
+]
+
+
+def check_query_plans(connection, queries=HOT_QUERIES):
+    """
+    EXPLAIN each hot query; a plan fails when its table is read without an
+    index (no key, or a full scan). Filesorts are reported but don't fail,
+    since a small table may legitimately sort in memory.
+    """
+    cursor = connection.cursor(dictionary=True)
+    results = []
+    for query in queries:
+        cursor.execute("EXPLAIN " + query.sql, query.params)
+        rows = [{key.lower(): value for key, value in row.items()} for row in cursor.fetchall()]
+        plan = next((row for row in rows if row.get('table') == query.table), None)
+        if plan is None:
+            # "no matching row in const table": answered from a unique index before the read
+            plan = rows[0] if rows else {}
+            const = 'const table' in str(plan.get('extra') or '')
+            problem = None if const else f"{query.table} missing from the plan"
+        elif not plan.get('key') or plan.get('type') == 'ALL':
+            problem = f"full scan of {query.table}"
+        else:
+            problem = None
+        extra = str(plan.get('extra') or '')
+        results.append({
+            "query": query.name,
+            "table": query.table,
+            "type": plan.get('type'),
+            "key": plan.get('key'),
+            "rows": plan.get('rows'),
+            "filesort": 'filesort' in extra.lower(),
+            "extra": extra,
+            "ok": problem is None,
+            "problem": problem,
+        })
+    return results
@@ -0,0 +1,101 @@
+import json
+import os
+import re
+import threading
+import time
+
+# Artifact file expected inside each version directory, per inference backend
+ARTIFACT_NAMES = {
+    'keras': 'model.h5',
+    'tflite': 'model.tflite',
+    'onnx': 'model.onnx',
+}
+
+ACTIVE_FILE = 'ACTIVE'
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def _natural_key(version):
+    # v10 sorts after v9, 2024-06-01 after 2024-05-30
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', version)]
+
+
+class ModelRegistry:
+    """
+    Directory of versioned model artifacts
+
+    Layout:
+        <root>/<version>/model.h5 | model.tflite | model.onnx
+        <root>/<version>/metadata.json   (optional, free-form)
+        <root>/ACTIVE                    (name of the version to serve)
+    """
+
+    def __init__(self, root, backend_name='keras'):
+        self.root = root
+        self.backend_name = backend_name
+        self.artifact_name = ARTIFACT_NAMES.get(backend_name, ARTIFACT_NAMES['keras'])
+        self._lock = threading.Lock()
+
+    def _version_dir(self, version):
+        if not VERSION_PATTERN.match(version or ''):
+            raise ValueError(f"Invalid model version '{version}'")
+        return os.path.join(self.root, version)
+
+    def artifact_path(self, version):
+        path = os.path.join(self._version_dir(version), self.artifact_name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Model version '{version}' has no {self.artifact_name} in {self.root}")
+        return path
+
+    def versions(self):
+        """Version names that contain an artifact for this backend, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        found = [
+            name for name in os.listdir(self.root)
+            if VERSION_PATTERN.match(name) and os.path.isfile(os.path.join(self.root, name, self.artifact_name))
+        ]
+        return sorted(found, key=_natural_key)
+
+    def metadata(self, version):
+        path = os.path.join(self._version_dir(version), 'metadata.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def active_version(self):
+        """Version recorded in ACTIVE, else the newest one, else None"""
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                version = f.read().strip()
+            if version in self.versions():
+                return version
+        except OSError:
+            pass
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def set_active(self, version):
+        """Record the served version so restarts come back on it"""
+        self.artifact_path(version)
+        with self._lock:
+            tmp_path = os.path.join(self.root, f".{ACTIVE_FILE}.tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(version)
+            os.replace(tmp_path, os.path.join(self.root, ACTIVE_FILE))
+
+    def describe(self, serving_version=None):
+        entries = []
+        for version in self.versions():
+            path = os.path.join(self.root, version, self.artifact_name)
+            entries.append({
+                "version": version,
+                "path": path,
+                "size_bytes": os.path.getsize(path),
+                "modified_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(os.path.getmtime(path))),
+                "serving": version == serving_version,
+                "metadata": self.metadata(version),
+            })
+        return entries
@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidPage(ValueError):
+    """The cursor or page size of a listing request is invalid"""
+
+
+def encode_cursor(kind, created_at, row_id):
+    """Opaque token for the position just after the row (created_at, row_id)"""
+    payload = json.dumps([kind, created_at.isoformat(), int(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(kind, token):
+    """(created_at, id) of the last row of the previous page"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        token_kind, created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidPage("Invalid cursor")
+    if token_kind != kind:
+        raise InvalidPage("Cursor belongs to a different listing")
+    return position
+
+
+def page_size(value, default, maximum):
+    """?limit= clamped to [1, maximum]; default when absent"""
+    if value in (None, ''):
+        return default
+    try:
+        return max(1, min(int(value), maximum))
+    except ValueError:
+        raise InvalidPage("limit must be an integer")
+
+
+def keyset_query(query, after=None, limit=20):
+    """
+    SQL and extra params for one page of `query`, newest first
+
+    query is "SELECT ... FROM <table> WHERE <filter>" on a table with
+    created_at and id columns. Rows are ordered by (created_at, id) so rows
+    sharing a timestamp keep a stable order, and the page starts strictly
+    after `after` = (created_at, id) instead of skipping rows with OFFSET,
+    so every page costs the same index range read however deep it is.
+    One extra row is fetched to tell whether another page follows.
+    """
+    params = []
+    if after is not None:
+        created_at, row_id = after
+        # The leading bound is what lets the index seek to the cursor; the OR alone
+        # leaves no range, and the scan would start from the newest row again
+        query += " AND created_at <= %s AND (created_at < %s OR id < %s)"
+        params += [created_at, created_at, row_id]
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+    return query, params
+
+
+def fetch_page(cursor, kind, query, params, token=None, limit=20):
+    """
+    (rows, next_token) for one page of `query` (see keyset_query)
+
+    The first two selected columns must be id and created_at; next_token is
+    None on the last page.
+    """
+    after = decode_cursor(kind, token) if token else None
+    sql, page_params = keyset_query(query, after, limit)
+    cursor.execute(sql, tuple(params) + tuple(page_params))
+    rows = cursor.fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(kind, rows[-1][1], rows[-1][0])
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+HASH_SIZE = 32  # side of the grayscale image the DCT runs on
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(HASH_SIZE)
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def perceptual_hash(image):
+    """
+    64-bit DCT hash (pHash) of a decoded (1, H, W, 3) or (H, W, 3) image
+
+    Recompression, resizing and small crops flip only a few bits, so near
+    duplicates are found by Hamming distance. Returns None for flat images,
+    which carry no structure to hash and would all collide.
+    """
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels = pixels.reshape(pixels.shape[-3:])
+    gray = Image.fromarray(np.ascontiguousarray(pixels @ _LUMA), mode='F')
+    small = np.asarray(gray.resize((HASH_SIZE, HASH_SIZE), Image.BOX), dtype=np.float32)
+
+    # Lowest 8x8 frequencies, minus the DC term when picking the threshold
+    low = (_DCT @ small @ _DCT.T)[:8, :8].reshape(-1)
+    if np.ptp(low[1:]) < 1e-6:
+        return None
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class PerceptualHashIndex:
+    """
+    Recent perceptual hashes with their predictions, searchable by Hamming distance
+
+    A multi-index hash table: the 64 bits are split into max_distance + 1
+    bands, each with its own exact-match table. Two hashes within
+    max_distance bits must agree exactly on at least one band (pigeonhole),
+    so a lookup only compares against entries sharing a band value.
+    The oldest entries are evicted past max_entries.
+    """
+
+    def __init__(self, max_distance=6, max_entries=20000, model_version=None):
+        """
+        Args:
+            max_distance: Largest Hamming distance (of 64 bits) treated as the same photo
+            max_entries: Hashes kept, least recently matched evicted first
+            model_version: Model whose predictions are stored; entries are dropped when it changes
+        """
+        self.max_distance = int(np.clip(max_distance, 0, 15))
+        self.max_entries = max(0, int(max_entries))
+        self.model_version = model_version
+
+        bands = self.max_distance + 1
+        widths = [HASH_BITS // bands + (1 if i < HASH_BITS % bands else 0) for i in range(bands)]
+        shifts = np.concatenate([[0], np.cumsum(widths)[:-1]])
+        self._bands = [(int(shift), (1 << width) - 1) for shift, width in zip(shifts, widths)]
+
+        self._entries = OrderedDict()
+        self._tables = [{} for _ in self._bands]
+        self._lock = threading.Lock()
+        self._metrics = {
+            "lookups": 0,
+            "reuses": 0,
+            "unhashable": 0,
+            "candidates_checked": 0,
+            "total_lookup_ms": 0.0,
+            "max_lookup_ms": 0.0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+        self._distances = [0] * (self.max_distance + 1)
+
+    def _band_keys(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._bands]
+
+    def set_model_version(self, model_version):
+        """Drop stored predictions when the serving model changes"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+            self._entries.clear()
+            self._tables = [{} for _ in self._bands]
+            self._metrics["invalidations"] += 1
+
+    def lookup(self, phash):
+        """(probabilities, image_hash, distance) of the closest stored hash within max_distance, or None"""
+        if phash is None or self.model_version is None:
+            with self._lock:
+                self._metrics["lookups"] += 1
+                self._metrics["unhashable"] += phash is None
+            return None
+
+        start = time.perf_counter()
+        with self._lock:
+            candidates = set()
+            for table, key in zip(self._tables, self._band_keys(phash)):
+                candidates.update(table.get(key, ()))
+
+            best, best_distance = None, self.max_distance + 1
+            for candidate in candidates:
+                distance = hamming_distance(phash, candidate)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+
+            match = None
+            if best is not None:
+                self._entries.move_to_end(best)
+                probabilities, image_hash = self._entries[best]
+                match = (probabilities, image_hash, best_distance)
+                self._metrics["reuses"] += 1
+                self._distances[best_distance] += 1
+
+            elapsed = (time.perf_counter() - start) * 1000.0
+            self._metrics["lookups"] += 1
+            self._metrics["candidates_checked"] += len(candidates)
+            self._metrics["total_lookup_ms"] += elapsed
+            self._metrics["max_lookup_ms"] = max(self._metrics["max_lookup_ms"], elapsed)
+        return match
+
+    def add(self, phash, probabilities, image_hash=None, model_version=None):
+        """Remember a fresh prediction; ignored if it came from a model that has since been replaced"""
+        if phash is None or self.max_entries == 0:
+            return
+        probabilities = [float(p) for p in probabilities]
+
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                return
+            if phash not in self._entries:
+                for table, key in zip(self._tables, self._band_keys(phash)):
+                    table.setdefault(key, set()).add(phash)
+            self._entries[phash] = (probabilities, image_hash)
+            self._entries.move_to_end(phash)
+
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                for table, key in zip(self._tables, self._band_keys(evicted)):
+                    bucket = table[key]
+                    bucket.discard(evicted)
+                    if not bucket:
+                        del table[key]
+                self._metrics["evictions"] += 1
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["entries"] = len(self._entries)
+            distances = {str(d): n for d, n in enumerate(self._distances) if n}
+
+        lookups = metrics["lookups"]
+        metrics.update({
+            "max_distance": self.max_distance,
+            "max_entries": self.max_entries,
+            "bands": len(self._bands),
+            "model_version": self.model_version,
+            "reuse_rate": metrics["reuses"] / lookups if lookups else 0.0,
+            "avg_lookup_ms": metrics["total_lookup_ms"] / lookups if lookups else None,
+            "avg_candidates": metrics["candidates_checked"] / lookups if lookups else None,
+            "reuse_distances": distances,
+        })
+        return metrics
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+def hash_image_bytes(data):
+    """Content hash used as the cache key for an uploaded image"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def compute_model_version(model_path):
+    """Fingerprint a model artifact so cached predictions are tied to the exact weights"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class SQLitePredictionStore:
+    """Persistent cache tier backed by a local SQLite file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS prediction_cache (
+                   image_hash TEXT NOT NULL,
+                   model_version TEXT NOT NULL,
+                   probabilities TEXT NOT NULL,
+                   created_at TEXT NOT NULL,
+                   PRIMARY KEY (image_hash, model_version))"""
+        )
+        self._conn.commit()
+
+    def get(self, image_hash, model_version):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT probabilities FROM prediction_cache WHERE image_hash = ? AND model_version = ?",
+                (image_hash, model_version)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, image_hash, model_version, probabilities):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?)",
+                (image_hash, model_version, json.dumps(probabilities), datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def purge_other_versions(self, model_version):
+        with self._lock:
+            self._conn.execute("DELETE FROM prediction_cache WHERE model_version != ?", (model_version,))
+            self._conn.commit()
+
+
+class MySQLPredictionStore:
+    """Persistent cache tier stored in the application's MySQL database"""
+
+    def __init__(self, connection_factory):
+        self._connect = connection_factory
+        connection = self._connect()
+        if not connection:
+            raise RuntimeError("Database connection failed")
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                """CREATE TABLE IF NOT EXISTS prediction_cache (
+                       image_hash CHAR(64) NOT NULL,
+                       model_version VARCHAR(64) NOT NULL,
+                       probabilities TEXT NOT NULL,
+                       created_at DATETIME NOT NULL,
+                       PRIMARY KEY (image_hash, model_version))"""
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+    def get(self, image_hash, model_version):
+        connection = self._connect()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT probabilities FROM prediction_cache WHERE image_hash = %s AND model_version = %s",
+                (image_hash, model_version)
+            )
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            connection.close()
+
+    def put(self, image_hash, model_version, probabilities):
+        connection = self._connect()
+        if not connection:
+            return
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                """INSERT INTO prediction_cache (image_hash, model_version, probabilities, created_at)
+                   VALUES (%s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE probabilities = VALUES(probabilities)""",
+                (image_hash, model_version, json.dumps(probabilities), datetime.now())
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+    def purge_other_versions(self, model_version):
+        connection = self._connect()
+        if not connection:
+            return
+        try:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM prediction_cache WHERE model_version != %s", (model_version,))
+            connection.commit()
+        finally:
+            connection.close()
+
+
+class PredictionCache:
+    """Two-tier cache of model outputs keyed by image content hash and model version"""
+
+    def __init__(self, max_entries=1024, store=None, model_version=None):
+        self.max_entries = max(0, int(max_entries))
+        self.store = store
+        self.model_version = model_version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "hits": 0,
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "store_errors": 0,
+        }
+
+    def set_model_version(self, model_version):
+        """Drop cached results when the loaded model changes"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+            self._entries.clear()
+            self._metrics["invalidations"] += 1
+
+        if self.store and model_version:
+            try:
+                self.store.purge_other_versions(model_version)
+            except Exception as e:
+                self._record_store_error("purging", e)
+
+    def get(self, image_hash, model_version=None):
+        """Return cached class probabilities for an image hash, or None on a miss (or if model_version isn't current)"""
+        version = self.model_version
+        if version is None or (model_version is not None and model_version != version):
+            return None
+
+        with self._lock:
+            probabilities = self._entries.get(image_hash)
+            if probabilities is not None:
+                self._entries.move_to_end(image_hash)
+                self._metrics["hits"] += 1
+                self._metrics["memory_hits"] += 1
+                return probabilities
+
+        if self.store:
+            try:
+                probabilities = self.store.get(image_hash, version)
+            except Exception as e:
+                self._record_store_error("reading", e)
+                probabilities = None
+
+            if probabilities is not None:
+                self._remember(image_hash, probabilities, version)
+                with self._lock:
+                    self._metrics["hits"] += 1
+                    self._metrics["persistent_hits"] += 1
+                return probabilities
+
+        with self._lock:
+            self._metrics["misses"] += 1
+        return None
+
+    def put(self, image_hash, probabilities, model_version=None):
+        """Cache a result; ignored if model_version (the model that produced it) has since been replaced"""
+        version = self.model_version
+        if version is None or (model_version is not None and model_version != version):
+            return
+        probabilities = [float(p) for p in probabilities]
+        self._remember(image_hash, probabilities, version)
+
+        if self.store:
+            try:
+                self.store.put(image_hash, version, probabilities)
+            except Exception as e:
+                self._record_store_error("writing", e)
+
+    def _remember(self, image_hash, probabilities, model_version):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            if model_version != self.model_version:
+                return  # the model changed while this was being stored
+            self._entries[image_hash] = probabilities
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def _record_store_error(self, action, error):
+        print(f"Error {action} persistent prediction cache: {error}")
+        with self._lock:
+            self._metrics["store_errors"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["entries"] = len(self._entries)
+
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics.update({
+            "max_entries": self.max_entries,
+            "model_version": self.model_version,
+            "persistent_tier": type(self.store).__name__ if self.store else None,
+            "hit_rate": metrics["hits"] / lookups if lookups else 0.0,
+        })
+        return metrics
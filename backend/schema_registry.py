@@ -0,0 +1,168 @@
+import threading
+import time
+
+
+def _text(value):
+    # Some connector/server combinations return information_schema strings as bytes
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+
+class SchemaRegistry:
+    """
+    Tables, columns and indexes of the application database, introspected once and cached
+
+    refresh() reads information_schema in two queries; has_table(),
+    has_column() and has_index() then answer from memory, so request paths
+    don't spend a round trip on SHOW TABLES. Call refresh() again after DDL.
+    If the database is unreachable at startup, lookups retry introspection at
+    most every retry_seconds and report missing tables until it succeeds.
+    """
+
+    def __init__(self, connect, required_tables=(), retry_seconds=30.0):
+        """
+        Args:
+            connect: Callable returning a database connection (or None when the database is down)
+            required_tables: Tables the application needs; get_state() reports which are missing
+            retry_seconds: Least time between introspection attempts while none has succeeded
+        """
+        self._connect = connect
+        self.required_tables = list(required_tables)
+        self.retry_seconds = retry_seconds
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._tables = None  # {table: {"columns": [...], "indexes": {name: {...}}}}
+        self._introspected_at = None
+        self._last_attempt = 0.0
+        self._metrics = {
+            "refreshes": 0,
+            "failures": 0,
+            "lookups": 0,
+            "last_refresh_ms": None,
+            "last_error": None,
+        }
+
+    def refresh(self):
+        """Re-read the schema; returns True on success, keeping the previous snapshot on failure"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            with self._lock:
+                self._last_attempt = time.monotonic()
+            connection = self._connect()
+            if not connection:
+                return self._failed("database connection failed")
+            try:
+                cursor = connection.cursor()
+                cursor.execute(
+                    """SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+                       WHERE TABLE_SCHEMA = DATABASE()
+                       ORDER BY TABLE_NAME, ORDINAL_POSITION"""
+                )
+                tables = {}
+                for table, column in cursor.fetchall():
+                    entry = tables.setdefault(_text(table), {"columns": [], "indexes": {}})
+                    entry["columns"].append(_text(column))
+
+                cursor.execute(
+                    """SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE, INDEX_TYPE
+                       FROM information_schema.STATISTICS
+                       WHERE TABLE_SCHEMA = DATABASE()
+                       ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"""
+                )
+                for table, index, column, non_unique, index_type in cursor.fetchall():
+                    entry = tables.setdefault(_text(table), {"columns": [], "indexes": {}})
+                    info = entry["indexes"].setdefault(_text(index), {
+                        "columns": [],
+                        "unique": not int(non_unique),
+                        "type": _text(index_type),
+                    })
+                    info["columns"].append(_text(column))
+            except Exception as e:
+                return self._failed(str(e))
+            finally:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+            with self._lock:
+                self._tables = tables
+                self._introspected_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+                self._metrics["refreshes"] += 1
+                self._metrics["last_refresh_ms"] = (time.perf_counter() - start) * 1000.0
+                self._metrics["last_error"] = None
+            print(f"✓ Schema introspected: {len(tables)} tables")
+            return True
+
+    def _failed(self, error):
+        with self._lock:
+            self._metrics["failures"] += 1
+            self._metrics["last_error"] = error
+        print(f"✗ Schema introspection failed: {error}")
+        return False
+
+    def _snapshot(self):
+        """Cached tables, retrying introspection if it has never succeeded"""
+        with self._lock:
+            self._metrics["lookups"] += 1
+            tables = self._tables
+            now = time.monotonic()
+            retry = tables is None and now - self._last_attempt >= self.retry_seconds
+            if retry:
+                self._last_attempt = now  # only this caller retries; the rest see the empty snapshot
+        if retry:
+            self.refresh()
+            with self._lock:
+                tables = self._tables
+        return tables or {}
+
+    @property
+    def loaded(self):
+        with self._lock:
+            return self._tables is not None
+
+    def has_table(self, table):
+        return table in self._snapshot()
+
+    def has_column(self, table, column):
+        return column in self._snapshot().get(table, {}).get("columns", ())
+
+    def has_index(self, table, name=None, columns=None):
+        """
+        Whether table has the named index, or any index whose leading
+        columns are `columns` (so it can serve lookups on them)
+        """
+        indexes = self._snapshot().get(table, {}).get("indexes", {})
+        if name is not None:
+            return name in indexes
+        columns = list(columns or ())
+        return any(info["columns"][:len(columns)] == columns for info in indexes.values())
+
+    def describe(self):
+        """Every cached table with its columns and indexes"""
+        with self._lock:
+            tables = self._tables or {}
+            return {
+                table: {"columns": list(entry["columns"]),
+                        "indexes": {name: dict(info, columns=list(info["columns"]))
+                                    for name, info in entry["indexes"].items()}}
+                for table, entry in sorted(tables.items())
+            }
+
+    def get_state(self):
+        """Cached schema summary for health checks; never queries the database"""
+        with self._lock:
+            tables = self._tables
+            metrics = dict(self._metrics)
+            introspected_at = self._introspected_at
+
+        known = tables or {}
+        metrics.update({
+            "loaded": tables is not None,
+            "introspected_at": introspected_at,
+            "table_count": len(known),
+            "tables": {table: "exists" if table in known else ("missing" if tables is not None else "unknown")
+                       for table in self.required_tables},
+            "missing_tables": [table for table in self.required_tables if tables is not None and table not in known],
+        })
+        return metrics
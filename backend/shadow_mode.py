@@ -0,0 +1,155 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ShadowEvaluator:
+    """
+    Scores a sample of live inputs with a candidate model off the request path
+
+    maybe_submit() never blocks: inputs are dropped when the queue is full,
+    so a slow candidate can't hold up primary predictions. A single
+    background thread compares the candidate with the primary result and
+    records agreement, the confusion between them and the latency difference.
+    Primary latency is what the request waited on the scheduler (queue plus
+    batched pass); the candidate's is one unbatched forward pass.
+    """
+
+    def __init__(self, class_names, sample_rate=0.1, max_queue_size=64, max_disagreements=100):
+        """
+        Args:
+            class_names: Class labels, in model output order
+            sample_rate: Fraction of primary predictions also sent to the candidate
+            max_queue_size: Pending shadow inputs; anything beyond is dropped
+            max_disagreements: Most recent disagreements kept for inspection
+        """
+        self.class_names = class_names
+        self.sample_rate = sample_rate
+        self.candidate = None
+        self.candidate_version = None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._recent = deque(maxlen=max_disagreements)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self._metrics = {
+            "sampled": 0,
+            "dropped": 0,
+            "compared": 0,
+            "agreements": 0,
+            "errors": 0,
+            "primary_ms_total": 0.0,
+            "candidate_ms_total": 0.0,
+            "max_probability_delta_total": 0.0,
+        }
+        self._confusion = {}
+        self._recent.clear()
+
+    @property
+    def active(self):
+        return self.candidate is not None
+
+    def set_candidate(self, backend, version=None):
+        """Start shadowing with a loaded backend, or stop with None; counters restart either way"""
+        with self._lock:
+            previous = self.candidate
+            self.candidate = backend
+            self.candidate_version = version if backend is not None else None
+            self._reset_metrics()
+            if backend is not None and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="shadow-model", daemon=True)
+                self._thread.start()
+        return previous
+
+    def maybe_submit(self, image, probabilities, primary_ms, image_hash=None):
+        """Queue a sample of primary predictions for the candidate; returns True if queued"""
+        if self.candidate is None or random.random() >= self.sample_rate:
+            return False
+
+        try:
+            self._queue.put_nowait((image, np.asarray(probabilities), primary_ms, image_hash))
+        except queue.Full:
+            with self._lock:
+                self._metrics["dropped"] += 1
+            return False
+
+        with self._lock:
+            self._metrics["sampled"] += 1
+        return True
+
+    def _run(self):
+        while True:
+            image, primary, primary_ms, image_hash = self._queue.get()
+            candidate = self.candidate
+            if candidate is None:
+                continue
+
+            try:
+                start = time.perf_counter()
+                shadow = np.asarray(candidate.predict_batch(image))[0]
+                candidate_ms = (time.perf_counter() - start) * 1000.0
+            except Exception as e:
+                print(f"Error in shadow prediction: {e}")
+                with self._lock:
+                    self._metrics["errors"] += 1
+                continue
+
+            self._record(primary, shadow, primary_ms, candidate_ms, image_hash)
+
+    def _record(self, primary, shadow, primary_ms, candidate_ms, image_hash):
+        primary_class = self.class_names[int(np.argmax(primary))]
+        shadow_class = self.class_names[int(np.argmax(shadow))]
+
+        with self._lock:
+            self._metrics["compared"] += 1
+            self._metrics["primary_ms_total"] += primary_ms
+            self._metrics["candidate_ms_total"] += candidate_ms
+            self._metrics["max_probability_delta_total"] += float(np.abs(primary - shadow).max())
+            if primary_class == shadow_class:
+                self._metrics["agreements"] += 1
+                return
+
+            key = f"{primary_class} -> {shadow_class}"
+            self._confusion[key] = self._confusion.get(key, 0) + 1
+            self._recent.append({
+                "timestamp": time.time(),
+                "image_hash": image_hash,
+                "primary": primary_class,
+                "primary_confidence": float(primary.max()),
+                "candidate": shadow_class,
+                "candidate_confidence": float(shadow.max()),
+            })
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            confusion = dict(sorted(self._confusion.items(), key=lambda item: -item[1]))
+            recent = list(self._recent)
+
+        compared = metrics["compared"]
+        avg_primary = metrics["primary_ms_total"] / compared if compared else None
+        avg_candidate = metrics["candidate_ms_total"] / compared if compared else None
+        return {
+            "active": self.active,
+            "candidate_version": self.candidate_version,
+            "sample_rate": self.sample_rate,
+            "queue_depth": self._queue.qsize(),
+            "sampled": metrics["sampled"],
+            "dropped": metrics["dropped"],
+            "compared": compared,
+            "errors": metrics["errors"],
+            "agreement_rate": metrics["agreements"] / compared if compared else None,
+            "disagreements": compared - metrics["agreements"],
+            "max_probability_delta_avg": metrics["max_probability_delta_total"] / compared if compared else None,
+            "avg_primary_ms": avg_primary,
+            "avg_candidate_ms": avg_candidate,
+            "avg_latency_delta_ms": avg_candidate - avg_primary if compared else None,
+            "confusion": confusion,
+            "recent_disagreements": recent,
+        }
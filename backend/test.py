@@ -18,6 +18,7 @@ import json
 import time
 import re
 from dotenv import load_dotenv
+from schema_registry import SchemaRegistry
 
 
 load_dotenv()  # Loads the .env file
@@ -91,6 +92,11 @@ def get_db_connection():
         print(f"Error connecting to MySQL: {e}")
         return None
 
+# ✅ Tables and indexes are introspected once instead of SHOW TABLES on every chat call
+REQUIRED_TABLES = ['users', 'predictions', 'chat_history', 'mango_knowledge_base']
+schema_registry = SchemaRegistry(get_db_connection, required_tables=REQUIRED_TABLES)
+schema_registry.refresh()
+
 def preprocess_image(image_file):
     """
     Preprocess image for model prediction - Updated to match test code methodology
@@ -410,14 +416,13 @@ def save_chat_message(user_id, message, response):
     try:
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor()
-            
-            # Ensure we have a valid connection and table exists
-            cursor.execute("SHOW TABLES LIKE 'chat_history'")
-            if not cursor.fetchone():
+            # Table existence comes from the cached schema, not a SHOW TABLES round trip
+            if not schema_registry.has_table('chat_history'):
                 print("chat_history table does not exist")
                 return False
             
+            cursor = connection.cursor()
+            
             # Insert with explicit commit
             cursor.execute(
                 """INSERT INTO chat_history (user_id, message, response, created_at) 
@@ -450,14 +455,13 @@ def get_user_conversation_history(user_id, limit=10):
     try:
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor()
-            
             # Check if table exists first
-            cursor.execute("SHOW TABLES LIKE 'chat_history'")
-            if not cursor.fetchone():
+            if not schema_registry.has_table('chat_history'):
                 print("chat_history table does not exist")
                 return []
             
+            cursor = connection.cursor()
+            
             cursor.execute(
                 """SELECT message, response FROM chat_history 
                    WHERE user_id = %s 
@@ -720,13 +724,12 @@ def get_chat_history():
         
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor()
-            
             # Check if table exists
-            cursor.execute("SHOW TABLES LIKE 'chat_history'")
-            if not cursor.fetchone():
+            if not schema_registry.has_table('chat_history'):
                 return jsonify({"error": "Chat history table not found"}), 500
             
+            cursor = connection.cursor()
+            
             cursor.execute(
                 """SELECT message, response, created_at 
                    FROM chat_history 
@@ -1092,18 +1095,12 @@ def health_check():
         connection = get_db_connection()
         db_status = "connected" if connection else "disconnected"
         
-        # Check tables
-        tables_status = {}
         if connection:
-            cursor = connection.cursor()
-            required_tables = ['users', 'predictions', 'chat_history', 'mango_knowledge_base']
-            
-            for table in required_tables:
-                cursor.execute(f"SHOW TABLES LIKE '{table}'")
-                tables_status[table] = "exists" if cursor.fetchone() else "missing"
-            
             connection.close()
         
+        # Tables as of the last introspection (no queries per health check)
+        schema_state = schema_registry.get_state()
+        
         # Check model status
         model_status = "loaded" if model is not None else "not_loaded"
         
@@ -1111,7 +1108,8 @@ def health_check():
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "database": db_status,
-            "tables": tables_status,
+            "tables": schema_state["tables"],
+            "schema_introspected_at": schema_state["introspected_at"],
             "model": model_status,
             "supported_diseases": DISEASE_CLASSES,
             "api_endpoints": {
@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+
+def images(*values):
+    """One 2x2x1 image per value, filled with that value"""
+    return np.stack([np.full((2, 2, 1), value, dtype=np.float32) for value in values])
+
+
+class Recorder:
+    """predict_fn echoing each image's fill value, remembering the batches it ran"""
+
+    def __init__(self, name='predict', log=None, tag=None):
+        self.name = name
+        self.log = [] if log is None else log
+        self.tag = tag
+
+    def __call__(self, batch):
+        self.log.append((self.name, batch[:, 0, 0, 0].tolist()))
+        rows = batch[:, 0, 0, :] * 10
+        return (rows, self.tag) if self.tag is not None else rows
+
+
+@pytest.fixture
+def scheduler():
+    created = []
+
+    def build(predict_fn, **kwargs):
+        created.append(InferenceScheduler(predict_fn, **kwargs))
+        return created[-1]
+
+    yield build
+    for instance in created:
+        instance.stop()
+
+
+def test_rows_are_routed_back_to_their_request(scheduler):
+    recorder = Recorder()
+    s = scheduler(recorder, max_batch_size=8, max_wait_ms=50)
+    futures = [s.submit(images(1)), s.submit(images(2, 3, 4)), s.submit(images(5, 6))]
+    s.start()
+
+    assert futures[0].result(timeout=5).ravel().tolist() == [10]
+    assert futures[1].result(timeout=5).ravel().tolist() == [20, 30, 40]
+    assert futures[2].result(timeout=5).ravel().tolist() == [50, 60]
+    assert recorder.log == [('predict', [1, 2, 3, 4, 5, 6])]
+    assert s.get_metrics()["batch_size_histogram"] == {"6": 1}
+
+
+def test_batches_stop_at_max_batch_size(scheduler):
+    recorder = Recorder()
+    s = scheduler(recorder, max_batch_size=4, max_wait_ms=50)
+    futures = [s.submit(images(value)) for value in range(10)]
+    s.start()
+
+    assert [f.result(timeout=5).item() for f in futures] == [value * 10 for value in range(10)]
+    assert [len(rows) for _, rows in recorder.log] == [4, 4, 2]
+
+
+def test_tag_is_returned_with_every_slice(scheduler):
+    s = scheduler(Recorder(tag=('v2', 'abc')), max_wait_ms=50)
+    first, second = s.submit(images(1)), s.submit(images(2))
+    s.start()
+
+    rows, tag = first.result(timeout=5)
+    assert rows.ravel().tolist() == [10] and tag == ('v2', 'abc')
+    rows, tag = second.result(timeout=5)
+    assert rows.ravel().tolist() == [20] and tag == ('v2', 'abc')
+
+
+def test_predictions_run_before_queued_tasks(scheduler):
+    log = []
+    s = scheduler(Recorder('predict', log), max_wait_ms=0)
+    s.add_task('gradcam', Recorder('gradcam', log))
+    explanation = s.submit(images(7), task='gradcam')
+    prediction = s.submit(images(1))
+    s.start()
+
+    assert explanation.result(timeout=5).item() == 70
+    assert prediction.result(timeout=5).item() == 10
+    # The task was queued first but waits, and is never batched with predictions
+    assert log == [('predict', [1]), ('gradcam', [7])]
+    assert s.get_metrics()["tasks"]["gradcam"]["batches"] == 1
+
+
+def test_unknown_task_and_full_queue_are_rejected(scheduler):
+    s = scheduler(Recorder(), max_queue_size=1)
+    with pytest.raises(ValueError):
+        s.submit(images(1), task='missing')
+    s.submit(images(1))
+    with pytest.raises(RuntimeError):
+        s.submit(images(2))
+    assert s.get_metrics()["rejected"] == 1
+
+
+def test_errors_reach_every_request_of_the_batch(scheduler):
+    def failing(batch):
+        raise ValueError("bad weights")
+
+    s = scheduler(failing, max_wait_ms=50)
+    futures = [s.submit(images(1)), s.submit(images(2))]
+    s.start()
+
+    for future in futures:
+        with pytest.raises(ValueError, match="bad weights"):
+            future.result(timeout=5)
+    assert s.get_metrics()["errors"] == 1
+
+
+def test_stop_fails_queued_requests(scheduler):
+    entered, release = threading.Event(), threading.Event()
+
+    def blocking(batch):
+        entered.set()
+        release.wait(5)
+        return batch[:, 0, 0, :]
+
+    s = scheduler(blocking, max_wait_ms=0)
+    running = s.submit(images(1))
+    s.start()
+    assert entered.wait(5)
+    queued = s.submit(images(2))
+    s.stop(timeout=0)
+    release.set()  # the worker finishes its batch, then drains the queue on the way out
+
+    assert running.result(timeout=5).item() == 1
+    with pytest.raises(RuntimeError, match="stopped"):
+        queued.result(timeout=5)
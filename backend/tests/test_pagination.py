@@ -0,0 +1,95 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from pagination import InvalidPage, decode_cursor, encode_cursor, fetch_page, keyset_query, page_size
+
+
+class SQLiteCursor:
+    """DB-API cursor that accepts the MySQL %s paramstyle"""
+
+    def __init__(self, connection):
+        self._cursor = connection.cursor()
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), params)
+
+    def fetchall(self):
+        return [(row_id, datetime.fromisoformat(created_at)) for row_id, created_at in self._cursor.fetchall()]
+
+
+@pytest.fixture
+def cursor():
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE predictions (id INTEGER PRIMARY KEY, user_id INTEGER, created_at TEXT)")
+    start = datetime(2024, 1, 1)
+    rows = []
+    for row_id in range(1, 26):
+        # Pairs of rows share a timestamp, so the id tiebreak matters
+        rows.append((row_id, 1, (start + timedelta(minutes=row_id // 2)).isoformat(sep=' ')))
+    rows.append((26, 2, start.isoformat(sep=' ')))
+    connection.executemany("INSERT INTO predictions VALUES (?, ?, ?)", rows)
+    yield SQLiteCursor(connection)
+    connection.close()
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    token = encode_cursor('predictions', created_at, 42)
+    assert '=' not in token
+    assert decode_cursor('predictions', token) == (created_at, 42)
+
+
+def test_cursor_of_another_listing_is_rejected():
+    token = encode_cursor('chat_history', datetime(2024, 1, 1), 1)
+    with pytest.raises(InvalidPage):
+        decode_cursor('predictions', token)
+
+
+@pytest.mark.parametrize('token', ['not-a-cursor', '', 'W10', encode_cursor('predictions', datetime.now(), 1)[:-3]])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(InvalidPage):
+        decode_cursor('predictions', token)
+
+
+def test_page_size_is_clamped():
+    assert page_size(None, 20, 100) == 20
+    assert page_size('', 20, 100) == 20
+    assert page_size('0', 20, 100) == 1
+    assert page_size('500', 20, 100) == 100
+    with pytest.raises(InvalidPage):
+        page_size('ten', 20, 100)
+
+
+def test_keyset_predicate_starts_after_the_cursor():
+    sql, params = keyset_query("SELECT id FROM predictions WHERE user_id = %s", (datetime(2024, 1, 1), 7), 10)
+    assert "created_at <= %s AND (created_at < %s OR id < %s)" in sql
+    assert sql.endswith("ORDER BY created_at DESC, id DESC LIMIT %s")
+    assert params == [datetime(2024, 1, 1), datetime(2024, 1, 1), 7, 11]
+
+
+def test_first_page_has_no_predicate():
+    sql, params = keyset_query("SELECT id FROM predictions WHERE user_id = %s", limit=5)
+    assert "created_at <" not in sql
+    assert params == [6]
+
+
+def test_pages_cover_every_row_once_in_order(cursor):
+    query = "SELECT id, created_at FROM predictions WHERE user_id = %s"
+    seen, token = [], None
+    while True:
+        rows, token = fetch_page(cursor, 'predictions', query, (1,), token, limit=4)
+        assert len(rows) <= 4
+        seen += rows
+        if token is None:
+            break
+    assert [row_id for row_id, _ in seen] == list(range(25, 0, -1))
+    assert seen == sorted(seen, key=lambda row: (row[1], row[0]), reverse=True)
+
+
+def test_last_page_has_no_token(cursor):
+    query = "SELECT id, created_at FROM predictions WHERE user_id = %s"
+    rows, token = fetch_page(cursor, 'predictions', query, (2,), limit=4)
+    assert [row_id for row_id, _ in rows] == [26]
+    assert token is None
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import pytest
+from mysql.connector import errors as mysql_errors
+
+from write_behind import WriteBehindQueue
+
+TABLES = {
+    'predictions': (['id', 'user_id', 'created_at'], 'id'),
+    'events': (['user_id', 'message'], None),
+}
+
+
+class FakeDatabase:
+    """Records committed rows per table; `up`, `fail` and `reject` simulate outages and bad rows"""
+
+    def __init__(self):
+        self.up = True
+        self.fail = None  # exception raised by every INSERT
+        self.reject = set()  # ids whose INSERT raises a non-transient error
+        self.rows = {}
+        self.statements = []
+
+    def connect(self):
+        return FakeConnection(self) if self.up else None
+
+    def ids(self, table='predictions'):
+        return sorted(row[0] for row in self.rows.get(table, []))
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.staged = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        for table, row in self.staged:
+            self.db.rows.setdefault(table, []).append(row)
+        self.staged = []
+
+    def rollback(self):
+        self.staged = []
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params):
+        db = self.connection.db
+        db.statements.append(sql)
+        if db.fail is not None:
+            raise db.fail
+        table, columns = re.match(r"INSERT INTO (\w+) \(([^)]*)\)", sql).groups()
+        width = len(columns.split(', '))
+        rows = [tuple(params[i:i + width]) for i in range(0, len(params), width)]
+        if any(row[0] in db.reject for row in rows):
+            raise mysql_errors.IntegrityError("Data too long for column")
+        self.connection.staged += [(table, row) for row in rows]
+
+
+def until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def spool_files(directory, suffix='.jsonl'):
+    return sorted(name for name in os.listdir(directory) if name.endswith(suffix))
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def make_queue(db, tmp_path):
+    queues = []
+
+    def make(**kwargs):
+        options = dict(flush_interval=0.01, retry_seconds=0.05, spool_dir=str(tmp_path / 'spool'))
+        options.update(kwargs)
+        queues.append(WriteBehindQueue(db.connect, TABLES, **options).start())
+        return queues[-1]
+
+    yield make
+    for queue in queues:
+        queue.close(timeout=2)
+
+
+def prediction(row_id, user_id=1):
+    return {'id': row_id, 'user_id': user_id, 'created_at': datetime(2024, 1, 2, 3, 4, 5)}
+
+
+def test_queued_rows_are_written_in_one_batch(db, make_queue):
+    queue = make_queue()
+    for row_id in (1, 2, 3):
+        assert queue.put('predictions', prediction(row_id))
+    assert queue.flush()
+
+    assert db.ids() == [1, 2, 3]
+    assert len(db.statements) == 1
+    assert db.statements[0].endswith("ON DUPLICATE KEY UPDATE id = id")
+
+
+def test_wait_for_sees_the_row_written(db, make_queue):
+    queue = make_queue(flush_interval=10)
+    queue.put('predictions', prediction(7, user_id=3))
+    assert queue.wait_for('predictions', row_id=7)
+    assert db.ids() == [7]
+    assert queue.wait_for('predictions', user_id=3)
+
+
+def test_outage_spools_then_replays(db, make_queue, tmp_path):
+    db.up = False
+    queue = make_queue()
+    queue.put('predictions', prediction(1))
+    queue.put('events', {'user_id': 1, 'message': 'hello'})
+    assert queue.flush()
+    assert spool_files(tmp_path / 'spool')
+    assert queue.get_metrics()["spooled"] == 2
+
+    db.up = True
+    assert until(lambda: queue.get_metrics()["spool_bytes"] == 0)
+    assert db.ids() == [1]
+    assert db.rows['predictions'][0][2] == datetime(2024, 1, 2, 3, 4, 5)
+    assert db.rows['events'] == [(1, 'hello')]
+    assert spool_files(tmp_path / 'spool') == []
+    assert queue.get_metrics()["replayed"] == 2
+
+
+def test_transient_insert_errors_are_spooled(db, make_queue):
+    db.fail = mysql_errors.OperationalError("Lost connection to MySQL server")
+    queue = make_queue(retry_seconds=60)
+    queue.put('predictions', prediction(1))
+    assert queue.flush()
+
+    metrics = queue.get_metrics()
+    assert metrics["spooled"] == 1 and metrics["dead_lettered"] == 0
+    assert db.ids() == []
+
+
+def test_spool_is_replayed_after_a_restart(db, make_queue, tmp_path):
+    db.up = False
+    first = make_queue(retry_seconds=60)
+    first.put('predictions', prediction(1))
+    first.close()
+    # A replay interrupted by the last shutdown left its file claimed
+    name = spool_files(tmp_path / 'spool')[0]
+    os.replace(tmp_path / 'spool' / name, tmp_path / 'spool' / name.replace('.jsonl', '.replaying'))
+    assert db.ids() == []
+
+    db.up = True
+    make_queue()
+    assert until(lambda: db.ids() == [1])
+    assert until(lambda: spool_files(tmp_path / 'spool', '') == ['failed'])
+
+
+def test_bad_rows_are_dead_lettered_and_the_rest_written(db, make_queue, tmp_path):
+    db.reject = {2}
+    queue = make_queue()
+    for row_id in (1, 2, 3):
+        queue.put('predictions', prediction(row_id))
+    assert queue.flush()
+
+    assert db.ids() == [1, 3]
+    assert queue.get_metrics()["dead_lettered"] == 1
+    with open(tmp_path / 'spool' / 'failed' / 'dead-letter.jsonl') as f:
+        dead = [json.loads(line) for line in f]
+    assert [entry["values"][0] for entry in dead] == [2]
+    assert "Data too long" in dead[0]["error"]
+    assert spool_files(tmp_path / 'spool') == []
+
+
+def test_unreadable_spool_file_is_quarantined(db, make_queue, tmp_path):
+    os.makedirs(tmp_path / 'spool')
+    (tmp_path / 'spool' / '1-1.jsonl').write_text('not json\n')
+    (tmp_path / 'spool' / '2-1.jsonl').write_text(json.dumps(['events', [5, 'later']]) + '\n')
+
+    queue = make_queue()
+    assert until(lambda: db.rows.get('events') == [(5, 'later')])
+    assert os.path.exists(tmp_path / 'spool' / 'failed' / '1-1.jsonl')
+    assert until(lambda: queue.get_metrics()["spool_bytes"] == 0)
+    assert queue.get_metrics()["quarantined"] == 1
+
+
+def test_synchronous_put_reports_dropped_rows(db, make_queue):
+    db.up = False
+    queue = make_queue(background=False, spool_max_bytes=10)
+    assert queue.put('predictions', prediction(1)) is False
+    assert queue.get_metrics()["dropped"] == 1
+
+    db.up = True
+    assert queue.put('predictions', prediction(2)) is True
+    assert db.ids() == [2]
+
+
+def test_rows_are_dropped_without_a_spool(db, make_queue):
+    db.up = False
+    queue = make_queue(background=False, spool_dir=None)
+    assert queue.put('events', {'user_id': 1, 'message': 'lost'}) is False
+    assert queue.get_metrics()["dropped"] == 1
@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+
+
+def load_interpreter_class():
+    """Prefer the standalone LiteRT/tflite runtimes, falling back to the one bundled with TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """Runs a converted .tflite model with the same predict() call shape as a Keras model"""
+
+    def __init__(self, model_path, num_threads=None):
+        Interpreter = load_interpreter_class()
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._lock = threading.Lock()
+        self._refresh_details()
+
+    def _refresh_details(self):
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(d) for d in self._input['shape'][1:])
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(int(d) for d in self._output['shape'][1:])
+
+    @property
+    def input_dtype(self):
+        return np.dtype(self._input['dtype']).name
+
+    def _quantize_input(self, batch):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize_output(self, output):
+        if self._output['dtype'] == np.float32:
+            return output
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, verbose=0):
+        """Run a (N, H, W, C) batch; the interpreter is resized when N changes"""
+        batch = np.asarray(batch)
+        with self._lock:
+            if tuple(self._input['shape']) != batch.shape:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._refresh_details()
+
+            self.interpreter.set_tensor(self._input['index'], self._quantize_input(batch))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+            return self._dequantize_output(np.array(output))
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
+
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+# Temp files older than this are leftovers of a crashed writer and removed on startup
+STALE_TMP_SECONDS = 3600
+
+
+class ThumbnailBusy(Exception):
+    """Raised when the generation queue is full; the caller should retry later"""
+
+
+class ThumbnailCache:
+    """
+    Thumbnails of stored uploads, generated on first request and kept on disk
+
+    Files are named <source key>-<size>.<format> and evicted least recently
+    used once the directory exceeds max_bytes. Generation runs in a small
+    thread pool with at most max_pending jobs queued, so a burst of history
+    page loads can't take the CPU away from predictions; concurrent requests
+    for the same thumbnail share one job.
+    """
+
+    def __init__(self, directory, sizes, max_bytes=512 * 1024 * 1024, workers=2, max_pending=32, quality=80):
+        """
+        Args:
+            directory: Cache directory
+            sizes: {name: long side in pixels}
+            max_bytes: Disk budget before least recently used thumbnails are deleted
+            workers: Generation threads
+            max_pending: Jobs queued or running before get() raises ThumbnailBusy
+            quality: WebP/JPEG quality
+        """
+        self.directory = directory
+        self.sizes = dict(sizes)
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.quality = quality
+        self.formats = [name for name in THUMBNAIL_FORMATS if name != 'webp' or features.check('webp')]
+        os.makedirs(directory, exist_ok=True)
+
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnail")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._metrics = {
+            "hits": 0,
+            "misses": 0,
+            "generated": 0,
+            "rejected": 0,
+            "errors": 0,
+            "evictions": 0,
+            "generate_ms_total": 0.0,
+        }
+        self._load_entries()
+
+    def _load_entries(self):
+        """Rebuild the LRU order from file access times after a restart"""
+        found = []
+        stale_before = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith('.tmp'):
+                    # Another process may still be writing fresh temp files
+                    if stat.st_mtime < stale_before:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue  # removed or renamed since listdir
+            found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def filename(self, key, size, fmt):
+        return f"{key}-{size}.{fmt}"
+
+    def get(self, source_path, key, size, fmt, timeout=30):
+        """
+        Path of the cached thumbnail of source_path, generating it if needed
+
+        key must change whenever the source content does (the upload store's
+        content hash does). Raises ThumbnailBusy when the queue is full.
+        """
+        if size not in self.sizes:
+            raise ValueError(f"Unknown thumbnail size '{size}', expected one of {list(self.sizes)}")
+        if fmt not in self.formats:
+            raise ValueError(f"Unsupported thumbnail format '{fmt}', expected one of {self.formats}")
+
+        name = self.filename(key, size, fmt)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name in self._entries and os.path.exists(path):
+                self._entries.move_to_end(name)
+                self._metrics["hits"] += 1
+                hit = True
+            else:
+                hit = False
+                future = self._inflight.get(name)
+                if future is None:
+                    if len(self._inflight) >= self.max_pending:
+                        self._metrics["rejected"] += 1
+                        raise ThumbnailBusy(f"{len(self._inflight)} thumbnails already being generated")
+                    future = self._pool.submit(self._generate, source_path, name, self.sizes[size], fmt)
+                    self._inflight[name] = future
+                self._metrics["misses"] += 1
+
+        if hit:
+            try:
+                os.utime(path)  # persists the LRU order across restarts
+            except OSError:
+                pass
+            return path
+
+        future.result(timeout=timeout)
+        return path
+
+    def _generate(self, source_path, name, side, fmt):
+        start = time.perf_counter()
+        path = os.path.join(self.directory, name)
+        try:
+            image = Image.open(source_path)
+            if image.format == 'JPEG':
+                image.draft('RGB', (side, side))
+            image = image.convert('RGB')
+            image.thumbnail((side, side))
+
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            pil_format = THUMBNAIL_FORMATS[fmt][0]
+            options = {'method': 4} if pil_format == 'WEBP' else {'optimize': True, 'progressive': True}
+            image.save(tmp_path, pil_format, quality=self.quality, **options)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception:
+            with self._lock:
+                self._metrics["errors"] += 1
+                self._inflight.pop(name, None)
+            raise
+
+        with self._lock:
+            self._inflight.pop(name, None)
+            self._total_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._metrics["generated"] += 1
+            self._metrics["generate_ms_total"] += (time.perf_counter() - start) * 1000.0
+            evicted = self._evict()
+
+        for evicted_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, evicted_name))
+            except OSError:
+                pass
+
+    def _evict(self):
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._metrics["evictions"] += 1
+            evicted.append(evicted_name)
+        return evicted
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics.update({
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "pending": len(self._inflight),
+            })
+
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics.update({
+            "max_bytes": self.max_bytes,
+            "max_pending": self.max_pending,
+            "sizes": self.sizes,
+            "formats": self.formats,
+            "hit_rate": metrics["hits"] / lookups if lookups else 0.0,
+            "avg_generate_ms": metrics["generate_ms_total"] / metrics["generated"] if metrics["generated"] else None,
+        })
+        return metrics
@@ -0,0 +1,112 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def decode_for_tiling(data, max_side=None):
+    """Decode to a uint8 RGB array, shrinking (via JPEG draft mode where possible) so the long side fits max_side"""
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    if max_side and max(image.size) > max_side:
+        # thumbnail() uses draft mode for JPEGs, so the full-size bitmap is never materialised
+        image.thumbnail((max_side, max_side))
+    image = image.convert('RGB')
+    return np.asarray(image), original_size
+
+
+def tile_positions(length, tile_size, stride):
+    """Tile offsets along one axis; the last tile is aligned to the edge so nothing is cut off"""
+    if length <= tile_size:
+        return [0]
+    positions = list(range(0, length - tile_size + 1, stride))
+    if positions[-1] != length - tile_size:
+        positions.append(length - tile_size)
+    return positions
+
+
+def iter_tile_batches(pixels, tile_size=224, stride=168, batch_size=16):
+    """
+    Yield ((row, col, y, x) positions, float32 batch) for overlapping tiles of a uint8 image
+
+    Tiles are read through a strided sliding-window view of the image, so only
+    one batch of tiles is ever converted to float32 at a time.
+    """
+    height, width = pixels.shape[:2]
+    if height < tile_size or width < tile_size:
+        padded = np.zeros((max(height, tile_size), max(width, tile_size), 3), dtype=pixels.dtype)
+        padded[:height, :width] = pixels
+        pixels = padded
+        height, width = pixels.shape[:2]
+
+    # (H - T + 1, W - T + 1, 3, T, T) view, no copy
+    windows = np.lib.stride_tricks.sliding_window_view(pixels, (tile_size, tile_size), axis=(0, 1))
+    ys = tile_positions(height, tile_size, stride)
+    xs = tile_positions(width, tile_size, stride)
+    positions = [(r, c, y, x) for r, y in enumerate(ys) for c, x in enumerate(xs)]
+
+    buffer = np.empty((batch_size, tile_size, tile_size, 3), dtype=np.float32)
+    for start in range(0, len(positions), batch_size):
+        chunk = positions[start:start + batch_size]
+        for i, (_, _, y, x) in enumerate(chunk):
+            np.multiply(windows[y, x].transpose(1, 2, 0), 1.0 / 255.0, out=buffer[i])
+        yield chunk, buffer[:len(chunk)]
+
+
+def predict_tiled(data, predict_fn, class_names, tile_size=224, stride=168, batch_size=16,
+                  max_side=None, healthy_class='Healthy'):
+    """
+    Score every tile of a large image and aggregate the results
+
+    Returns a dict with tiling geometry, a per-tile disease map (rows x cols)
+    and an aggregate verdict from the mean tile probabilities.
+    """
+    pixels, original_size = decode_for_tiling(data, max_side)
+    height, width = pixels.shape[:2]
+
+    ys = tile_positions(max(height, tile_size), tile_size, stride)
+    xs = tile_positions(max(width, tile_size), tile_size, stride)
+    disease_map = [[None] * len(xs) for _ in ys]
+    probability_sum = np.zeros(len(class_names), dtype=np.float64)
+    tile_count = 0
+
+    for chunk, batch in iter_tile_batches(pixels, tile_size, stride, batch_size):
+        outputs = np.asarray(predict_fn(batch))
+        for (row, col, y, x), probabilities in zip(chunk, outputs):
+            idx = int(np.argmax(probabilities))
+            disease_map[row][col] = {
+                "x": x,
+                "y": y,
+                "predicted_class": class_names[idx],
+                "confidence": float(probabilities[idx]),
+            }
+            probability_sum += probabilities
+            tile_count += 1
+
+    mean_probabilities = probability_sum / max(tile_count, 1)
+    verdict_idx = int(np.argmax(mean_probabilities))
+    class_tile_counts = {name: 0 for name in class_names}
+    for row in disease_map:
+        for tile in row:
+            class_tile_counts[tile["predicted_class"]] += 1
+    diseased = tile_count - class_tile_counts.get(healthy_class, 0)
+
+    return {
+        "tiles": {
+            "rows": len(ys),
+            "cols": len(xs),
+            "count": tile_count,
+            "tile_size": tile_size,
+            "stride": stride,
+            "image_size": list(original_size),
+            "scored_size": [width, height],
+        },
+        "disease_map": disease_map,
+        "aggregate": {
+            "predicted_class": class_names[verdict_idx],
+            "confidence": float(mean_probabilities[verdict_idx]),
+            "all_probabilities": {name: float(p) for name, p in zip(class_names, mean_probabilities)},
+            "class_tile_counts": class_tile_counts,
+            "diseased_tile_fraction": diseased / tile_count if tile_count else 0.0,
+        },
+    }
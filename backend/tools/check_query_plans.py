@@ -0,0 +1,58 @@
+"""
+EXPLAIN the request-path queries and fail if any has stopped using an index.
+
+Usage (from backend/):
+    python tools/check_query_plans.py
+    python tools/check_query_plans.py --json
+
+Exits 1 when a hot query (migrations.HOT_QUERIES) reads its table without
+an index, e.g. after an index was dropped or a query was rewritten so it no
+longer matches one. Run it against a database with realistic row counts:
+on a nearly empty table MySQL may prefer a scan even when the index exists.
+"""
+import argparse
+import json
+import os
+import sys
+
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from migrations import check_query_plans  # noqa: E402
+
+# Same as app.py
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'manglo_db',
+    'user': 'root',
+    'password': ''
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', action='store_true', help='Print the plans as JSON')
+    args = parser.parse_args()
+
+    connection = mysql.connector.connect(**DB_CONFIG)
+    try:
+        results = check_query_plans(connection)
+    finally:
+        connection.close()
+
+    failed = [result for result in results if not result["ok"]]
+    if args.json:
+        print(json.dumps({"ok": not failed, "plans": results}, indent=2, default=str))
+    else:
+        for result in results:
+            marker = "✓" if result["ok"] else "✗"
+            detail = result["problem"] or f"{result['type']} via {result['key']}"
+            filesort = ", filesort" if result["filesort"] else ""
+            print(f"{marker} {result['query']:<22} {detail} (~{result['rows']} rows{filesort})")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Convert the Keras model to float16 and int8 TFLite variants.
+
+Usage (from backend/):
+    python tools/convert_tflite.py --variants fp16
+    python tools/convert_tflite.py --variants fp16 int8 --calibration-dir ../dataset/train
+
+The int8 variant uses full integer quantization and needs a calibration set:
+a directory of representative mango images (searched recursively). Inputs and
+outputs stay float32 so the server can feed the same preprocessed tensors.
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from image_decoder import decode_image  # noqa: E402
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+import tensorflow as tf  # noqa: E402
+
+IMG_SIZE = (224, 224)
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+
+
+def find_images(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def representative_dataset(paths):
+    def generator():
+        for path in paths:
+            with open(path, 'rb') as f:
+                yield [decode_image(f.read(), IMG_SIZE)]
+    return generator
+
+
+def convert(model, variant, calibration_paths=None):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variant == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        if not calibration_paths:
+            raise ValueError("int8 conversion needs --calibration-dir with at least one image")
+        converter.representative_dataset = representative_dataset(calibration_paths)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif variant != 'fp32':
+        raise ValueError(f"Unknown variant '{variant}'")
+
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='../Model/best_model_final.h5')
+    parser.add_argument('--output-dir', default='../Model')
+    parser.add_argument('--variants', nargs='+', default=['fp16', 'int8'], choices=['fp32', 'fp16', 'int8'])
+    parser.add_argument('--calibration-dir')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    print(f"✓ Loaded {args.model} (input {model.input_shape})")
+
+    calibration_paths = []
+    if args.calibration_dir:
+        calibration_paths = find_images(args.calibration_dir)
+        random.Random(0).shuffle(calibration_paths)
+        calibration_paths = calibration_paths[:args.calibration_samples]
+        print(f"✓ Using {len(calibration_paths)} calibration images")
+
+    base = os.path.splitext(os.path.basename(args.model))[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+    for variant in args.variants:
+        try:
+            tflite_model = convert(model, variant, calibration_paths)
+        except Exception as e:
+            print(f"✗ {variant} conversion failed: {e}")
+            continue
+        output_path = os.path.join(args.output_dir, f"{base}_{variant}.tflite")
+        with open(output_path, 'wb') as f:
+            f.write(tflite_model)
+        print(f"✓ {variant}: {output_path} ({len(tflite_model) / 1024 / 1024:.2f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Export the Keras model to an ONNX graph for the ONNX Runtime backend.
+
+Usage (from backend/):
+    python tools/export_onnx.py
+    python tools/export_onnx.py --model ../Model/best_model_final.h5 --output ../Model/best_model_final.onnx
+    python tools/export_onnx.py --embeddings   # also output penultimate features for similar-case search
+
+Requires tf2onnx (pip install tf2onnx). The batch dimension is left dynamic so
+the micro-batching scheduler can send any batch size. After exporting, the
+graph is checked against the Keras model on random inputs when onnxruntime is
+installed.
+"""
+import argparse
+import os
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+
+
+def with_embeddings(model):
+    """Two-output model: the class probabilities, then the features feeding the classifier layer"""
+    features = model.layers[-1].input
+    if len(features.shape) > 2:
+        features = tf.keras.layers.GlobalAveragePooling2D()(features)
+    return tf.keras.Model(model.inputs, [model.outputs[0], features])
+
+
+def export(model, output_path, opset):
+    import tf2onnx
+
+    input_shape = (None,) + tuple(model.input_shape[1:])
+    spec = (tf.TensorSpec(input_shape, tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+
+
+def verify(model, output_path, samples=4):
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("onnxruntime not installed, skipping verification")
+        return
+
+    batch = np.random.default_rng(0).random((samples,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    session = ort.InferenceSession(output_path, providers=['CPUExecutionProvider'])
+    onnx_out = session.run(None, {session.get_inputs()[0].name: batch})[0]
+    keras_out = model.predict(batch, verbose=0)
+    if isinstance(keras_out, list):
+        keras_out = keras_out[0]
+    max_diff = float(np.max(np.abs(onnx_out - keras_out)))
+    agree = float(np.mean(onnx_out.argmax(axis=1) == keras_out.argmax(axis=1)))
+    print(f"✓ Max |Δp| vs Keras: {max_diff:.2e}, top-1 agreement: {agree:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='../Model/best_model_final.h5')
+    parser.add_argument('--output', default='../Model/best_model_final.onnx')
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--embeddings', action='store_true', help='Add the penultimate features as a second output')
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    print(f"✓ Loaded {args.model} (input {model.input_shape})")
+    if args.embeddings:
+        model = with_embeddings(model)
+        print(f"✓ Added embedding output ({model.outputs[1].shape[-1]} features)")
+
+    export(model, args.output, args.opset)
+    print(f"✓ Exported {args.output} ({os.path.getsize(args.output) / 1024 / 1024:.2f} MB)")
+    verify(model, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Apply pending schema migrations (migrations.py) to the application database.
+
+Usage (from backend/):
+    python tools/migrate_db.py --dry-run
+    python tools/migrate_db.py
+    python tools/migrate_db.py --json
+
+Safe to run against a database created by hand before migrations existed:
+tables, columns and indexes that are already there are left as they are.
+The server applies the same migrations at startup unless
+DB_MIGRATE_ON_STARTUP=false.
+"""
+import argparse
+import json
+import os
+import sys
+
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from migrations import apply_migrations, applied_versions, LATEST_VERSION  # noqa: E402
+
+# Same as app.py
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'manglo_db',
+    'user': 'root',
+    'password': ''
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='List pending migrations without applying them')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    connection = mysql.connector.connect(**DB_CONFIG)
+    try:
+        results = apply_migrations(connection, dry_run=args.dry_run)
+        current = max(applied_versions(connection), default=0)
+    finally:
+        connection.close()
+
+    summary = {
+        "dry_run": args.dry_run,
+        "current_version": current,
+        "latest_version": LATEST_VERSION,
+        "migrations": [{"version": version, "description": description, "changes": changes}
+                       for version, description, changes in results],
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    if not results:
+        print(f"✓ Schema is up to date (version {current})")
+        return
+    for version, description, changes in results:
+        prefix = "Pending" if args.dry_run else "✓ Applied"
+        print(f"{prefix} {version}: {description}")
+        for change in changes:
+            print(f"    {change}")
+    if not args.dry_run:
+        print(f"✓ Schema now at version {current}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Move flat uuid-named uploads into the content-addressed upload store.
+
+Usage (from backend/):
+    python tools/migrate_uploads.py --dry-run
+    python tools/migrate_uploads.py
+    python tools/migrate_uploads.py --max-side 1600 --keep-originals
+
+Each file directly inside --uploads-dir is copied to
+<store-dir>/ab/cd/<sha256>.<ext> (identical files collapse to one), then
+predictions.image_path is rewritten to the new path. Originals are deleted
+only after the database update commits, unless --keep-originals is given.
+Use the same --store-dir and --max-side as UPLOAD_STORE_DIR and
+UPLOAD_STORE_MAX_SIDE so the paths match what the server writes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from upload_store import UploadStore  # noqa: E402
+
+# Same as app.py
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'manglo_db',
+    'user': 'root',
+    'password': ''
+}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+
+def find_flat_uploads(directory):
+    return sorted(
+        name for name in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, name))
+        and name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads-dir', default='uploads', help='Directory holding the flat uploads')
+    parser.add_argument('--store-dir', default='uploads', help='Upload store root (UPLOAD_STORE_DIR)')
+    parser.add_argument('--max-side', type=int, default=0, help='Downscale stored copies (UPLOAD_STORE_MAX_SIDE)')
+    parser.add_argument('--keep-originals', action='store_true', help='Leave the flat files in place')
+    parser.add_argument('--skip-db', action='store_true', help='Only copy files, leave predictions.image_path alone')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would move without changing anything')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    store = UploadStore(args.store_dir, max_side=args.max_side)
+    names = find_flat_uploads(args.uploads_dir)
+    moves = []
+    digests = set()
+    for name in names:
+        old_path = os.path.join(args.uploads_dir, name)
+        with open(old_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        new_path = store.path_for(digest, name.rsplit('.', 1)[1].lower())
+        if not args.dry_run:
+            store.write(new_path, data)
+        moves.append((new_path, old_path))
+        digests.add(digest)
+
+    updated = 0
+    if moves and not args.dry_run and not args.skip_db:
+        connection = mysql.connector.connect(**DB_CONFIG)
+        try:
+            cursor = connection.cursor()
+            for new_path, old_path in moves:
+                cursor.execute("UPDATE predictions SET image_path = %s WHERE image_path = %s", (new_path, old_path))
+                updated += cursor.rowcount
+            connection.commit()
+        finally:
+            connection.close()
+
+    removed = 0
+    if not args.dry_run and not args.keep_originals:
+        stored = {path for path, _ in moves if os.path.exists(path)}
+        for new_path, old_path in moves:
+            if new_path in stored:
+                os.remove(old_path)
+                removed += 1
+
+    summary = {
+        "dry_run": args.dry_run,
+        "files": len(moves),
+        "unique_images": len(digests),
+        "predictions_updated": updated,
+        "originals_removed": removed,
+        "store": store.get_metrics(),
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    prefix = "Would move" if args.dry_run else "✓ Moved"
+    print(f"{prefix} {len(moves)} uploads into {args.store_dir} ({len(digests)} unique images)")
+    if not args.dry_run:
+        print(f"✓ Updated {updated} predictions, removed {removed} originals")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import numpy as np
+
+
+def _center_crop(image, fraction=0.875):
+    """Zoom into the centre and scale back up (nearest neighbour) to the original size"""
+    height, width = image.shape[:2]
+    crop_h, crop_w = int(height * fraction), int(width * fraction)
+    rows = (np.arange(height) * crop_h / height).astype(int) + (height - crop_h) // 2
+    cols = (np.arange(width) * crop_w / width).astype(int) + (width - crop_w) // 2
+    return image[rows][:, cols]
+
+
+AUGMENTATIONS = {
+    'hflip': lambda image: image[:, ::-1],
+    'vflip': lambda image: image[::-1],
+    'rot90': lambda image: np.rot90(image, 1),
+    'rot270': lambda image: np.rot90(image, 3),
+    'crop': _center_crop,
+}
+
+
+class TestTimeAugmenter:
+    """Re-scores low-confidence predictions over flips/rotations/crops in one batch and averages them"""
+
+    def __init__(self, predict_fn, confidence_threshold=0.6, augmentations=None):
+        """
+        Args:
+            predict_fn: Callable taking a (N, H, W, C) batch and returning (N, num_classes)
+            confidence_threshold: TTA only runs when the top-class probability is below this
+            augmentations: Names from AUGMENTATIONS to apply (all of them by default)
+        """
+        self.predict_fn = predict_fn
+        self.confidence_threshold = confidence_threshold
+        self.augmentations = list(augmentations or AUGMENTATIONS)
+        unknown = [name for name in self.augmentations if name not in AUGMENTATIONS]
+        if unknown:
+            raise ValueError(f"Unknown TTA augmentations {unknown}, expected some of {sorted(AUGMENTATIONS)}")
+        self._lock = threading.Lock()
+        self._metrics = {"predictions": 0, "fired": 0, "changed_class": 0, "total_added_ms": 0.0}
+
+    def build_batch(self, image):
+        """(1, H, W, C) or (H, W, C) image -> (len(augmentations), H, W, C) batch"""
+        image = image[0] if image.ndim == 4 else image
+        return np.stack([np.ascontiguousarray(AUGMENTATIONS[name](image)) for name in self.augmentations])
+
+    def refine(self, image, probabilities):
+        """Return averaged probabilities when the prediction is uncertain, else the originals unchanged"""
+        probabilities = np.asarray(probabilities)
+        with self._lock:
+            self._metrics["predictions"] += 1
+
+        if probabilities.max() >= self.confidence_threshold or not self.augmentations:
+            return probabilities, False
+
+        start = time.perf_counter()
+        augmented = np.asarray(self.predict_fn(self.build_batch(image)))
+        averaged = (augmented.sum(axis=0) + probabilities) / (len(augmented) + 1)
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        with self._lock:
+            self._metrics["fired"] += 1
+            self._metrics["total_added_ms"] += elapsed
+            if averaged.argmax() != probabilities.argmax():
+                self._metrics["changed_class"] += 1
+        return averaged, True
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        fired = metrics["fired"]
+        return {
+            "confidence_threshold": self.confidence_threshold,
+            "augmentations": self.augmentations,
+            "predictions": metrics["predictions"],
+            "fired": fired,
+            "fire_rate": fired / metrics["predictions"] if metrics["predictions"] else 0.0,
+            "changed_class": metrics["changed_class"],
+            "avg_added_latency_ms": metrics["total_added_ms"] / fired if fired else 0.0,
+        }
@@ -0,0 +1,235 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+
+from PIL import Image
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded images
+
+    Files are named by the sha256 of the uploaded bytes and sharded into
+    nested directories, so identical uploads share one file and no
+    directory grows past a few hundred entries:
+        <root>/3f/a2/3fa2...e1.jpg
+
+    With max_side set, images are re-encoded as JPEGs no larger than
+    max_side on their long side instead of keeping the original bytes;
+    the name is still the hash of the original so duplicates are found
+    without decoding. compact() enforces an age and/or total size budget.
+    """
+
+    def __init__(self, root, shard_levels=2, shard_width=2, max_side=0, jpeg_quality=90):
+        """
+        Args:
+            root: Store directory
+            shard_levels: Nested shard directories per file
+            shard_width: Hex characters of the hash per shard directory
+            max_side: Downscale stored copies to this long side (0 keeps originals)
+            jpeg_quality: Quality of downscaled copies
+        """
+        self.root = root
+        self.shard_levels = shard_levels
+        self.shard_width = shard_width
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._metrics = {
+            "stored": 0,
+            "deduplicated": 0,
+            "downscaled": 0,
+            "errors": 0,
+            "bytes_received": 0,
+            "bytes_written": 0,
+        }
+        self._pending = {}  # path -> Future of its deferred write
+        self.last_compaction = None
+
+    def path_for(self, digest, extension):
+        """Store path of an upload, whether or not it has been written yet"""
+        if self.max_side:
+            extension = 'jpg'
+        shards = [digest[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_levels)]
+        return os.path.join(self.root, *shards, f"{digest}.{extension}")
+
+    def put(self, data, extension, digest=None):
+        """Store upload bytes unless an identical upload is already stored; returns the store path"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, extension)
+        self.write(path, data)
+        return path
+
+    def write(self, path, data):
+        """Write data to a path from path_for(); separate so callers can defer it"""
+        with self._lock:
+            self._metrics["bytes_received"] += len(data)
+
+        if os.path.exists(path):
+            # Refresh the age so retention counts from the latest upload
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._metrics["deduplicated"] += 1
+            return
+
+        try:
+            payload, downscaled = self._encode(data)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique temp name so concurrent writers of the same image don't collide
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error saving upload {path}: {e}")
+            with self._lock:
+                self._metrics["errors"] += 1
+            return
+
+        with self._lock:
+            self._metrics["stored"] += 1
+            self._metrics["downscaled"] += downscaled
+            self._metrics["bytes_written"] += len(payload)
+
+    def write_async(self, executor, path, data):
+        """Run write() on executor; wait() blocks on it until the file is in place"""
+        future = executor.submit(self.write, path, data)
+        with self._lock:
+            self._pending[path] = future
+        future.add_done_callback(lambda done: self._forget(path, done))
+        return future
+
+    def _forget(self, path, future):
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    def wait(self, path, timeout=None):
+        """
+        Whether path is stored, first waiting for a deferred write of it
+
+        Raises TimeoutError if that write is still running after timeout.
+        """
+        with self._lock:
+            future = self._pending.get(path)
+        if future is not None:
+            future.result(timeout=timeout)
+        return os.path.isfile(path)
+
+    def _encode(self, data):
+        if not self.max_side:
+            return data, False
+        image = Image.open(io.BytesIO(data))
+        downscaled = max(image.size) > self.max_side
+        if downscaled:
+            image.thumbnail((self.max_side, self.max_side))
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, 'JPEG', quality=self.jpeg_quality)
+        return buffer.getvalue(), downscaled
+
+    def _scan(self):
+        """(mtime, size, path) of every stored file, plus leftover temp files"""
+        files, temp_files = [], []
+        for directory, _, names in os.walk(self.root):
+            if directory == self.root:
+                continue  # flat files from before the store was sharded are left alone
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    temp_files.append((stat.st_mtime, path))
+                else:
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return files, temp_files
+
+    def compact(self, max_age_days=0, max_bytes=0, on_removed=None):
+        """
+        Delete stored files older than max_age_days, then the oldest files
+        until the store fits in max_bytes (0 disables either budget).
+        Also removes abandoned temp files and empty shard directories.
+        on_removed, if given, is called with the list of deleted store paths
+        so references to them can be cleared.
+        """
+        start = time.perf_counter()
+        now = time.time()
+        files, temp_files = self._scan()
+        files.sort()
+
+        removed, removed_bytes = 0, 0
+        removed_paths = []
+
+        def remove(path):
+            try:
+                os.remove(path)
+                return True
+            except OSError:
+                return False
+
+        for mtime, path in temp_files:
+            if now - mtime > 3600:
+                remove(path)
+
+        kept = []
+        for mtime, size, path in files:
+            if max_age_days and now - mtime > max_age_days * 86400 and remove(path):
+                removed += 1
+                removed_bytes += size
+                removed_paths.append(path)
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        if max_bytes:
+            for mtime, size, path in kept:
+                if total <= max_bytes:
+                    break
+                if remove(path):
+                    removed += 1
+                    removed_bytes += size
+                    removed_paths.append(path)
+                    total -= size
+
+        # Bottom-up, so a shard emptied of its last subdirectory goes too
+        for directory, _, _ in os.walk(self.root, topdown=False):
+            if directory != self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass  # not empty
+
+        result = {
+            "finished_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "seconds": time.perf_counter() - start,
+            "files_removed": removed,
+            "bytes_removed": removed_bytes,
+            "files_remaining": len(files) - removed,
+            "bytes_remaining": total,
+        }
+        self.last_compaction = result
+        if on_removed and removed_paths:
+            on_removed(removed_paths)
+        return result
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        received = metrics["stored"] + metrics["deduplicated"]
+        metrics.update({
+            "root": self.root,
+            "max_side": self.max_side,
+            "dedup_rate": metrics["deduplicated"] / received if received else 0.0,
+            "last_compaction": self.last_compaction,
+        })
+        return metrics
@@ -0,0 +1,540 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from mysql.connector import errors as mysql_errors
+
+# Worth retrying later: the server or the connection went away. Anything else
+# (constraint violations, bad values, SQL errors) fails again on every retry
+TRANSIENT_ERRORS = (mysql_errors.OperationalError, mysql_errors.InterfaceError)
+
+
+class IdAllocationError(Exception):
+    """No id block could be reserved (database unreachable or sequence missing)"""
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Can't spool {type(value).__name__}")
+
+
+def _decode(obj):
+    return datetime.fromisoformat(obj["$datetime"]) if "$datetime" in obj else obj
+
+
+class IdAllocator:
+    """
+    Row ids handed out from blocks reserved in the id_sequences table
+
+    One UPDATE ... LAST_INSERT_ID(next_id + n) reserves n ids atomically
+    across processes, so a request gets its row id up front and the INSERT
+    can happen later. Ids of a block not used before a restart are skipped,
+    leaving gaps. Every insert into the table must take its id from here:
+    an AUTO_INCREMENT insert could take an id another process has reserved.
+    """
+
+    def __init__(self, connect, table, block_size=50):
+        """
+        Args:
+            connect: Callable returning a database connection (or None when the database is down)
+            table: Table the ids are for; also the sequence name
+            block_size: Ids reserved per database round trip
+        """
+        self._connect = connect
+        self.table = table
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._synced = False
+        self._metrics = {"allocated": 0, "reservations": 0, "failures": 0}
+
+    def allocate(self, count=1):
+        """`count` unused ids, in increasing order"""
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._next, self._end = self._reserve(max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+            self._metrics["allocated"] += count
+        return ids
+
+    def _reserve(self, count):
+        connection = self._connect()
+        if not connection:
+            self._metrics["failures"] += 1
+            raise IdAllocationError("Database connection failed")
+        try:
+            cursor = connection.cursor()
+            if not self._synced:
+                # Rows inserted with AUTO_INCREMENT before this process started
+                cursor.execute(
+                    f"""UPDATE id_sequences
+                        SET next_id = GREATEST(next_id, (SELECT COALESCE(MAX(id), 0) + 1 FROM {self.table}))
+                        WHERE name = %s""",
+                    (self.table,)
+                )
+            cursor.execute("UPDATE id_sequences SET next_id = LAST_INSERT_ID(next_id + %s) WHERE name = %s",
+                           (count, self.table))
+            if cursor.rowcount != 1:
+                raise IdAllocationError(f"No id sequence for {self.table}; apply the schema migrations")
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            end = int(cursor.fetchone()[0])
+            connection.commit()
+        except IdAllocationError:
+            self._metrics["failures"] += 1
+            raise
+        except Exception as e:
+            self._metrics["failures"] += 1
+            raise IdAllocationError(str(e))
+        finally:
+            connection.close()
+
+        self._synced = True
+        self._metrics["reservations"] += 1
+        return end - count, end
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["reserved_remaining"] = self._end - self._next
+        metrics["block_size"] = self.block_size
+        return metrics
+
+
+class WriteBehindQueue:
+    """
+    Rows inserted by a background writer instead of the request thread
+
+    put() queues a row and returns at once. The writer waits up to
+    flush_interval for more rows, then inserts each table's rows with one
+    multi-row INSERT and a single commit. When the database is unreachable
+    or the insert fails, the batch is appended to an on-disk spool (at most
+    spool_max_bytes; beyond that rows are dropped and counted) and replayed
+    once writes succeed again, including after a restart. Only connection
+    and server errors are spooled; when a batch fails for any other reason
+    its rows are retried one by one and those that still fail are appended
+    to <spool_dir>/failed/dead-letter.jsonl. Rows with a key column are
+    inserted with ON DUPLICATE KEY UPDATE so a replay of an already
+    committed batch is a no-op.
+
+    start() picks up rows spooled before a restart and starts the writer.
+    wait_for() gives read-your-writes: a read of a row (or a user's rows)
+    still in the queue forces an immediate flush and waits for it.
+    close() flushes what is queued and spools whatever can't be written.
+    """
+
+    def __init__(self, connect, tables, batch_size=200, flush_interval=0.2, max_pending=10000,
+                 spool_dir=None, spool_max_bytes=64 * 1024 * 1024, retry_seconds=5.0, max_replay_attempts=5,
+                 background=True):
+        """
+        Args:
+            connect: Callable returning a database connection (or None when the database is down)
+            tables: {table: (columns, key column or None)}
+            batch_size: Most rows per INSERT
+            flush_interval: Seconds the writer waits to gather a batch
+            max_pending: Rows queued in memory before put() spools instead
+            spool_dir: Directory for rows that couldn't be written (None disables spooling)
+            spool_max_bytes: Spool size limit
+            retry_seconds: Least time between spool replays while writes are failing
+            max_replay_attempts: Failed replays of one spool file before it is moved to <spool_dir>/failed
+            background: False writes each row synchronously in put() (same spool fallback; the
+                writer thread then only replays the spool)
+        """
+        self._connect = connect
+        self.tables = {name: (list(columns), key) for name, (columns, key) in tables.items()}
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool_dir = spool_dir
+        self.spool_max_bytes = spool_max_bytes
+        self.retry_seconds = retry_seconds
+        self.max_replay_attempts = max_replay_attempts
+        self.background = background
+        self.failed_dir = os.path.join(spool_dir, 'failed') if spool_dir else None
+
+        self._cond = threading.Condition()
+        self._queue = deque()  # (table, values)
+        self._pending = Counter()  # wait_for keys of queued and in-flight rows
+        self._flush_requested = False
+        self._closing = False
+        self._last_failure = 0.0
+        self._spool_lock = threading.Lock()
+        self._dead_letter_lock = threading.Lock()
+        self._spool_bytes = 0
+        self._replay_attempts = Counter()
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "write_ms_total": 0.0,
+            "spooled": 0,
+            "replayed": 0,
+            "dropped": 0,
+            "dead_lettered": 0,
+            "quarantined": 0,
+            "writer_errors": 0,
+            "failures": 0,
+            "last_error": None,
+        }
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        if self.spool_dir:
+            os.makedirs(self.failed_dir, exist_ok=True)
+            with self._spool_lock:
+                self._spool_bytes = 0
+                for name in os.listdir(self.spool_dir):
+                    path = os.path.join(self.spool_dir, name)
+                    if name.endswith('.tmp'):
+                        os.remove(path)
+                        continue
+                    if name.endswith('.replaying'):
+                        # Claimed by a replay that didn't finish before the last shutdown
+                        name = name[:-len('.replaying')] + '.jsonl'
+                        os.replace(path, os.path.join(self.spool_dir, name))
+                        path = os.path.join(self.spool_dir, name)
+                    if name.endswith('.jsonl'):
+                        self._spool_bytes += os.path.getsize(path)
+        if self.background or self.spool_dir:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def _keys(self, table, values):
+        columns, key = self.tables[table]
+        keys = []
+        if key:
+            keys.append((table, 'id', values[columns.index(key)]))
+        if 'user_id' in columns:
+            keys.append((table, 'user', values[columns.index('user_id')]))
+        return keys
+
+    def put(self, table, row):
+        """Queue a row ({column: value}); returns False if it was dropped"""
+        columns, _ = self.tables[table]
+        values = [row.get(column) for column in columns]
+        if not self.background:
+            with self._cond:
+                self._metrics["enqueued"] += 1
+            _, lost = self._write_batch([(table, values)])
+            return not lost
+
+        with self._cond:
+            self._metrics["enqueued"] += 1
+            if len(self._queue) < self.max_pending and not self._closing:
+                self._queue.append((table, values))
+                self._pending.update(self._keys(table, values))
+                if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+                return True
+        # Writer is falling behind (or shutting down): keep the row on disk instead of in memory
+        return self._spool([(table, values)])
+
+    def wait_for(self, table, row_id=None, user_id=None, timeout=2.0):
+        """Flush now if a matching row is queued, and wait until it has been written or spooled"""
+        key = (table, 'id', row_id) if row_id is not None else (table, 'user', user_id)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._pending[key]:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending[key]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def flush(self, timeout=5.0):
+        """Write everything queued so far"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._queue or sum(self._pending.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flush on shutdown; rows the writer can't finish in time go to the spool"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            leftover = list(self._queue)
+            self._queue.clear()
+        if leftover:
+            self._spool(leftover)
+
+    def _replay_due(self):
+        return self._spool_bytes > 0 and time.monotonic() - self._last_failure >= self.retry_seconds
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing and not self._replay_due():
+                    self._cond.wait(self.retry_seconds if self._spool_bytes else None)
+                if (self._queue and len(self._queue) < self.batch_size
+                        and not self._flush_requested and not self._closing):
+                    self._cond.wait(self.flush_interval)  # gather a batch
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                if not self._queue:
+                    self._flush_requested = False
+                closing = self._closing
+
+            try:
+                if batch:
+                    spooled, _ = self._write_batch(batch)
+                    if not spooled and self._spool_bytes:
+                        self._replay_spool()  # the database is back
+                elif self._replay_due():
+                    self._replay_spool()
+            except Exception as e:
+                # Keep the writer alive: a dead writer would leave every wait_for() stalling
+                with self._cond:
+                    self._metrics["writer_errors"] += 1
+                    self._metrics["last_error"] = str(e)
+                    self._last_failure = time.monotonic()
+                print(f"✗ Write-behind writer error: {e}")
+
+            if closing:
+                with self._cond:
+                    if not self._queue:
+                        return
+
+    def _insert(self, connection, batch):
+        cursor = connection.cursor()
+        by_table = {}
+        for table, values in batch:
+            by_table.setdefault(table, []).append(values)
+        for table, rows in by_table.items():
+            columns, key = self.tables[table]
+            placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([placeholders] * len(rows))
+            if key:
+                sql += f" ON DUPLICATE KEY UPDATE {key} = {key}"
+            cursor.execute(sql, [value for row in rows for value in row])
+        connection.commit()
+
+    @staticmethod
+    def _rollback(connection):
+        try:
+            connection.rollback()
+        except Exception:
+            pass
+
+    def _try_write(self, batch):
+        """
+        Insert a batch; returns (rows written, rows to spool, [(row, error)] dead rows, error)
+
+        A transient error leaves the unwritten rows for the spool. Any other
+        error retries the batch row by row so one bad row can't hold back
+        the rest.
+        """
+        connection = self._connect()
+        if not connection:
+            return 0, batch, [], "database connection failed"
+        try:
+            try:
+                self._insert(connection, batch)
+                return len(batch), [], [], None
+            except TRANSIENT_ERRORS as e:
+                self._rollback(connection)
+                return 0, batch, [], str(e)
+            except Exception as e:
+                self._rollback(connection)
+                if len(batch) == 1:
+                    return 0, [], [(batch[0], str(e))], str(e)
+
+            written, dead = 0, []
+            for i, row in enumerate(batch):
+                try:
+                    self._insert(connection, [row])
+                    written += 1
+                except TRANSIENT_ERRORS as e:
+                    self._rollback(connection)
+                    return written, batch[i:], dead, str(e)
+                except Exception as e:
+                    self._rollback(connection)
+                    dead.append((row, str(e)))
+            return written, [], dead, dead[-1][1] if dead else None
+        finally:
+            connection.close()
+
+    def _write_batch(self, batch):
+        """Insert a batch, spooling or dead-lettering what fails; returns (anything spooled, rows lost)"""
+        start = time.perf_counter()
+        try:
+            written, to_spool, dead, error = self._try_write(batch)
+
+            lost = len(dead)
+            if to_spool:
+                print(f"✗ Write-behind insert of {len(to_spool)} rows failed, spooling: {error}")
+                if not self._spool(to_spool):
+                    lost += len(to_spool)
+            if dead:
+                self._dead_letter(dead)
+            with self._cond:
+                m = self._metrics
+                if error:
+                    m["failures"] += 1
+                    m["last_error"] = error
+                if to_spool:
+                    self._last_failure = time.monotonic()
+                if written:
+                    m["written"] += written
+                    m["batches"] += 1
+                    m["write_ms_total"] += (time.perf_counter() - start) * 1000.0
+            return bool(to_spool), lost
+        finally:
+            # Even if this pass failed, the rows are no longer in flight
+            with self._cond:
+                for table, values in batch:
+                    self._pending.subtract(self._keys(table, values))
+                self._pending += Counter()  # drop zero counts
+                self._cond.notify_all()
+
+    def _dead_letter(self, dead):
+        """Keep rows that can never be inserted out of the spool, with the reason"""
+        for (table, values), error in dead:
+            print(f"✗ Write-behind dropped a {table} row: {error}")
+        with self._cond:
+            self._metrics["dead_lettered"] += len(dead)
+        if not self.failed_dir:
+            return
+        lines = ''.join(json.dumps({"table": table, "values": values, "error": error}, default=_encode) + '\n'
+                        for (table, values), error in dead)
+        with self._dead_letter_lock:
+            with open(os.path.join(self.failed_dir, 'dead-letter.jsonl'), 'a') as f:
+                f.write(lines)
+
+    def _spool(self, batch):
+        if not self.spool_dir:
+            with self._cond:
+                self._metrics["dropped"] += len(batch)
+            print(f"✗ Dropped {len(batch)} rows: database unavailable and no spool configured")
+            return False
+
+        try:
+            payload = ''.join(json.dumps([table, values], default=_encode) + '\n' for table, values in batch)
+        except (TypeError, ValueError) as e:
+            with self._cond:
+                self._metrics["dropped"] += len(batch)
+            print(f"✗ Write-behind dropped {len(batch)} rows that can't be spooled: {e}")
+            return False
+        payload = payload.encode()
+        with self._spool_lock:
+            if self._spool_bytes + len(payload) > self.spool_max_bytes:
+                with self._cond:
+                    self._metrics["dropped"] += len(batch)
+                print(f"✗ Write-behind spool full ({self._spool_bytes} bytes), dropped {len(batch)} rows")
+                return False
+            path = os.path.join(self.spool_dir, f"{time.time_ns()}-{threading.get_ident()}.jsonl")
+            with open(path + '.tmp', 'wb') as f:
+                f.write(payload)
+            os.replace(path + '.tmp', path)
+            self._spool_bytes += len(payload)
+        with self._cond:
+            self._metrics["spooled"] += len(batch)
+            self._cond.notify_all()  # the writer schedules a replay
+        return True
+
+    def _replay_spool(self):
+        """
+        Write spooled batches oldest first, stopping while the database is
+        unreachable. A file that can't be read, or whose replay fails
+        max_replay_attempts times with a connection up, moves to failed/
+        so the files behind it still get written.
+
+        Each file is claimed by renaming it to .replaying, so the spool
+        lock is only held for file moves and put() can keep spooling while
+        the batch is written.
+        """
+        with self._spool_lock:
+            names = sorted(name for name in os.listdir(self.spool_dir) if name.endswith('.jsonl'))
+
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            claimed = path[:-len('.jsonl')] + '.replaying'
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed) as f:
+                    batch = [tuple(json.loads(line, object_hook=_decode)) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                self._quarantine(name, claimed, f"unreadable: {e}")
+                continue
+
+            written, to_spool, dead, error = self._try_write(batch)
+            if dead:
+                self._dead_letter(dead)
+            if to_spool:
+                self._replay_failed(error)
+                os.replace(claimed, path)  # back in line; keyed rows already written replay as no-ops
+                if error == "database connection failed":
+                    return  # outage: retry every file later, don't count it against this one
+                self._replay_attempts[name] += 1
+                if self._replay_attempts[name] < self.max_replay_attempts:
+                    return
+                self._quarantine(name, path, error)
+                continue
+
+            self._replay_attempts.pop(name, None)
+            size = os.path.getsize(claimed)
+            os.remove(claimed)
+            with self._spool_lock:
+                self._spool_bytes -= size
+            with self._cond:
+                self._metrics["replayed"] += written
+            if written:
+                print(f"✓ Replayed {written} spooled rows")
+
+    def _quarantine(self, name, path, reason):
+        """Move a spool file (at path, possibly claimed) to failed/<name>"""
+        size = os.path.getsize(path)
+        os.replace(path, os.path.join(self.failed_dir, name))
+        with self._spool_lock:
+            self._spool_bytes -= size
+        self._replay_attempts.pop(name, None)
+        with self._cond:
+            self._metrics["quarantined"] += 1
+        print(f"✗ Moved spool file {name} to {self.failed_dir}: {reason}")
+
+    def _replay_failed(self, error):
+        with self._cond:
+            self._metrics["failures"] += 1
+            self._metrics["last_error"] = error
+            self._last_failure = time.monotonic()
+
+    def get_metrics(self):
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["pending"] = len(self._queue)
+        metrics.update({
+            "background": self.background,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+            "spool_bytes": self._spool_bytes,
+            "spool_max_bytes": self.spool_max_bytes,
+            "avg_batch_rows": metrics["written"] / metrics["batches"] if metrics["batches"] else 0.0,
+            "avg_write_ms": metrics["write_ms_total"] / metrics["batches"] if metrics["batches"] else None,
+        })
+        return metrics